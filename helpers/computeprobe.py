@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# # -*- coding: utf-8 -*-
+
+"""
+    File name: helpers.computeprobe.py
+    Date created: 19/10/2026
+    Date last modified: 19/10/2026
+    Python Version: 3.7.2
+    Version: 1.0.0
+"""
+
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict
+
+__all__ = ['BATCH', 'COMPUTE_MEASURES', 'integer_work', 'float_work', 'WORKLOADS', 'cpu_throughput', 'memory_bandwidth', 'allocation_rate', 'probe_compute']
+
+# Operations between two reads of the clock, so the clock isn't what is measured
+BATCH = 10000
+# Measures of probe_compute, each one lasting its seconds
+COMPUTE_MEASURES = 6
+
+
+def integer_work(seconds: float) -> float:
+    """
+    Runs integer arithmetic for the given seconds.
+    :return: millions of operations per second.
+    """
+    operations = 0
+    value = 1
+    end = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < end:
+        for i in range(BATCH):
+            value = (value * 31 + i) & 0xFFFFFFFF
+        operations += BATCH
+    return operations / (time.perf_counter() - start) / 1e6
+
+
+def float_work(seconds: float) -> float:
+    """
+    Runs floating point arithmetic for the given seconds.
+    :return: millions of operations per second.
+    """
+    operations = 0
+    value = 1.0
+    end = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < end:
+        for i in range(BATCH):
+            value = value * 1.0000001 + 0.5 / (i + 1.0)
+        operations += BATCH
+    return operations / (time.perf_counter() - start) / 1e6
+
+
+WORKLOADS = {'int': integer_work, 'float': float_work}
+
+
+def cpu_throughput(executor: Executor, workload: str, processes: int, seconds: float) -> float:
+    """
+    Runs the workload in processes of the pool (one per core, to avoid the GIL) at the same time.
+    :return: millions of operations per second of all the processes.
+    """
+    return sum(executor.map(WORKLOADS[workload], [seconds] * processes))
+
+
+def memory_bandwidth(size_mb: int, seconds: float) -> float:
+    """
+    Copies a buffer into another one (a memcpy) for the given seconds, with buffers larger than the CPU caches.
+    :return: MB/s copied.
+    """
+    source = bytearray(os.urandom(1024 * 1024)) * size_mb
+    destination = bytearray(len(source))
+    copies = 0
+    end = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while copies == 0 or time.perf_counter() < end:
+        destination[:] = source
+        copies += 1
+    return copies * size_mb / (time.perf_counter() - start)
+
+
+def allocation_rate(seconds: float, size: int = 64) -> float:
+    """
+    Allocates and frees small objects for the given seconds.
+    :return: millions of allocations per second.
+    """
+    allocations = 0
+    end = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < end:
+        for _ in range(BATCH):
+            bytearray(size)
+        allocations += BATCH
+    return allocations / (time.perf_counter() - start) / 1e6
+
+
+def probe_compute(seconds: float, processes: int = None, memory_mb: int = 64) -> Dict[str, float]:
+    """
+    Measures the single core and all cores integer and float throughput, the memory bandwidth and the allocation rate.
+    :param seconds: Seconds of every measure.
+    :param processes: Processes of the all cores measures (default, one per CPU).
+    :param memory_mb: Size of the buffers of the memory bandwidth measure.
+    """
+    processes = processes or os.cpu_count() or 1
+    # The pool is started (not forked: the caller may have other threads running) before the measures, so they don't include its start
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn')) as executor:
+        list(executor.map(abs, range(processes)))
+        measured = {
+            'int_single_mops': cpu_throughput(executor, 'int', 1, seconds),
+            'float_single_mops': cpu_throughput(executor, 'float', 1, seconds),
+            'int_all_mops': cpu_throughput(executor, 'int', processes, seconds),
+            'float_all_mops': cpu_throughput(executor, 'float', processes, seconds),
+        }
+    measured['memory_mbs'] = memory_bandwidth(memory_mb, seconds)
+    measured['alloc_mops'] = allocation_rate(seconds)
+    return measured
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# # -*- coding: utf-8 -*-
+
+"""
+    File name: helpers.diskprobe.py
+    Date created: 19/10/2026
+    Date last modified: 19/10/2026
+    Python Version: 3.7.2
+    Version: 1.0.0
+"""
+
+import errno
+import glob
+import mmap
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+__all__ = ['ALIGNMENT', 'SCRATCH_PREFIX', 'STALE_SCRATCH_SECONDS', 'DISK_PROBE_TESTS', 'open_direct', 'drop_cache', 'sequential_write',
+           'sequential_read', 'random_read', 'fsync_latency', 'remove_stale_scratch_files', 'probe_disk']
+
+# O_DIRECT requires the buffers, offsets and sizes to be aligned to the logical block size of the device. 4KiB covers every device
+# we run on, and mmap buffers are page aligned.
+ALIGNMENT = 4096
+
+# Prefix of the scratch files of the probe, and the age after which a scratch file is left over by a killed probe
+SCRATCH_PREFIX = '.utester-disk-probe-'
+STALE_SCRATCH_SECONDS = 3600
+# Tests of probe_disk, each one bounded by its max_seconds
+DISK_PROBE_TESTS = 4
+
+
+def open_direct(path: str, flags: int) -> Tuple[int, bool]:
+    """
+    Opens a file with O_DIRECT, bypassing the page cache, falling back to a normal open where O_DIRECT isn't supported (i.e. tmpfs).
+    :return: file descriptor, and whether it was opened with O_DIRECT.
+    """
+    o_direct = getattr(os, 'O_DIRECT', 0)
+    if o_direct:
+        try:
+            return os.open(path, flags | o_direct, 0o600), True
+        except OSError as e:
+            if e.errno != errno.EINVAL:
+                raise
+    return os.open(path, flags, 0o600), False
+
+
+def drop_cache(fd: int):
+    """
+    Asks the kernel to drop the cached pages of a file (for files not opened with O_DIRECT), so the reads hit the device.
+    """
+    if hasattr(os, 'posix_fadvise'):
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def sequential_write(path: str, size: int, block_size: int, max_seconds: float) -> Dict:
+    """
+    Writes the file sequentially (and fsyncs it), stopping at size bytes or after max_seconds.
+    :return: written bytes, seconds and whether O_DIRECT was used.
+    """
+    buffer = mmap.mmap(-1, block_size)
+    buffer.write(os.urandom(block_size))
+    fd, direct = open_direct(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    written = 0
+    start = time.perf_counter()
+    try:
+        while written < size and time.perf_counter() - start < max_seconds:
+            written += os.write(fd, buffer)
+        os.fsync(fd)
+        seconds = time.perf_counter() - start
+        if not direct:
+            drop_cache(fd)
+    finally:
+        os.close(fd)
+        buffer.close()
+    return {'bytes': written, 'seconds': seconds, 'direct': direct}
+
+
+def sequential_read(path: str, block_size: int, max_seconds: float) -> Dict:
+    """
+    Reads the file sequentially, stopping at its end or after max_seconds.
+    :return: read bytes, seconds and whether O_DIRECT was used.
+    """
+    buffer = mmap.mmap(-1, block_size)
+    fd, direct = open_direct(path, os.O_RDONLY)
+    read = 0
+    start = time.perf_counter()
+    try:
+        while time.perf_counter() - start < max_seconds:
+            count = os.preadv(fd, [buffer], read)
+            if count <= 0:
+                break
+            read += count
+        seconds = time.perf_counter() - start
+    finally:
+        os.close(fd)
+        buffer.close()
+    return {'bytes': read, 'seconds': seconds, 'direct': direct}
+
+
+def random_read(path: str, file_size: int, count: int, max_seconds: float, block_size: int = ALIGNMENT) -> Dict:
+    """
+    Reads aligned blocks at random offsets of the file, one at a time (queue depth 1), stopping at count reads or after max_seconds.
+    :return: latencies of every read in seconds, total seconds and whether O_DIRECT was used.
+    """
+    buffer = mmap.mmap(-1, block_size)
+    fd, direct = open_direct(path, os.O_RDONLY)
+    if not direct and hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_RANDOM)
+    blocks = max(file_size // block_size, 1)
+    latencies: List[float] = []
+    start = time.perf_counter()
+    try:
+        while len(latencies) < count and time.perf_counter() - start < max_seconds:
+            offset = random.randrange(blocks) * block_size
+            read_start = time.perf_counter()
+            os.preadv(fd, [buffer], offset)
+            latencies.append(time.perf_counter() - read_start)
+        seconds = time.perf_counter() - start
+    finally:
+        os.close(fd)
+        buffer.close()
+    return {'latencies': latencies, 'seconds': seconds, 'direct': direct}
+
+
+def fsync_latency(path: str, count: int, max_seconds: float, block_size: int = ALIGNMENT) -> Dict:
+    """
+    Appends a block and fsyncs it, like a commit log does, stopping at count fsyncs or after max_seconds.
+    :return: latencies of every write + fsync in seconds.
+    """
+    buffer = mmap.mmap(-1, block_size)
+    fd, direct = open_direct(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    latencies: List[float] = []
+    start = time.perf_counter()
+    try:
+        while len(latencies) < count and time.perf_counter() - start < max_seconds:
+            write_start = time.perf_counter()
+            os.write(fd, buffer)
+            os.fsync(fd)
+            latencies.append(time.perf_counter() - write_start)
+    finally:
+        os.close(fd)
+        buffer.close()
+    return {'latencies': latencies, 'direct': direct}
+
+
+def remove_stale_scratch_files(directory: str, max_age: float = STALE_SCRATCH_SECONDS) -> List[str]:
+    """
+    Removes the scratch files older than max_age seconds of the directory, left over by probes killed before they removed them
+    (i.e. by the timeout of Icinga). The younger ones may belong to a probe still running.
+    :return: the removed files.
+    """
+    removed = []
+    for path in glob.glob(os.path.join(directory, SCRATCH_PREFIX + '*')):
+        try:
+            if time.time() - os.path.getmtime(path) > max_age:
+                os.remove(path)
+                removed.append(path)
+        except OSError:
+            pass
+    return removed
+
+
+def probe_disk(directory: str, size: int, max_seconds: float, block_size: int = 1024 * 1024, random_reads: int = 2000,
+               fsyncs: int = 200) -> Dict:
+    """
+    Runs the sequential write, sequential read, random 4k read and fsync latency tests on a scratch file of the directory,
+    and removes it (and the ones left over by killed probes). Every test is bounded by its size or count and by max_seconds.
+    :return: results of every test (see the functions of each test).
+    """
+    remove_stale_scratch_files(directory)
+    fd, path = tempfile.mkstemp(prefix=SCRATCH_PREFIX, dir=directory)
+    os.close(fd)
+    try:
+        results = {'seq_write': sequential_write(path, size, block_size, max_seconds)}
+        results['seq_read'] = sequential_read(path, block_size, max_seconds)
+        results['rand_read'] = random_read(path, results['seq_write']['bytes'], random_reads, max_seconds)
+        results['fsync'] = fsync_latency(path, fsyncs, max_seconds)
+    finally:
+        os.remove(path)
+    return results
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# # -*- coding: utf-8 -*-
+
+"""
+    File name: helpers.dnsclient.py
+    Date created: 19/10/2026
+    Date last modified: 19/10/2026
+    Python Version: 3.7.2
+    Version: 1.0.0
+"""
+
+import random
+import socket
+import struct
+import time
+from typing import Dict, List, Tuple
+
+__all__ = ['RECORD_TYPES', 'RECORD_TYPE_NAMES', 'RCODES', 'build_query', 'parse_response', 'parse_resolver', 'system_resolvers', 'resolve']
+
+RECORD_TYPES = {'A': 1, 'CNAME': 5, 'AAAA': 28}
+RECORD_TYPE_NAMES = {code: name for name, code in RECORD_TYPES.items()}
+RCODES = {0: 'NOERROR', 1: 'FORMERR', 2: 'SERVFAIL', 3: 'NXDOMAIN', 4: 'NOTIMP', 5: 'REFUSED'}
+
+
+def build_query(name: str, record_type: str, query_id: int) -> bytes:
+    """
+    Builds a DNS query (with recursion desired) for the name and record type.
+    """
+    header = struct.pack('!HHHHHH', query_id, 0x0100, 1, 0, 0, 0)
+    qname = b''.join(bytes([len(label)]) + label.encode('idna') for label in name.rstrip('.').split('.') if label) + b'\x00'
+    return header + qname + struct.pack('!HH', RECORD_TYPES[record_type], 1)
+
+
+def _read_name(message: bytes, offset: int) -> Tuple[str, int]:
+    """
+    Reads a (possibly compressed) domain name of a DNS message.
+    :return: The name and the offset after it.
+    """
+    labels = []
+    end = None
+    for _ in range(128):  # Bounded, so a malicious pointer loop can't hang the parser
+        length = message[offset]
+        if length & 0xC0 == 0xC0:
+            end = end or offset + 2
+            offset = ((length & 0x3F) << 8) | message[offset + 1]
+        elif length == 0:
+            return '.'.join(labels), end or offset + 1
+        else:
+            labels.append(message[offset + 1:offset + 1 + length].decode('ascii', errors='replace'))
+            offset += 1 + length
+    raise ValueError("too many labels or compression pointers in DNS name")
+
+
+def parse_response(message: bytes) -> Dict:
+    """
+    Parses a DNS response.
+    :return: Its id, rcode, whether it's truncated, and the A, AAAA and CNAME answers as (name, type, ttl, value).
+    """
+    query_id, flags, qdcount, ancount, _, _ = struct.unpack('!HHHHHH', message[:12])
+    offset = 12
+    for _ in range(qdcount):
+        _, offset = _read_name(message, offset)
+        offset += 4
+
+    answers = []
+    for _ in range(ancount):
+        name, offset = _read_name(message, offset)
+        record_type, _, ttl, length = struct.unpack('!HHIH', message[offset:offset + 10])
+        offset += 10
+        rdata = message[offset:offset + length]
+        if record_type == 1:
+            answers.append((name, 'A', ttl, socket.inet_ntop(socket.AF_INET, rdata)))
+        elif record_type == 28:
+            answers.append((name, 'AAAA', ttl, socket.inet_ntop(socket.AF_INET6, rdata)))
+        elif record_type == 5:
+            answers.append((name, 'CNAME', ttl, _read_name(message, offset)[0]))
+        offset += length
+
+    return {'id': query_id, 'rcode': RCODES.get(flags & 0x0F, str(flags & 0x0F)), 'truncated': bool(flags & 0x0200), 'answers': answers}
+
+
+def parse_resolver(resolver: str) -> Tuple[str, int]:
+    """
+    Parses a resolver written as 'ip', 'ip:port', or '[ipv6]:port'.
+    """
+    if resolver.startswith('['):
+        host, _, port = resolver[1:].partition(']:')
+        return host, int(port or 53)
+    if resolver.count(':') == 1:
+        host, port = resolver.split(':')
+        return host, int(port)
+    return resolver, 53
+
+
+def system_resolvers(resolv_conf_path: str = '/etc/resolv.conf') -> List[str]:
+    """
+    Returns the nameservers of resolv.conf.
+    """
+    resolvers = []
+    with open(resolv_conf_path) as resolv_conf:
+        for line in resolv_conf:
+            fields = line.split()
+            if len(fields) >= 2 and fields[0] == 'nameserver':
+                resolvers.append(fields[1])
+    return resolvers
+
+
+def _exchange_tcp(address: Tuple, family: int, query: bytes, timeout: float) -> bytes:
+    with socket.socket(family, socket.SOCK_STREAM) as tcp_socket:
+        tcp_socket.settimeout(timeout)
+        tcp_socket.connect(address)
+        tcp_socket.sendall(struct.pack('!H', len(query)) + query)
+        data = b''
+        while len(data) < 2 or len(data) < 2 + struct.unpack('!H', data[:2])[0]:
+            chunk = tcp_socket.recv(65535)
+            if not chunk:
+                raise ConnectionError("connection closed by the resolver")
+            data += chunk
+        return data[2:]
+
+
+def resolve(resolver: str, name: str, record_type: str, timeout: float = 2.0, retries: int = 2) -> Dict:
+    """
+    Queries a resolver for a record type of a name, over UDP (falling back to TCP if the response is truncated).
+    Timed out queries are retried.
+    :return: rcode, answers (see parse_response), latency in seconds of the successful attempt, attempts, and error (None if answered).
+    """
+    host, port = parse_resolver(resolver)
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    result = {'resolver': resolver, 'name': name, 'type': record_type, 'rcode': None, 'answers': [], 'latency': None, 'attempts': 0,
+              'error': None}
+
+    for attempt in range(retries + 1):
+        result['attempts'] = attempt + 1
+        query_id = random.randint(0, 0xFFFF)
+        query = build_query(name, record_type, query_id)
+        start = time.perf_counter()
+        try:
+            with socket.socket(family, socket.SOCK_DGRAM) as udp_socket:
+                udp_socket.settimeout(timeout)
+                udp_socket.connect((host, port))
+                udp_socket.send(query)
+                while True:
+                    response = parse_response(udp_socket.recv(4096))
+                    # Late responses of previous attempts are ignored
+                    if response['id'] == query_id:
+                        break
+            if response['truncated']:
+                response = parse_response(_exchange_tcp((host, port), family, query, timeout))
+            result.update(rcode=response['rcode'], answers=response['answers'], latency=time.perf_counter() - start, error=None)
+            return result
+        except socket.timeout:
+            result['error'] = "timed out after {} attempts".format(attempt + 1)
+        except (OSError, ValueError, struct.error, IndexError) as error:
+            result['error'] = str(error) or error.__class__.__name__
+            return result
+    return result
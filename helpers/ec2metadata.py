@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# # -*- coding: utf-8 -*-
+
+"""
+    File name: helpers.ec2metadata.py
+    Date created: 19/10/2026
+    Date last modified: 19/10/2026
+    Python Version: 3.7.2
+    Version: 1.0.0
+"""
+
+import http.client
+import json
+import os
+import re
+import tempfile
+import time
+import urllib.parse
+from typing import Dict
+
+from helpers.utils import execute_shell_command_and_return_stdout, get_cache_dir
+
+__all__ = ['IMDS_URL', 'IMDS_FIELDS', 'parse_ec2_metadata', 'fetch_ec2_metadata_imds', 'load_ec2_metadata']
+
+IMDS_URL = 'http://169.254.169.254'
+
+# Fields of the ec2-metadata command that are a single value, and their path in the Instance Metadata Service
+IMDS_FIELDS = {
+    'ami-id': 'ami-id',
+    'ami-launch-index': 'ami-launch-index',
+    'ami-manifest-path': 'ami-manifest-path',
+    'ancestor-ami-ids': 'ancestor-ami-ids',
+    'instance-id': 'instance-id',
+    'instance-type': 'instance-type',
+    'local-hostname': 'local-hostname',
+    'local-ipv4': 'local-ipv4',
+    'kernel-id': 'kernel-id',
+    'placement': 'placement/availability-zone',
+    'product-codes': 'product-codes',
+    'public-hostname': 'public-hostname',
+    'public-ipv4': 'public-ipv4',
+    'ramdisk-id': 'ramdisk-id',
+    'reservation-id': 'reservation-id',
+    'security-groups': 'security-groups',
+}
+
+# Metadata already loaded by this process, and the time it was obtained, by source. Long-running processes (i.e. utExporter) load it
+# again once it's older than the cache ttl
+_loaded = {}
+
+
+def parse_ec2_metadata(text: str) -> Dict:
+    """
+    Parses the stdout of the ec2-metadata command.
+    Single line fields ('instance-type: t2.micro') are strings. Multi-line sections, like block-device-mapping and public-keys,
+    are dicts with their 'key: value' (or 'key:value') lines. A line without key is the value of the previous key
+    (i.e. the public key after 'key:(begins from next line)').
+    """
+    metadata = {}
+    section = None
+    key = None
+    for line in text.split('\n'):
+        if not line.strip():
+            continue
+        field = re.match(r'^([a-z0-9-]+):(?: (.*))?$', line)
+        if field:
+            section = field.group(1)
+            metadata[section] = (field.group(2) or '').strip()
+            key = None
+            continue
+        if section is None:
+            continue
+        if not isinstance(metadata[section], dict):
+            metadata[section] = {}
+        entry = re.match(r'^\s*([\w-]+):\s?(.*)$', line)
+        if entry:
+            key = entry.group(1)
+            metadata[section][key] = entry.group(2).strip()
+        elif key is not None:
+            value = metadata[section][key]
+            metadata[section][key] = line.strip() if value in ('', '(begins from next line)') else value + '\n' + line.strip()
+    return metadata
+
+
+def fetch_ec2_metadata_imds(imds_url: str = IMDS_URL, timeout: float = 2.0) -> Dict:
+    """
+    Fetches the metadata from the Instance Metadata Service (IMDSv2), with the same structure as parse_ec2_metadata.
+    All the requests use the same connection. Missing fields are 'not available'.
+    """
+    url = urllib.parse.urlsplit(imds_url)
+    connection = http.client.HTTPConnection(url.hostname, url.port, timeout=timeout)
+
+    def request(method: str, path: str, headers: Dict[str, str]) -> str:
+        connection.request(method, path, headers=headers)
+        response = connection.getresponse()
+        body = response.read().decode('utf-8')
+        if response.status == 404:
+            return None
+        if response.status != 200:
+            raise http.client.HTTPException("{} {} returned HTTP {}".format(method, path, response.status))
+        return body
+
+    try:
+        token = request('PUT', '/latest/api/token', {'X-aws-ec2-metadata-token-ttl-seconds': '21600'})
+        headers = {'X-aws-ec2-metadata-token': token}
+
+        def get(path: str) -> str:
+            return request('GET', '/latest/meta-data/' + path, headers)
+
+        metadata = {}
+        for field, path in IMDS_FIELDS.items():
+            value = get(path)
+            metadata[field] = value.replace('\n', ' ') if value is not None else 'not available'
+
+        devices = get('block-device-mapping/')
+        metadata['block-device-mapping'] = {device: get('block-device-mapping/' + device) for device in devices.split()} if devices else {}
+
+        keys = get('public-keys/')
+        metadata['public-keys'] = {}
+        if keys:
+            index, keyname = keys.split('\n')[0].split('=', 1)
+            metadata['public-keys'] = {'keyname': keyname, 'index': index, 'format': 'openssh-key',
+                                       'key': (get('public-keys/{}/openssh-key'.format(index)) or '').strip()}
+
+        metadata['user-data'] = request('GET', '/latest/user-data', headers) or ''
+        return metadata
+    finally:
+        connection.close()
+
+
+def load_ec2_metadata(ec2_dummy_path: str = None, backend: str = 'command', cache_path: str = None, cache_ttl: float = 300,
+                      imds_url: str = IMDS_URL, timeout: float = 2.0) -> Dict:
+    """
+    Returns all the EC2 metadata of the instance, fetched once every cache_ttl seconds and parsed (see parse_ec2_metadata).
+    :param ec2_dummy_path: Path to a file that simulates the ec2-metadata stdout. If given, the file is used instead of the backend.
+    :param backend: 'command' runs ec2-metadata (once, for all the fields), 'imds' queries the Instance Metadata Service.
+    :param cache_path: File where the metadata is cached between runs (default=ec2-metadata.json in the utester cache directory).
+    :param cache_ttl: Seconds the cached metadata is valid, in this process and in the cache file (0 disables the cache).
+    :param imds_url: Base URL of the Instance Metadata Service.
+    :param timeout: Timeout of every request to the Instance Metadata Service.
+    """
+    source = (ec2_dummy_path, backend, imds_url)
+    if source in _loaded and time.time() - _loaded[source][0] < cache_ttl:
+        return _loaded[source][1]
+
+    if ec2_dummy_path is not None:
+        with open(os.path.realpath(ec2_dummy_path)) as ec2_dummy_file:
+            metadata = parse_ec2_metadata(ec2_dummy_file.read())
+        _loaded[source] = (time.time(), metadata)
+        return metadata
+
+    cache_path = cache_path or os.path.join(get_cache_dir(), 'ec2-metadata.json')
+    if cache_ttl > 0 and os.path.exists(cache_path) and time.time() - os.path.getmtime(cache_path) < cache_ttl:
+        with open(cache_path) as cache_file:
+            cached = json.load(cache_file)
+        if cached.get('backend') == backend:
+            # It expires when the cached file does
+            _loaded[source] = (os.path.getmtime(cache_path), cached['metadata'])
+            return cached['metadata']
+
+    if backend == 'imds':
+        metadata = fetch_ec2_metadata_imds(imds_url, timeout)
+    else:
+        metadata = parse_ec2_metadata(execute_shell_command_and_return_stdout("ec2-metadata"))
+
+    if cache_ttl > 0 and metadata:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(cache_path)))
+        with os.fdopen(fd, 'w') as tmp_file:
+            json.dump({'backend': backend, 'metadata': metadata}, tmp_file)
+        os.replace(tmp_path, cache_path)
+
+    _loaded[source] = (time.time(), metadata)
+    return metadata
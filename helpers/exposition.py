@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# # -*- coding: utf-8 -*-
+
+"""
+    File name: helpers.exposition.py
+    Date created: 19/10/2026
+    Date last modified: 19/10/2026
+    Python Version: 3.7.2
+    Version: 1.0.0
+"""
+
+import collections
+import fcntl
+import math
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Dict, Iterable, Tuple
+
+__all__ = ['CUMULATIVE_SUFFIXES', 'parse_sample_line', 'format_value', 'format_sample_line', 'parse_families', 'merge_sample_value',
+           'merge_into_textfile', 'scan_exposition']
+
+# Suffixes of the samples whose values are cumulative, by metric type. Their values are added when merging.
+CUMULATIVE_SUFFIXES = {
+    'counter': ('_total',),
+    'histogram': ('_bucket', '_count', '_sum'),
+    'summary': ('_count', '_sum'),
+}
+
+
+def parse_sample_line(line: str) -> Tuple[str, Tuple[Tuple[str, str], ...], float, str]:
+    """
+    Parses a sample line of the Prometheus text exposition format: name{label="value",...} value [timestamp]
+    :return: Name, labels (as a sorted tuple of (name, value) pairs, with the values unescaped), value and timestamp (None if absent).
+    :raise ValueError: If the line is not a valid sample.
+    """
+    line = line.strip()
+    brace = line.find('{')
+    space = line.find(' ')
+    labels = []
+
+    if brace != -1 and (space == -1 or brace < space):
+        name = line[:brace]
+        position = brace + 1
+        while True:
+            while position < len(line) and line[position] in ' ,':
+                position += 1
+            if position < len(line) and line[position] == '}':
+                position += 1
+                break
+            equals = line.find('=', position)
+            if equals == -1 or equals + 1 >= len(line) or line[equals + 1] != '"':
+                raise ValueError("invalid labels in sample: {}".format(line))
+            label_name = line[position:equals].strip()
+            value_chars = []
+            position = equals + 2
+            while True:
+                if position >= len(line):
+                    raise ValueError("unterminated label value in sample: {}".format(line))
+                char = line[position]
+                if char == '\\' and position + 1 < len(line):
+                    escaped = line[position + 1]
+                    value_chars.append('\n' if escaped == 'n' else escaped)
+                    position += 2
+                elif char == '"':
+                    position += 1
+                    break
+                else:
+                    value_chars.append(char)
+                    position += 1
+            labels.append((label_name, ''.join(value_chars)))
+        rest = line[position:].split()
+    else:
+        parts = line.split()
+        name, rest = parts[0], parts[1:]
+
+    if not name or not rest or len(rest) > 2:
+        raise ValueError("invalid sample: {}".format(line))
+    return name, tuple(sorted(labels)), float(rest[0]), rest[1] if len(rest) == 2 else None
+
+
+def format_value(value: float) -> str:
+    """
+    Formats a sample value the way the Prometheus text exposition format expects it.
+    """
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+def format_sample_line(name: str, labels: Tuple[Tuple[str, str], ...], value: float, timestamp: str = None) -> str:
+    """
+    Formats a sample line of the Prometheus text exposition format (the inverse of parse_sample_line).
+    """
+    line = name
+    if labels:
+        line += '{' + ','.join('{}="{}"'.format(label, label_value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"'))
+                               for label, label_value in labels) + '}'
+    line += ' ' + format_value(value)
+    if timestamp is not None:
+        line += ' ' + timestamp
+    return line + '\n'
+
+
+def parse_families(lines: Iterable[str]) -> Dict[str, Dict]:
+    """
+    Parses an exposition into its metric families.
+    :return: For every family name, its HELP and TYPE lines, its type and its samples (keyed by (sample name, labels)).
+    """
+    families = OrderedDict()
+    family = None
+    for line in lines:
+        if line.startswith('# HELP ') or line.startswith('# TYPE '):
+            name = line.split()[2]
+            family = families.setdefault(name, {'header': [], 'type': 'untyped', 'samples': OrderedDict()})
+            family['header'].append(line if line.endswith('\n') else line + '\n')
+            if line.startswith('# TYPE '):
+                family['type'] = line.split()[3]
+        elif line.strip() and not line.startswith('#'):
+            name, labels, value, timestamp = parse_sample_line(line)
+            if family is None:
+                family = families.setdefault(name, {'header': [], 'type': 'untyped', 'samples': OrderedDict()})
+            family['samples'][(name, labels)] = (value, timestamp)
+    return families
+
+
+def merge_sample_value(family_type: str, sample_name: str, old_value: float, new_value: float) -> float:
+    """
+    Returns the merged value of a sample: cumulative samples (counters, histogram buckets, sums and counts) are added,
+    the creation time of a series is kept, and the rest of the samples are replaced.
+    """
+    if sample_name.endswith('_created'):
+        return old_value
+    if sample_name.endswith(CUMULATIVE_SUFFIXES.get(family_type, ())):
+        return old_value + new_value
+    return new_value
+
+
+def merge_into_textfile(path: str, new_exposition: str):
+    """
+    Merges an exposition into an existing textfile. Only the series of the new exposition are touched: cumulative
+    series are added to the existing values, the others are replaced, and new series and families are appended.
+    The existing file is read and rewritten line by line, so its size doesn't matter. The file is locked
+    (with an exclusive lock on '<path>.lock') during the merge and replaced atomically.
+    """
+    new_families = parse_families(new_exposition.splitlines())
+    directory = os.path.dirname(os.path.abspath(path))
+
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as output:
+                written_families = set()
+                family_name = None
+
+                def flush_family():
+                    # Append the samples of the family that were not present in the existing file
+                    family = new_families.get(family_name)
+                    if family is not None:
+                        for (sample_name, labels), (value, timestamp) in family['samples'].items():
+                            output.write(format_sample_line(sample_name, labels, value, timestamp))
+                        family['samples'].clear()
+
+                if os.path.exists(path):
+                    with open(path) as existing:
+                        for line in existing:
+                            if line.startswith('# HELP ') or line.startswith('# TYPE '):
+                                name = line.split()[2]
+                                if name != family_name:
+                                    flush_family()
+                                    family_name = name
+                                    written_families.add(name)
+                            elif line.strip() and not line.startswith('#') and family_name in new_families:
+                                try:
+                                    sample_name, labels, value, timestamp = parse_sample_line(line)
+                                except ValueError:
+                                    output.write(line)
+                                    continue
+                                family = new_families[family_name]
+                                new_sample = family['samples'].pop((sample_name, labels), None)
+                                if new_sample is not None:
+                                    value = merge_sample_value(family['type'], sample_name, value, new_sample[0])
+                                    timestamp = new_sample[1]
+                                    line = format_sample_line(sample_name, labels, value, timestamp)
+                            output.write(line if line.endswith('\n') else line + '\n')
+                flush_family()
+
+                # Families that didn't exist in the file
+                for name, family in new_families.items():
+                    if name not in written_families:
+                        output.writelines(family['header'])
+                        for (sample_name, labels), (value, timestamp) in family['samples'].items():
+                            output.write(format_sample_line(sample_name, labels, value, timestamp))
+
+                output.flush()
+                os.fsync(output.fileno())
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def scan_exposition(chunks: Iterable[bytes], top: int = 5) -> Dict:
+    """
+    Scans an exposition as it's received, without keeping it in memory.
+    :param chunks: Chunks of the exposition body, split anywhere.
+    :param top: Number of highest-cardinality metric families to report.
+    :return: Bytes, series count, number of metric families, the highest-cardinality families (as (name, series) pairs),
+    the number of lines that couldn't be parsed and the first of them.
+    """
+    stats = {'bytes': 0, 'series': 0, 'families': 0, 'top_families': [], 'parse_errors': 0, 'first_parse_error': None}
+    cardinality = collections.Counter()
+    family_name = None
+    pending = b''
+
+    def scan_line(raw_line: bytes):
+        nonlocal family_name
+        line = raw_line.decode('utf-8', errors='replace').strip()
+        if not line:
+            return
+        if line.startswith('#'):
+            if line.startswith('# TYPE ') and len(line.split()) >= 3:
+                family_name = line.split()[2]
+            return
+        try:
+            sample_name = parse_sample_line(line)[0]
+        except ValueError:
+            stats['parse_errors'] += 1
+            stats['first_parse_error'] = stats['first_parse_error'] or line[:200]
+            return
+        # Samples like <family>_bucket or <family>_sum belong to the family of the last TYPE line
+        in_family = family_name is not None and sample_name.startswith(family_name)
+        cardinality[family_name if in_family else sample_name] += 1
+        stats['series'] += 1
+
+    for chunk in chunks:
+        stats['bytes'] += len(chunk)
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for raw_line in lines:
+            scan_line(raw_line)
+    scan_line(pending)
+
+    stats['families'] = len(cardinality)
+    stats['top_families'] = cardinality.most_common(top)
+    return stats
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# # -*- coding: utf-8 -*-
+
+"""
+    File name: helpers.network.py
+    Date created: 19/10/2026
+    Date last modified: 19/10/2026
+    Python Version: 3.7.2
+    Version: 1.0.0
+"""
+
+import math
+import os
+import socket
+import socketserver
+import ssl
+import struct
+import tempfile
+import threading
+import time
+from typing import Dict, List, Tuple
+
+__all__ = ['PROBE_BUFFER_SIZE', 'PROBE_PAYLOAD_SIZE', 'PROBE_MAX_SECONDS', 'PROBE_IDLE_TIMEOUT', 'PROBE_MAX_CONNECTIONS',
+           'unverified_tls_context', 'resolve_address', 'probe_connect', 'NetworkProbeHandler', 'NetworkProbeServer', 'start_network_server',
+           'measure_throughput', 'measure_rtt', 'jitter', 'probe_tls_handshakes']
+
+# Size of the buffers of the network probe, and of the payload file the server sends with sendfile
+PROBE_BUFFER_SIZE = 1024 * 1024
+PROBE_PAYLOAD_SIZE = 8 * 1024 * 1024
+# Maximum seconds of a connection of the network probe server (the default), and seconds a connection can stay idle
+PROBE_MAX_SECONDS = 30.0
+PROBE_IDLE_TIMEOUT = 10.0
+# Maximum connections served at the same time by the network probe server (the default). The ones over it are closed
+PROBE_MAX_CONNECTIONS = 32
+
+
+def unverified_tls_context() -> ssl.SSLContext:
+    """
+    Returns a client TLS context that doesn't verify the certificate of the server (reachability is measured, not trust).
+    """
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def resolve_address(host: str, port: int) -> Tuple[int, tuple]:
+    """
+    Resolves the host, once, to the first TCP address the system resolver returns (the one clients connect to first).
+    :return: address family and socket address.
+    :raise socket.gaierror: If the host can't be resolved.
+    """
+    family, _, _, _, sockaddr = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)[0]
+    return family, sockaddr
+
+
+def probe_connect(host: str, port: int, timeout: float, tls_context: ssl.SSLContext = None, address: Tuple[int, tuple] = None) -> Dict:
+    """
+    Opens a TCP connection (and, with a TLS context, completes the TLS handshake) and closes it.
+    The host is resolved before the connect is timed, so the DNS latency isn't measured as connect latency. Pass the address
+    (see resolve_address) to connect several times to a host resolving it once.
+    :return: connect and handshake seconds (handshake None without TLS), and error: None, 'unresolved', 'refused', 'timeout' or the
+    error message.
+    """
+    result = {'connect': None, 'handshake': None, 'error': None}
+    try:
+        family, sockaddr = address or resolve_address(host, port)
+    except OSError:
+        result['error'] = 'unresolved'
+        return result
+    try:
+        with socket.socket(family, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            start = time.perf_counter()
+            sock.connect(sockaddr)
+            result['connect'] = time.perf_counter() - start
+            if tls_context is not None:
+                start = time.perf_counter()
+                with tls_context.wrap_socket(sock, server_hostname=host):
+                    result['handshake'] = time.perf_counter() - start
+    except ConnectionRefusedError:
+        result['error'] = 'refused'
+    except socket.timeout:
+        result['error'] = 'timeout'
+    except (OSError, ssl.SSLError) as e:
+        result['error'] = str(e)
+    return result
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    """
+    Receives exactly size bytes, or less if the connection is closed.
+    """
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+class NetworkProbeHandler(socketserver.BaseRequestHandler):
+    """
+    Serves a connection of the network probe. The client sends a command line:
+     - UPLOAD: the client sends data until it shuts down its side, and the server answers the received bytes (8 bytes, big endian).
+     - DOWNLOAD <seconds>: the server sends data (with sendfile, without copying it through Python) for the given seconds.
+     - PING: the server echoes every 8 bytes message, until the client closes the connection.
+    The peers aren't authenticated, so no connection lasts more than the max_seconds of the server, and the connections with an invalid
+    command line, or idle for PROBE_IDLE_TIMEOUT seconds, are closed.
+    """
+
+    def handle(self):
+        sock: socket.socket = self.request
+        sock.settimeout(PROBE_IDLE_TIMEOUT)
+        try:
+            self.serve(sock, time.perf_counter() + self.server.max_seconds)
+        except OSError:
+            # The client closed the connection, or it was idle
+            pass
+
+    def serve(self, sock: socket.socket, deadline: float):
+        header = b''
+        while not header.endswith(b'\n') and len(header) < 64:
+            byte = sock.recv(1)
+            if not byte:
+                return
+            header += byte
+        parts = header.split()
+        if not parts:
+            return
+        command, params = parts[0], parts[1:]
+
+        if command == b'UPLOAD' and not params:
+            buffer = memoryview(bytearray(PROBE_BUFFER_SIZE))
+            received = 0
+            while time.perf_counter() < deadline:
+                count = sock.recv_into(buffer)
+                if not count:
+                    break
+                received += count
+            sock.sendall(struct.pack('>Q', received))
+
+        elif command == b'DOWNLOAD' and len(params) == 1:
+            try:
+                seconds = float(params[0])
+            except ValueError:
+                return
+            if not math.isfinite(seconds) or seconds <= 0:
+                return
+            deadline = min(deadline, time.perf_counter() + seconds)
+            with open(self.server.payload_path, 'rb') as payload:
+                while time.perf_counter() < deadline:
+                    sock.sendfile(payload, 0)
+
+        elif command == b'PING' and not params:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            while time.perf_counter() < deadline:
+                message = _recv_exactly(sock, 8)
+                if len(message) < 8:
+                    break
+                sock.sendall(message)
+
+
+class NetworkProbeServer(socketserver.ThreadingTCPServer):
+    """
+    Network probe server. The payload it sends is a temporary file of random data, removed when the server is closed.
+    Every connection lasts at most max_seconds, and at most max_connections are served at the same time (a thread and a buffer each):
+    the connections over it are closed as soon as they are accepted.
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, max_seconds: float = PROBE_MAX_SECONDS, max_connections: int = PROBE_MAX_CONNECTIONS):
+        super().__init__(address, NetworkProbeHandler)
+        self.max_seconds = max_seconds
+        self.slots = threading.BoundedSemaphore(max_connections)
+        fd, self.payload_path = tempfile.mkstemp(prefix='.utester-network-probe-')
+        with os.fdopen(fd, 'wb') as payload:
+            payload.write(os.urandom(PROBE_PAYLOAD_SIZE))
+
+    def process_request(self, request, client_address):
+        if not self.slots.acquire(blocking=False):
+            self.shutdown_request(request)
+            return
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self.slots.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.slots.release()
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.payload_path):
+            os.remove(self.payload_path)
+
+
+def start_network_server(host: str, port: int, max_seconds: float = PROBE_MAX_SECONDS,
+                         max_connections: int = PROBE_MAX_CONNECTIONS) -> NetworkProbeServer:
+    """
+    Starts the network probe server in a background thread. server.shutdown() and server.server_close() stop it.
+    """
+    server = NetworkProbeServer((host, port), max_seconds, max_connections)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _probe_stream(host: str, port: int, direction: str, seconds: float, timeout: float, barrier: threading.Barrier) -> Dict:
+    """
+    Runs a stream of the throughput probe.
+    :return: bytes transferred and seconds, or error.
+    """
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            buffer = memoryview(bytearray(os.urandom(PROBE_BUFFER_SIZE)))
+            barrier.wait(timeout)
+            start = time.perf_counter()
+            if direction == 'upload':
+                sock.sendall(b'UPLOAD\n')
+                deadline = start + seconds
+                while time.perf_counter() < deadline:
+                    sock.sendall(buffer)
+                sock.shutdown(socket.SHUT_WR)
+                # The bytes are counted by the server, and the time ends when all of them have been received
+                transferred = struct.unpack('>Q', _recv_exactly(sock, 8))[0]
+            else:
+                sock.sendall('DOWNLOAD {}\n'.format(seconds).encode())
+                transferred = 0
+                while True:
+                    count = sock.recv_into(buffer)
+                    if not count:
+                        break
+                    transferred += count
+            return {'bytes': transferred, 'seconds': time.perf_counter() - start, 'error': None}
+    except (OSError, struct.error, threading.BrokenBarrierError) as e:
+        return {'bytes': 0, 'seconds': 0.0, 'error': str(e) or e.__class__.__name__}
+
+
+def measure_throughput(host: str, port: int, direction: str, streams: int, seconds: float, timeout: float = 5.0) -> Dict:
+    """
+    Measures the TCP throughput to (upload) or from (download) a network probe server, with several parallel streams.
+    :return: total Mbit/s, Mbit/s of every stream, and the errors of the failed streams.
+    """
+    barrier = threading.Barrier(streams)
+    results: List[Dict] = [None] * streams
+
+    def run_stream(index: int):
+        results[index] = _probe_stream(host, port, direction, seconds, timeout, barrier)
+
+    threads = [threading.Thread(target=run_stream, args=(index,), daemon=True) for index in range(streams)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    streams_mbps = [result['bytes'] * 8 / 1e6 / result['seconds'] for result in results if result['error'] is None]
+    return {'mbps': sum(streams_mbps), 'streams_mbps': streams_mbps, 'errors': [result['error'] for result in results if result['error']]}
+
+
+def measure_rtt(host: str, port: int, count: int, interval: float, timeout: float = 5.0) -> List[float]:
+    """
+    Measures the round trip time of small messages echoed by a network probe server, over one TCP connection without Nagle.
+    :return: round trip time of every message, in seconds.
+    """
+    rtts = []
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(b'PING\n')
+        for sequence in range(count):
+            start = time.perf_counter()
+            sock.sendall(struct.pack('>Q', sequence))
+            if len(_recv_exactly(sock, 8)) < 8:
+                raise ConnectionError("The connection was closed by the server")
+            rtts.append(time.perf_counter() - start)
+            time.sleep(interval)
+    return rtts
+
+
+def jitter(rtts: List[float]) -> float:
+    """
+    Returns the mean difference between consecutive round trip times (the interarrival jitter of RFC 3550, without smoothing).
+    """
+    if len(rtts) < 2:
+        return 0.0
+    return sum(abs(current - previous) for previous, current in zip(rtts, rtts[1:])) / (len(rtts) - 1)
+
+
+def _tls_handshake(host: str, port: int, timeout: float, tls_context: ssl.SSLContext, session: ssl.SSLSession = None) -> Dict:
+    """
+    Connects and completes a TLS handshake (resuming the session, if given).
+    :return: handshake seconds, negotiated protocol and cipher, whether the session was reused, and the session to resume later.
+    """
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        start = time.perf_counter()
+        with tls_context.wrap_socket(sock, server_hostname=host, session=session) as tls_sock:
+            handshake = time.perf_counter() - start
+            # TLS 1.3 servers send the session tickets after the handshake, they are processed when reading
+            tls_sock.settimeout(0.05)
+            try:
+                tls_sock.recv(1)
+            except (socket.timeout, ssl.SSLError, OSError):
+                pass
+            return {'handshake': handshake, 'protocol': tls_sock.version(), 'cipher': tls_sock.cipher()[0],
+                    'reused': tls_sock.session_reused, 'session': tls_sock.session}
+
+
+def probe_tls_handshakes(host: str, port: int, count: int, timeout: float = 5.0, ca_path: str = None) -> Dict:
+    """
+    Measures full TLS handshakes, and handshakes resuming the session of the first one.
+    :param ca_path: CA file the certificate of the server is verified against (default, not verified).
+    :return: latencies of the full and resumed handshakes in seconds, resumed handshakes that actually reused the session,
+    negotiated protocol and cipher, and error (None if every handshake succeeded).
+    """
+    if ca_path:
+        tls_context = ssl.create_default_context(cafile=ca_path)
+        tls_context.check_hostname = False
+    else:
+        tls_context = unverified_tls_context()
+    result = {'full': [], 'resumed': [], 'reused': 0, 'protocol': None, 'cipher': None, 'error': None}
+    try:
+        session = None
+        for _ in range(count):
+            handshake = _tls_handshake(host, port, timeout, tls_context)
+            result['full'].append(handshake['handshake'])
+            result['protocol'], result['cipher'], session = handshake['protocol'], handshake['cipher'], handshake['session']
+        for _ in range(count):
+            handshake = _tls_handshake(host, port, timeout, tls_context, session)
+            result['resumed'].append(handshake['handshake'])
+            result['reused'] += handshake['reused']
+    except (OSError, ssl.SSLError) as e:
+        result['error'] = str(e)
+    return result
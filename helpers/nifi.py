@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# # -*- coding: utf-8 -*-
+
+"""
+    File name: helpers.nifi.py
+    Date created: 19/10/2026
+    Date last modified: 19/10/2026
+    Python Version: 3.7.2
+    Version: 1.0.0
+"""
+
+import http.client
+import json
+import ssl
+import subprocess
+import time
+import urllib.parse
+from typing import Callable, Dict, Tuple
+
+__all__ = ['STATUS_WINDOW_SECONDS', 'NifiApi', 'wait_until', 'service_active_state', 'nifi_api_ready', 'iter_status_snapshots',
+           'connection_pressure']
+
+# Length of the window of the statistics of the status snapshots of NiFi (flowFilesIn, bytesRead...)
+STATUS_WINDOW_SECONDS = 300
+
+
+class NifiApi:
+    """
+    Client of the NiFi REST API. All the requests use the same (keep-alive) connection, that is opened again if it's closed.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 10.0, token: str = None, ca_path: str = None, insecure: bool = False):
+        """
+        :param base_url: URL of NiFi (i.e. https://nifi1:8443). The API is under /nifi-api.
+        :param token: Bearer token of a secured NiFi (see POST /nifi-api/access/token).
+        :param ca_path: CA file the certificate of a secured NiFi is verified against.
+        :param insecure: Don't verify the certificate of a secured NiFi.
+        """
+        url = urllib.parse.urlsplit(base_url)
+        self.host, self.port, self.scheme = url.hostname, url.port, url.scheme
+        self.timeout = timeout
+        self.headers = {'Accept': 'application/json'}
+        if token:
+            self.headers['Authorization'] = 'Bearer {}'.format(token)
+        self.tls_context = None
+        if self.scheme == 'https':
+            self.tls_context = ssl.create_default_context(cafile=ca_path)
+            if insecure:
+                self.tls_context.check_hostname = False
+                self.tls_context.verify_mode = ssl.CERT_NONE
+        self.connection = None
+
+    def get(self, path: str) -> Tuple[int, Dict]:
+        """
+        Sends a GET request to /nifi-api/<path>.
+        :return: HTTP status, and the JSON body (None if it isn't JSON).
+        :raise OSError, http.client.HTTPException: if NiFi can't be reached.
+        """
+        if self.connection is None:
+            if self.scheme == 'https':
+                self.connection = http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout, context=self.tls_context)
+            else:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            self.connection.request('GET', '/nifi-api/' + path.lstrip('/'), headers=self.headers)
+            response = self.connection.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+        try:
+            return response.status, json.loads(body.decode('utf-8'))
+        except ValueError:
+            return response.status, None
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def wait_until(condition: Callable[[], Tuple[bool, str]], deadline: float, initial_delay: float = 1.0, max_delay: float = 15.0,
+               factor: float = 2.0) -> Dict:
+    """
+    Evaluates a condition until it's met or the deadline passes, waiting between evaluations with exponential backoff.
+    :param condition: Function that returns whether the condition is met, and a detail of its current state.
+    :param deadline: time.monotonic() after which the condition isn't evaluated again.
+    :return: whether the condition was met, seconds waited, evaluations and the last detail.
+    """
+    start = time.monotonic()
+    delay = initial_delay
+    attempts = 0
+    while True:
+        attempts += 1
+        met, detail = condition()
+        if met or time.monotonic() >= deadline:
+            return {'met': met, 'seconds': time.monotonic() - start, 'attempts': attempts, 'detail': detail}
+        time.sleep(max(min(delay, deadline - time.monotonic()), 0))
+        delay = min(delay * factor, max_delay)
+
+
+def service_active_state(service: str) -> str:
+    """
+    Returns the systemd active state of a service (active, activating, inactive, failed...).
+    """
+    result = subprocess.run(['systemctl', 'is-active', service], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    return result.stdout.decode('utf-8').strip() or 'unknown'
+
+
+def nifi_api_ready(api: NifiApi, path: str) -> Tuple[bool, str]:
+    """
+    Returns whether the NiFi API answers the readiness path (flow/status or system-diagnostics) with a JSON document,
+    and the current state (HTTP status, or the connection error while Jetty isn't listening yet).
+    """
+    try:
+        status, body = api.get(path)
+    except (OSError, http.client.HTTPException) as e:
+        return False, str(e) or e.__class__.__name__
+    return status == 200 and body is not None, 'HTTP {}'.format(status)
+
+
+def iter_status_snapshots(group_snapshot: Dict, group_name: str = None):
+    """
+    Yields ('connection' or 'processor', snapshot) for the connections and processors of a process group status snapshot
+    (aggregateSnapshot of GET flow/process-groups/<id>/status?recursive=true) and of its descendant groups.
+    Every snapshot gets the name of its process group in 'groupName'.
+    """
+    group_name = group_name or group_snapshot.get('name', '')
+    for entity in group_snapshot.get('connectionStatusSnapshots', []):
+        yield 'connection', dict(entity['connectionStatusSnapshot'], groupName=group_name)
+    for entity in group_snapshot.get('processorStatusSnapshots', []):
+        yield 'processor', dict(entity['processorStatusSnapshot'], groupName=group_name)
+    for entity in group_snapshot.get('processGroupStatusSnapshots', []):
+        child = entity['processGroupStatusSnapshot']
+        yield from iter_status_snapshots(child, "{}/{}".format(group_name, child.get('name', '')))
+
+
+def connection_pressure(snapshot: Dict) -> float:
+    """
+    Returns how close a connection is to its backpressure thresholds: the highest of its object count and data size use, in percent.
+    Backpressure is engaged at 100.
+    """
+    return max(float(snapshot.get('percentUseCount') or 0), float(snapshot.get('percentUseBytes') or 0))
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# # -*- coding: utf-8 -*-
+
+"""
+    File name: helpers.postgre.py
+    Date created: 19/10/2026
+    Date last modified: 19/10/2026
+    Python Version: 3.7.2
+    Version: 1.0.0
+"""
+
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List
+
+__all__ = ['PLAN_SHAPE_KEYS', 'load_named_queries', 'iter_plan_nodes', 'plan_fingerprint', 'rows_estimate_error', 'summarize_plan',
+           'load_plan_baseline', 'save_plan_baseline']
+
+# Attributes of a plan node that define the shape of the plan. Costs, rows and timings are left out on purpose,
+# so the fingerprint only changes when the planner picks a different plan.
+PLAN_SHAPE_KEYS = ['Node Type', 'Strategy', 'Join Type', 'Relation Name', 'Index Name', 'Parent Relationship', 'Scan Direction']
+
+
+def load_named_queries(path: str) -> Dict[str, str]:
+    """
+    Loads a set of named queries. The file can be a JSON object ({"name": "SELECT ..."}) or a SQL file where every query
+    is preceded by a '-- name: <name>' line.
+    """
+    with open(os.path.realpath(path)) as queries_file:
+        content = queries_file.read()
+
+    if path.endswith('.json'):
+        return json.loads(content)
+
+    queries = {}
+    name = None
+    for line in content.split('\n'):
+        match = re.match(r'^\s*--\s*name:\s*(\S+)', line)
+        if match:
+            name = match.group(1)
+            queries[name] = ''
+        elif name is not None:
+            queries[name] += line + '\n'
+    return {name: sql.strip().rstrip(';') for name, sql in queries.items() if sql.strip()}
+
+
+def iter_plan_nodes(plan: Dict):
+    """
+    Yields every node of a plan tree, depth first.
+    """
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from iter_plan_nodes(child)
+
+
+def plan_fingerprint(plan: Dict) -> str:
+    """
+    Returns a compact fingerprint of the shape of a plan tree.
+    """
+    def shape(node):
+        return [[node.get(key) for key in PLAN_SHAPE_KEYS], [shape(child) for child in node.get('Plans', [])]]
+
+    return hashlib.sha1(json.dumps(shape(plan)).encode('utf-8')).hexdigest()[:12]
+
+
+def rows_estimate_error(node: Dict) -> float:
+    """
+    Returns how many times the planner estimate of a node is off from the actual rows (1.0 means exact).
+    Both Plan Rows and Actual Rows are per loop, so the inner nodes of nested loops are compared as they are.
+    """
+    estimated = max(node.get('Plan Rows', 0), 1)
+    actual = max(node.get('Actual Rows', 0), 1)
+    return max(estimated, actual) / min(estimated, actual)
+
+
+def summarize_plan(explain_output: List[Dict]) -> Dict:
+    """
+    Extracts the relevant figures of the output of EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON).
+    """
+    explain = explain_output[0]
+    plan = explain['Plan']
+    worst_node = max(iter_plan_nodes(plan), key=rows_estimate_error)
+    return {
+        'fingerprint': plan_fingerprint(plan),
+        'planning_ms': explain.get('Planning Time'),
+        'execution_ms': explain.get('Execution Time'),
+        'shared_hit_blocks': plan.get('Shared Hit Blocks', 0),
+        'shared_read_blocks': plan.get('Shared Read Blocks', 0),
+        'max_rows_error': round(rows_estimate_error(worst_node), 2),
+        'max_rows_error_node': worst_node.get('Node Type'),
+    }
+
+
+def load_plan_baseline(path: str) -> Dict[str, Dict]:
+    """
+    Loads the stored plan baseline. Returns an empty baseline if the file doesn't exist yet.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+
+def save_plan_baseline(path: str, baseline: Dict[str, Dict]):
+    """
+    Saves the plan baseline, replacing the previous one atomically.
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
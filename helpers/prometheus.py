@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# # -*- coding: utf-8 -*-
+
+"""
+    File name: helpers.prometheus.py
+    Date created: 19/10/2026
+    Date last modified: 19/10/2026
+    Python Version: 3.7.2
+    Version: 1.0.0
+"""
+
+import base64
+import csv
+import gzip
+import http.client
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Dict, Iterator, List
+
+from prometheus_client import CollectorRegistry, generate_latest
+from prometheus_client.core import Metric
+
+from helpers.stats import percentile
+
+__all__ = ['DISTRIBUTIONS', 'generate_observations', 'load_observations', 'QuantileSummaryCollector', 'parse_labels', 'read_metric_samples',
+           'write_registry_atomically', 'pushgateway_url', 'push_to_pushgateway']
+
+DISTRIBUTIONS = ['fixed', 'uniform', 'normal', 'lognormal']
+
+
+def generate_observations(distribution: str, value: float, count: int, spread: float = 0.25, rng: random.Random = None) -> List[float]:
+    """
+    Generates synthetic observations centered on the given value.
+    :param distribution: fixed (always the value), uniform (value +/- spread * value), normal (mean value, stddev spread * value)
+    or lognormal (median value, sigma spread).
+    :param value: Center of the distribution.
+    :param count: Number of observations.
+    :param spread: Relative width of the distribution.
+    :param rng: Random generator to use, to get reproducible observations.
+    :return: The observations. Negative values are clamped to 0.
+    """
+    rng = rng or random.Random()
+    if distribution == 'fixed':
+        return [value] * count
+    elif distribution == 'uniform':
+        return [max(rng.uniform(value * (1 - spread), value * (1 + spread)), 0.0) for _ in range(count)]
+    elif distribution == 'normal':
+        return [max(rng.gauss(value, value * spread), 0.0) for _ in range(count)]
+    elif distribution == 'lognormal':
+        if value <= 0:
+            raise ValueError("The lognormal distribution needs a value greater than 0.")
+        return [rng.lognormvariate(math.log(value), spread) for _ in range(count)]
+    raise ValueError("Unknown distribution '{}'. Possible distributions: {}.".format(distribution, ", ".join(DISTRIBUTIONS)))
+
+
+def load_observations(path: str) -> List[float]:
+    """
+    Reads observations from a file, with one or more numeric values per line. Empty lines and lines starting with '#' are skipped.
+    """
+    observations = []
+    with open(os.path.realpath(path)) as observations_file:
+        for line in observations_file:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                observations.extend(float(value) for value in line.replace(',', ' ').split())
+    return observations
+
+
+class QuantileSummaryCollector(object):
+    """
+    Collector of a Summary metric with quantiles. The Summary of prometheus_client only exposes the count and the sum,
+    so the quantiles are computed here from the observations.
+    """
+
+    def __init__(self, name: str, documentation: str, quantiles: List[float]):
+        self.name = name
+        self.documentation = documentation
+        self.quantiles = quantiles
+        self.observations = []
+
+    def observe(self, value: float):
+        self.observations.append(value)
+
+    def collect(self):
+        metric = Metric(self.name, self.documentation, 'summary')
+        for quantile in self.quantiles:
+            metric.add_sample(self.name, {'quantile': str(quantile)}, percentile(self.observations, quantile * 100) or 0.0)
+        metric.add_sample(self.name + '_count', {}, len(self.observations))
+        metric.add_sample(self.name + '_sum', {}, sum(self.observations))
+        yield metric
+
+
+def parse_labels(labels: str) -> Dict[str, str]:
+    """
+    Parses labels written as 'key1=value1;key2=value2' (the format used in CSV batch files).
+    """
+    return dict(label.split('=', 1) for label in labels.split(';') if label.strip()) if labels else {}
+
+
+def read_metric_samples(path: str, file_format: str = None) -> Iterator[Dict]:
+    """
+    Reads metric samples from an NDJSON or CSV file ('-' reads from stdin), one sample at a time.
+    Every sample has a name, a type (counter, gauge, histogram or summary), a value, and optionally labels, help, and the Pushgateway
+    job and grouping key. In NDJSON the labels and the grouping key are objects, in CSV they are written as 'key1=value1;key2=value2'.
+    Lines that can't be parsed are yielded as {'error': ..., 'line': ...}.
+    :param file_format: ndjson or csv. If None, it's deduced from the file extension (NDJSON by default).
+    """
+    file_format = file_format or ('csv' if path.endswith('.csv') else 'ndjson')
+    samples_file = sys.stdin if path == '-' else open(os.path.realpath(path), newline='')
+    try:
+        if file_format == 'csv':
+            for line_number, row in enumerate(csv.DictReader(samples_file), start=2):
+                try:
+                    yield {'name': row['name'], 'type': row['type'].lower(), 'value': float(row['value']),
+                           'labels': parse_labels(row.get('labels')), 'help': row.get('help') or row['name'],
+                           'job': row.get('job') or None, 'grouping': parse_labels(row.get('grouping')), 'line': line_number}
+                except (KeyError, ValueError, AttributeError) as error:
+                    yield {'error': "invalid sample ({})".format(error), 'line': line_number}
+        else:
+            for line_number, line in enumerate(samples_file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    sample = json.loads(line)
+                    yield {'name': sample['name'], 'type': sample['type'].lower(), 'value': float(sample['value']),
+                           'labels': {key: str(value) for key, value in sample.get('labels', {}).items()},
+                           'help': sample.get('help') or sample['name'], 'job': sample.get('job'),
+                           'grouping': {key: str(value) for key, value in sample.get('grouping', {}).items()}, 'line': line_number}
+                except (KeyError, ValueError, AttributeError, TypeError) as error:
+                    yield {'error': "invalid sample ({})".format(error), 'line': line_number}
+    finally:
+        if samples_file is not sys.stdin:
+            samples_file.close()
+
+
+def write_registry_atomically(path: str, registry: CollectorRegistry):
+    """
+    Writes the registry to a textfile. The content is written to a temporary file in the same directory, which then
+    replaces the target, so readers (i.e. the node-exporter textfile collector) never see a partial file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(generate_latest(registry))
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def pushgateway_url(gateway: str, job: str, grouping_key: Dict[str, str]) -> str:
+    """
+    Returns the URL of a group of a Pushgateway: <gateway>/metrics/job/<job>{/<label>/<value>}.
+    Values that contain '/' or are empty are base64 encoded, as the Pushgateway API requires.
+    """
+    def encode(label: str, value: str) -> str:
+        if '/' in value or not value:
+            return label + '@base64/' + (base64.urlsafe_b64encode(value.encode('utf-8')).decode('utf-8') or '=')
+        return label + '/' + urllib.parse.quote(value, safe='')
+
+    gateway = gateway if '://' in gateway else 'http://' + gateway
+    path = '/metrics/' + '/'.join(encode(label, value) for label, value in [('job', job)] + sorted(grouping_key.items()))
+    return gateway.rstrip('/') + path
+
+
+def push_to_pushgateway(gateway: str, job: str, grouping_key: Dict[str, str], registry: CollectorRegistry, method: str = 'PUT',
+                        compress: bool = False, timeout: float = 10.0, retries: int = 3, backoff: float = 0.5) -> int:
+    """
+    Pushes all the metrics of a registry to a group of a Pushgateway-compatible endpoint in a single request.
+    Connection errors, 429 and 5xx responses are retried with exponential backoff; other errors are not retried.
+    :param method: PUT replaces all the metrics of the group, POST only the metrics with the same name.
+    :param compress: Send the body gzip compressed.
+    :param retries: Number of retries after the first attempt.
+    :param backoff: Seconds to wait before the first retry. It's doubled on every retry.
+    :return: The HTTP status code of the response.
+    :raise urllib.error.URLError: If the push fails after all the retries (or with a non retryable error). Timeouts and connection
+    errors while reading the response are raised as OSError, and malformed responses as http.client.HTTPException.
+    """
+    body = generate_latest(registry)
+    headers = {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+    if compress:
+        body = gzip.compress(body)
+        headers['Content-Encoding'] = 'gzip'
+    request = urllib.request.Request(pushgateway_url(gateway, job, grouping_key), data=body, headers=headers, method=method)
+
+    for attempt in range(retries + 1):
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return response.getcode()
+        except urllib.error.HTTPError as error:
+            if attempt == retries or not (error.code == 429 or error.code >= 500):
+                raise
+        except (urllib.error.URLError, OSError, http.client.HTTPException):
+            # Timeouts and resets while reading the response are raised as they are, not as URLError
+            if attempt == retries:
+                raise
+        time.sleep(backoff * 2 ** attempt)
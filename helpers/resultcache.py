@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# # -*- coding: utf-8 -*-
+
+"""
+    File name: helpers.resultcache.py
+    Date created: 19/10/2026
+    Date last modified: 19/10/2026
+    Python Version: 3.7.2
+    Version: 1.0.0
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Callable, Dict
+
+from helpers.results import HOSTNAME, CheckResult, current_scope, note_status, record_result, worst_status
+from helpers.utils import get_cache_dir, info_message, text_message
+
+__all__ = ['MAX_LOCK_WAIT', 'LOCK_POLL_INTERVAL', 'result_cache_key', 'read_cached_result', 'write_cached_result', 'replay_cached_result',
+           'lock_refresh', 'cached_check', 'add_cache_argument']
+
+# Maximum seconds to wait for the process that refreshes a result, and how often the lock is tried meanwhile
+MAX_LOCK_WAIT = 10.0
+LOCK_POLL_INTERVAL = 0.1
+
+
+def result_cache_key(tester: str, config: Dict, host: str = HOSTNAME) -> str:
+    """
+    Returns the key of the cached result of a check: a hash of the tester, its configuration (built from its arguments, so the
+    arguments that don't change the check, like --output, don't change the key) and the host.
+    """
+    return hashlib.sha256(json.dumps([tester, config, host], sort_keys=True, default=str).encode('utf-8')).hexdigest()[:32]
+
+
+def read_cached_result(cache_path: str) -> Dict:
+    """
+    Returns the cached result, with its age in seconds, or None if there is no (valid) cached result.
+    """
+    try:
+        with open(cache_path) as cache_file:
+            cached = json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+    cached['age'] = time.time() - cached['time']
+    return cached
+
+
+def write_cached_result(cache_path: str, cached: Dict):
+    """
+    Writes the cached result atomically, so the processes that read it never see it half written.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path))
+    with os.fdopen(fd, 'w') as tmp_file:
+        json.dump(cached, tmp_file)
+    os.replace(tmp_path, cache_path)
+
+
+def replay_cached_result(cached: Dict, ttl: float) -> Dict:
+    """
+    Shows the cached result, records the cached results of its checks under the current check and returns its {"logtrace", "status"}.
+    """
+    scope = current_scope()
+    prefix = '' if scope is None or scope is scope.root else scope.path + '/'
+    info_message("Cached result of {:.0f}s ago (ttl {:.0f}s).".format(cached['age'], ttl))
+    for result in cached['results']:
+        text_message("    {} {}: {}".format(result['check'], result['status'], result['message']))
+        if scope is not None:
+            record_result(CheckResult(prefix + result['check'], result['status'], result['seconds'], result['values'], result['message'],
+                                      result['timestamp']), scope.root)
+            scope.note(result['status'])
+    return cached['info']
+
+
+def lock_refresh(lock_file, cache_path: str, ttl: float, max_wait: float) -> Dict:
+    """
+    Waits for the lock of a key, polling it, up to max_wait seconds. A hung refresh (i.e. a check stuck in a network call) never blocks the
+    rest of the processes: they stop waiting when the refreshed result is written, or after max_wait seconds.
+    :return: {'locked': True} if the lock was taken, {'cached': <result>} if the result was refreshed meanwhile, {} after max_wait seconds.
+    """
+    end = time.monotonic() + max_wait
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return {'locked': True}
+        except BlockingIOError:
+            pass
+        cached = read_cached_result(cache_path)
+        if cached is not None and cached['age'] < ttl:
+            return {'cached': cached}
+        if time.monotonic() >= end:
+            return {}
+        time.sleep(LOCK_POLL_INTERVAL)
+
+
+def cached_check(tester: str, config: Dict, ttl: float, check: Callable[[], Dict]) -> Dict:
+    """
+    Returns the cached result of a check if it's younger than ttl seconds, or runs the check and caches its result.
+    Only one process refreshes an expired result, the one that gets the lock of its key: while it runs the check, the rest return the
+    expired result (if it's younger than twice the ttl) or wait for the refreshed one, up to MAX_LOCK_WAIT seconds (or ttl, if it's
+    shorter). If the refresh takes longer, they return the expired result, or UNKNOWN if there is none, without running the check.
+    :param tester: Tester of the check (kafka, redis, postgre, hardware, nifi, prometheus).
+    :param config: Configuration of the check, built from its arguments.
+    :param ttl: Seconds a result is valid (0 disables the cache).
+    :param check: Function that runs the check and returns its {"logtrace", "status"}.
+    :return: {"logtrace", "status"} of the check, with the worst status of the check and of the results of its checks.
+    """
+    if ttl <= 0:
+        return check()
+
+    cache_dir = os.path.join(get_cache_dir(), 'results')
+    os.makedirs(cache_dir, exist_ok=True)
+    key = result_cache_key(tester, config)
+    cache_path = os.path.join(cache_dir, key + '.json')
+
+    cached = read_cached_result(cache_path)
+    if cached is not None and cached['age'] < ttl:
+        return replay_cached_result(cached, ttl)
+
+    with open(os.path.join(cache_dir, key + '.lock'), 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # Another process is refreshing the result
+            if cached is not None and cached['age'] < 2 * ttl:
+                return replay_cached_result(cached, ttl)
+            refresh = lock_refresh(lock_file, cache_path, ttl, min(ttl, MAX_LOCK_WAIT))
+            if 'cached' in refresh:
+                return replay_cached_result(refresh['cached'], ttl)
+            if 'locked' not in refresh:
+                # The check isn't run again: a slow refresh would be repeated by every process waiting for it
+                if cached is not None:
+                    info_message("The cached result is being refreshed by another process for too long, showing the expired one.")
+                    return replay_cached_result(cached, ttl)
+                message = "The result is being refreshed by another process for too long."
+                note_status('UNKNOWN', message)
+                info_message(message)
+                return {"logtrace": message, "status": "UNKNOWN"}
+
+        # The result may have been refreshed while the lock was taken by another process
+        cached = read_cached_result(cache_path)
+        if cached is not None and cached['age'] < ttl:
+            return replay_cached_result(cached, ttl)
+
+        scope = current_scope()
+        first_result = len(scope.root.results) if scope is not None else 0
+        info = check()
+        results = []
+        if scope is not None:
+            info = dict(info, status=worst_status([info['status'], scope.status]))
+            prefix = '' if scope is scope.root else scope.path + '/'
+            for result in scope.root.results[first_result:]:
+                if result.check.startswith(prefix):
+                    results.append(dict(result.to_dict(), check=result.check[len(prefix):]))
+        write_cached_result(cache_path, {'tester': tester, 'host': HOSTNAME, 'time': time.time(), 'info': info, 'results': results})
+    return info
+
+
+def add_cache_argument(parser):
+    """
+    Adds the --cache-ttl argument (seconds the result of the check is cached) to the parser of a tester.
+    """
+    parser.add_argument('--cache-ttl', help='Seconds the result of the check is cached, for the same arguments and host. '
+                                            '0 disables the cache (default=0)', type=float, default=0.0)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# # -*- coding: utf-8 -*-
+
+"""
+    File name: helpers.results.py
+    Date created: 19/10/2026
+    Date last modified: 19/10/2026
+    Python Version: 3.7.2
+    Version: 1.0.0
+"""
+
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from typing import Dict, List
+
+__all__ = ['STATUSES', 'OUTPUT_FORMATS', 'MAX_SCOPE_MESSAGES', 'HOSTNAME', 'normalize_status', 'worst_status', 'CheckResult', 'CheckScope',
+           'current_scope', 'check_scope', 'note_status', 'add_values', 'record_result', 'set_output_format', 'add_output_argument',
+           'finish_results']
+
+# Statuses, from the best to the worst
+STATUSES = ['OK', 'WARNING', 'CRITICAL', 'UNKNOWN']
+OUTPUT_FORMATS = ['text', 'ndjson', 'json']
+
+# Messages kept in a scope (the ones of its worst status), so the scopes that are never closed don't grow forever
+MAX_SCOPE_MESSAGES = 20
+
+HOSTNAME = socket.gethostname()
+
+# Format of the results, and the stream they are written to (the real stdout, when the messages are sent to stderr)
+_output = {'format': 'text', 'stream': sys.stdout}
+_output_lock = threading.Lock()
+
+# Stack of the check scopes open in every thread
+_scopes = threading.local()
+
+
+def normalize_status(status: str) -> str:
+    """
+    Returns the status in upper case ('Ok' is OK). Unknown statuses (and None) are UNKNOWN.
+    """
+    status = str(status).upper()
+    return status if status in STATUSES else 'UNKNOWN'
+
+
+def worst_status(statuses) -> str:
+    """
+    Returns the worst of the statuses (OK if there are none).
+    """
+    return max((normalize_status(status) for status in statuses), key=STATUSES.index, default='OK')
+
+
+class CheckResult(object):
+    """
+    Result of a check: its name (the path of its scope, i.e. 'fs' or 'hw/hardware/fs'), status, duration, measured values and message.
+    """
+
+    def __init__(self, check: str, status: str, seconds: float, values: Dict = None, message: str = '', timestamp: float = None):
+        self.check = check
+        self.status = normalize_status(status)
+        self.seconds = seconds
+        self.values = values or {}
+        self.message = message
+        self.timestamp = timestamp if timestamp is not None else time.time()
+
+    def to_dict(self) -> Dict:
+        return {'timestamp': round(self.timestamp, 3), 'host': HOSTNAME, 'check': self.check, 'status': self.status,
+                'seconds': round(self.seconds, 6) if self.seconds is not None else None, 'values': self.values, 'message': self.message}
+
+
+class CheckScope(object):
+    """
+    Collects the status, messages and values of a check while it runs, and records its result when it's closed.
+    The results of all the scopes under a root scope are collected in the results of the root scope.
+    """
+
+    def __init__(self, name: str, parent: 'CheckScope' = None):
+        self.name = name
+        self.parent = parent
+        self.root = parent.root if parent is not None else self
+        self.path = name if parent is None or parent is self.root else '{}/{}'.format(parent.path, name)
+        self.start = time.perf_counter()
+        self.status = 'OK'
+        self.messages: List[str] = []
+        self.values: Dict = {}
+        self.results: List[CheckResult] = []
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def note(self, status: str, message: str = None):
+        """
+        Takes into account a status of the check (and its message): the status of the check is the worst one noted.
+        """
+        status = normalize_status(status)
+        with self.lock:
+            if STATUSES.index(status) > STATUSES.index(self.status):
+                self.status, self.messages = status, []
+            if message and status == self.status and len(self.messages) < MAX_SCOPE_MESSAGES:
+                self.messages.append(message)
+
+    def close(self, status: str = 'OK', message: str = None) -> CheckResult:
+        """
+        Records the result of the check, with the worst of the status passed and the ones noted, and passes it to the parent scope.
+        A scope is only closed once: closing it again (i.e. when an abandoned check finishes) records nothing and returns None.
+        """
+        with self.lock:
+            if self.closed:
+                return None
+            self.closed = True
+        self.note(status, message)
+        result = CheckResult(self.path, self.status, time.perf_counter() - self.start, self.values, " ".join(self.messages))
+        record_result(result, self.root)
+        if self.parent is not None:
+            self.parent.note(result.status)
+        return result
+
+    def __enter__(self):
+        _scope_stack().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        _scope_stack().remove(self)
+        if self.closed:
+            # Closed as UNKNOWN by the thread that abandoned it
+            pass
+        elif exc_type is not None:
+            self.close('UNKNOWN', "{}: {}".format(exc_type.__name__, exc_value))
+        else:
+            self.close()
+        return False
+
+
+def _scope_stack() -> List[CheckScope]:
+    if not hasattr(_scopes, 'stack'):
+        _scopes.stack = []
+    return _scopes.stack
+
+
+def current_scope() -> CheckScope:
+    """
+    Returns the innermost check scope of the current thread. The main thread is always in the scope of the script (see exit_to_icinga).
+    """
+    stack = _scope_stack()
+    if stack:
+        return stack[-1]
+    if threading.current_thread() is threading.main_thread():
+        stack.append(CheckScope(os.path.splitext(os.path.basename(sys.argv[0] or 'utester'))[0]))
+        return stack[-1]
+    return None
+
+
+def check_scope(name: str, parent: CheckScope = None) -> CheckScope:
+    """
+    Opens the scope of a check (use it with 'with'), under the parent scope or the current scope of the thread.
+    The status of the check is the worst of its messages (see note_status) and of the checks under it. If it raises, it's UNKNOWN.
+    """
+    return CheckScope(name, parent or current_scope())
+
+
+def note_status(status: str, message: str = None):
+    """
+    Takes into account a status (and its message) in the current check. Called by ok_message, error_message...
+    """
+    scope = current_scope()
+    if scope is not None:
+        scope.note(status, message)
+
+
+def add_values(**values):
+    """
+    Adds measured values (latencies, throughputs, counts...) to the result of the current check.
+    """
+    scope = current_scope()
+    if scope is not None:
+        with scope.lock:
+            scope.values.update(values)
+
+
+def record_result(result: CheckResult, root: CheckScope):
+    """
+    Collects a result in the results of the root scope and, if the output is NDJSON, writes it as soon as it's recorded.
+    """
+    with root.lock:
+        root.results.append(result)
+    if _output['format'] == 'ndjson':
+        with _output_lock:
+            _output['stream'].write(json.dumps(result.to_dict()) + "\n")
+            _output['stream'].flush()
+
+
+def set_output_format(output_format: str):
+    """
+    Sets the format of the results: text (only the messages), ndjson (a JSON line per result, as soon as every check finishes)
+    or json (a JSON document with all the results, at the end). With ndjson and json, the results are the only output on stdout,
+    and the messages are sent to stderr.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError("Unknown output format '{}'. Possible formats: {}.".format(output_format, ", ".join(OUTPUT_FORMATS)))
+    if output_format != 'text' and _output['format'] == 'text':
+        _output['stream'] = sys.stdout
+        sys.stdout = sys.stderr
+    _output['format'] = output_format
+
+
+def add_output_argument(parser):
+    """
+    Adds the --output argument (format of the results) to the parser of a tester.
+    """
+    parser.add_argument('-of', '--output', help='Format of the results: text, ndjson or json (default=text). With ndjson and json the messages '
+                                                'are sent to stderr', type=str, choices=OUTPUT_FORMATS, default='text')
+
+
+def finish_results(status: str, logtrace: str) -> str:
+    """
+    Closes the scope of the script with the status of the check, and writes the results if the output is JSON.
+    :return: The worst status of the script and of all its checks.
+    """
+    scope = current_scope().root
+    result = scope.close(status, logtrace) or CheckResult(scope.path, scope.status, None, scope.values, logtrace)
+    if _output['format'] == 'json':
+        with _output_lock:
+            json.dump({'status': result.status, 'logtrace': logtrace, 'results': [result.to_dict() for result in scope.results]},
+                      _output['stream'])
+            _output['stream'].write("\n")
+            _output['stream'].flush()
+    return result.status
+
+
+# The main thread is in the scope of the script since this module is imported
+if threading.current_thread() is threading.main_thread():
+    current_scope()
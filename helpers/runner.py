@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# # -*- coding: utf-8 -*-
+
+"""
+    File name: helpers.runner.py
+    Date created: 19/10/2026
+    Date last modified: 19/10/2026
+    Python Version: 3.7.2
+    Version: 1.0.0
+"""
+
+import importlib
+import logging
+import sys
+import threading
+import time
+from typing import Dict, List
+
+from helpers.resultcache import cached_check
+from helpers.results import check_scope, worst_status
+from helpers.utils import log_traceback
+
+__all__ = ['TESTERS', 'import_seconds', 'load_tester', 'run_tester']
+
+log = logging.getLogger(__name__)
+
+# Module and check function of every tester. The modules are imported the first time one of their checks runs,
+# so the client libraries of the testers that are not used (confluent_kafka, psycopg2, redis...) are never imported.
+TESTERS = {
+    'kafka': ('utKafka', 'send_to_kafka'),
+    'redis': ('utRedis', 'communicate_with_redis'),
+    'postgre': ('utPostgre', 'check_postgre'),
+    'hardware': ('utHardware', 'check_hardware'),
+    'nifi': ('utNifi', 'run_operation'),
+}
+
+# Seconds it took to import the module of every tester loaded by this process (its cold start)
+import_seconds: Dict[str, float] = {}
+# Checks of the same tester can start at the same time: the first one imports its module, and the rest wait for the import to finish
+_import_lock = threading.Lock()
+
+
+def load_tester(tester: str):
+    """
+    Imports (only once) the module of the tester and returns it.
+    """
+    if tester not in TESTERS:
+        raise ValueError("Unknown tester '{}'. Possible testers: {}.".format(tester, ", ".join(TESTERS)))
+    with _import_lock:
+        if TESTERS[tester][0] in sys.modules:
+            return sys.modules[TESTERS[tester][0]]
+        start = time.perf_counter()
+        module = importlib.import_module(TESTERS[tester][0])
+        import_seconds.setdefault(tester, time.perf_counter() - start)
+        return module
+
+
+def run_tester(tester: str, argv: List[str], ttl: float = 0.0) -> Dict:
+    """
+    Runs the check of a tester in this process, with the same arguments that would be passed to its script.
+    :param tester: Tester name (kafka, redis, postgre, hardware, nifi).
+    :param argv: Command line arguments of the tester script.
+    :param ttl: Seconds the result of the check is cached (see helpers.resultcache, 0 disables the cache).
+    :return: The {"logtrace", "status"} dict returned by the check, with the worst status of the check and of the results of its checks.
+    If the check can't run, the status is UNKNOWN.
+    """
+    with check_scope(tester) as scope:
+        try:
+            module = load_tester(tester)
+            args = module.parse_args(argv)
+            config = module.build_config(args)
+            info = cached_check(tester, config, ttl, lambda: getattr(module, TESTERS[tester][1])(config))
+        except SystemExit:
+            # argparse exits on invalid arguments
+            info = {"logtrace": "INVALID ARGUMENTS {}".format(argv), "status": "UNKNOWN"}
+        except Exception as ex:
+            log_traceback(log, ex, sys.exc_info()[2])
+            info = {"logtrace": "{}: {}".format(ex.__class__.__name__, ex), "status": "UNKNOWN"}
+        scope.note(info['status'], info['logtrace'])
+    return dict(info, status=worst_status([info['status'], scope.status]))
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# # -*- coding: utf-8 -*-
+
+"""
+    File name: helpers.sampler.py
+    Date created: 19/10/2026
+    Date last modified: 19/10/2026
+    Python Version: 3.7.2
+    Version: 1.0.0
+"""
+
+import fnmatch
+import struct
+import sys
+import time
+from array import array
+from typing import Dict, List, Tuple
+
+import psutil
+
+__all__ = ['DUMP_MAGIC', 'DUMP_HEADER', 'DISK_COUNTERS', 'NIC_COUNTERS', 'RingBuffer', 'load_ring_buffer', 'is_counter', 'sample_fields',
+           'take_sample', 'series', 'matching_fields', 'sustained_breaches']
+
+# Header of the binary dumps of a ring buffer: magic, version, number of fields, number of samples, length of the field names
+DUMP_MAGIC = b'UTSB'
+DUMP_HEADER = struct.Struct('<4sHIII')
+
+# Counters of psutil (cumulative since boot). Their rolling rates (per second) are what is shown and checked
+DISK_COUNTERS = ('read_bytes', 'write_bytes', 'read_count', 'write_count', 'busy_time')
+NIC_COUNTERS = ('bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv', 'errin', 'errout', 'dropin', 'dropout')
+
+
+class RingBuffer:
+    """
+    Fixed size buffer of samples, stored in a preallocated array of doubles (one row of fields per sample), that overwrites
+    the oldest samples once it's full.
+    """
+
+    def __init__(self, fields: List[str], capacity: int):
+        self.fields = list(fields)
+        self.index = {field: position for position, field in enumerate(self.fields)}
+        self.capacity = capacity
+        self.width = len(self.fields)
+        self.values = array('d', bytes(8 * self.width * capacity))
+        self.count = 0
+        self.next = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, sample: List[float]):
+        start = self.next * self.width
+        self.values[start:start + self.width] = array('d', sample)
+        self.next = (self.next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def rows(self) -> List[int]:
+        """
+        Returns the positions of the stored samples, from the oldest to the newest.
+        """
+        first = (self.next - self.count) % self.capacity
+        return [(first + offset) % self.capacity for offset in range(self.count)]
+
+    def column(self, field: str, last: int = None) -> List[float]:
+        """
+        Returns the values of a field, from the oldest to the newest (only the last samples, if given).
+        """
+        position = self.index[field]
+        rows = self.rows()
+        if last is not None:
+            rows = rows[-last:]
+        return [self.values[row * self.width + position] for row in rows]
+
+    def dump(self, path: str):
+        """
+        Writes the samples, from the oldest to the newest, to a binary file: the header (DUMP_HEADER), the field names separated by
+        new lines, and the rows of little endian doubles.
+        """
+        names = '\n'.join(self.fields).encode()
+        rows = array('d')
+        for row in self.rows():
+            rows.extend(self.values[row * self.width:(row + 1) * self.width])
+        if sys.byteorder == 'big':
+            rows.byteswap()
+        with open(path, 'wb') as dump_file:
+            dump_file.write(DUMP_HEADER.pack(DUMP_MAGIC, 1, self.width, self.count, len(names)))
+            dump_file.write(names)
+            rows.tofile(dump_file)
+
+
+def load_ring_buffer(path: str) -> RingBuffer:
+    """
+    Reads a binary dump written by RingBuffer.dump.
+    """
+    with open(path, 'rb') as dump_file:
+        magic, version, width, count, names_length = DUMP_HEADER.unpack(dump_file.read(DUMP_HEADER.size))
+        if magic != DUMP_MAGIC or version != 1:
+            raise ValueError("{} isn't a sampler dump".format(path))
+        buffer = RingBuffer(dump_file.read(names_length).decode().split('\n'), max(count, 1))
+        rows = array('d')
+        rows.fromfile(dump_file, width * count)
+    if sys.byteorder == 'big':
+        rows.byteswap()
+    for row in range(count):
+        buffer.append(rows[row * width:(row + 1) * width])
+    return buffer
+
+
+def is_counter(field: str) -> bool:
+    """
+    Returns whether a field of the samples is a counter (the disk and NIC fields) instead of a gauge.
+    """
+    return field.startswith(('disk:', 'net:'))
+
+
+def sample_fields() -> List[str]:
+    """
+    Returns the fields of the samples of this machine: time, CPU (total, steal and per core, in percent), memory and swap (percent),
+    the counters of every disk (disk:<name>:<counter>) and of every NIC (net:<name>:<counter>).
+    Also primes the CPU percentages, that psutil computes since the previous call.
+    """
+    psutil.cpu_percent(percpu=True)
+    psutil.cpu_times_percent()
+    cores = ['cpu{}'.format(core) for core in range(psutil.cpu_count() or 1)]
+    counters = ['disk:{}:{}'.format(disk, counter) for disk in sorted(psutil.disk_io_counters(perdisk=True) or {}) for counter in DISK_COUNTERS]
+    counters += ['net:{}:{}'.format(nic, counter) for nic in sorted(psutil.net_io_counters(pernic=True) or {}) for counter in NIC_COUNTERS]
+    return ['time', 'cpu', 'cpu_steal'] + cores + ['mem_percent', 'swap_percent'] + counters
+
+
+def take_sample(fields: List[str]) -> List[float]:
+    """
+    Returns the current values of the fields (see sample_fields). Disks and NICs that disappeared are sampled as 0.
+    """
+    values = {'time': time.time(), 'mem_percent': psutil.virtual_memory().percent, 'swap_percent': psutil.swap_memory().percent}
+    cores = psutil.cpu_percent(percpu=True)
+    values['cpu'] = sum(cores) / max(len(cores), 1)
+    values['cpu_steal'] = getattr(psutil.cpu_times_percent(), 'steal', 0.0)
+    for core, percent in enumerate(cores):
+        values['cpu{}'.format(core)] = percent
+    for disk, disk_counters in (psutil.disk_io_counters(perdisk=True) or {}).items():
+        for counter in DISK_COUNTERS:
+            values['disk:{}:{}'.format(disk, counter)] = getattr(disk_counters, counter, 0)
+    for nic, nic_counters in (psutil.net_io_counters(pernic=True) or {}).items():
+        for counter in NIC_COUNTERS:
+            values['net:{}:{}'.format(nic, counter)] = getattr(nic_counters, counter, 0)
+    return [float(values.get(field, 0.0)) for field in fields]
+
+
+def series(buffer: RingBuffer, field: str, last: int = None) -> List[float]:
+    """
+    Returns the values of a field over the last samples: the values of a gauge, or the rates per second of a counter
+    (one less value than samples; a counter that went back, i.e. reset, gives no rate for that interval).
+    """
+    values = buffer.column(field, None if last is None else last + is_counter(field))
+    if not is_counter(field):
+        return values
+    times = buffer.column('time', None if last is None else last + 1)
+    return [(current - previous) / (current_time - previous_time)
+            for previous, current, previous_time, current_time in zip(values, values[1:], times, times[1:])
+            if current >= previous and current_time > previous_time]
+
+
+def matching_fields(buffer: RingBuffer, pattern: str) -> List[str]:
+    """
+    Returns the fields that match a shell-style pattern (i.e. disk:*:busy_time).
+    """
+    return [field for field in buffer.fields if field != 'time' and fnmatch.fnmatchcase(field, pattern)]
+
+
+def sustained_breaches(buffer: RingBuffer, thresholds: List[Dict], interval: float) -> List[Tuple[Dict, str, float]]:
+    """
+    Returns the thresholds breached by every sample of their sustain period (at least one sample).
+    :param thresholds: {'metric': field or pattern, 'above' and/or 'below': value, 'for': seconds the breach must last (default 0)}.
+    :param interval: Seconds between samples.
+    :return: (threshold, field, last value) of every breach.
+    """
+    breaches = []
+    for threshold in thresholds:
+        samples = max(int(round(threshold.get('for', 0) / interval)), 1)
+        for field in matching_fields(buffer, threshold['metric']):
+            values = series(buffer, field, samples)
+            if len(values) < samples:
+                continue
+            if 'above' in threshold and all(value > threshold['above'] for value in values) or \
+                    'below' in threshold and all(value < threshold['below'] for value in values):
+                breaches.append((threshold, field, values[-1]))
+    return breaches
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# # -*- coding: utf-8 -*-
+
+"""
+    File name: helpers.sntp.py
+    Date created: 19/10/2026
+    Date last modified: 19/10/2026
+    Python Version: 3.7.2
+    Version: 1.0.0
+"""
+
+import ctypes
+import ctypes.util
+import socket
+import struct
+import time
+from typing import Dict, Tuple
+
+__all__ = ['NTP_EPOCH_OFFSET', 'NTP_PACKET', 'NTP_PORT', 'CLOCK_STATES', 'STA_UNSYNC', 'STA_NANO', 'to_ntp_time', 'from_ntp_time',
+           'parse_server', 'query_sntp', 'best_sntp_sample', 'Timex', 'kernel_time_status']
+
+# Seconds between the NTP epoch (1900) and the Unix epoch (1970)
+NTP_EPOCH_OFFSET = 2208988800
+NTP_PACKET = struct.Struct('>BBbbII4sQQQQ')
+NTP_PORT = 123
+
+# Clock states returned by adjtimex, and the status bits we look at
+CLOCK_STATES = {0: 'TIME_OK', 1: 'TIME_INS', 2: 'TIME_DEL', 3: 'TIME_OOP', 4: 'TIME_WAIT', 5: 'TIME_ERROR'}
+STA_UNSYNC = 0x0040
+STA_NANO = 0x2000
+
+
+def to_ntp_time(unix_time: float) -> int:
+    return int((unix_time + NTP_EPOCH_OFFSET) * 2 ** 32)
+
+
+def from_ntp_time(ntp_time: int) -> float:
+    return ntp_time / 2 ** 32 - NTP_EPOCH_OFFSET
+
+
+def parse_server(server: str) -> Tuple[str, int]:
+    """
+    Splits 'host', 'host:port' or '[ipv6]:port' into host and port (default 123).
+    """
+    if server.startswith('['):
+        host, _, port = server[1:].partition(']:')
+        return host.rstrip(']'), int(port) if port else NTP_PORT
+    if server.count(':') == 1:
+        host, port = server.split(':')
+        return host, int(port)
+    return server, NTP_PORT
+
+
+def query_sntp(server: str, timeout: float = 2.0) -> Dict:
+    """
+    Sends a SNTPv4 client request (RFC 4330) and computes the offset of the local clock from the server:
+    offset = ((t2 - t1) + (t3 - t4)) / 2 and delay = (t4 - t1) - (t3 - t2), where t1 and t4 are the local send and receive times,
+    and t2 and t3 the server receive and transmit times.
+    :return: server, offset and delay in seconds, stratum, leap indicator, reference id and error (None if answered).
+    """
+    result = {'server': server, 'offset': None, 'delay': None, 'stratum': None, 'leap': None, 'reference': None, 'error': None}
+    host, port = parse_server(server)
+    try:
+        address = socket.getaddrinfo(host, port, 0, socket.SOCK_DGRAM)[0]
+        with socket.socket(address[0], socket.SOCK_DGRAM) as sock:
+            sock.settimeout(timeout)
+            t1 = time.time()
+            transmit = to_ntp_time(t1)
+            # LI 0, version 4, mode 3 (client). The server copies our transmit timestamp into the originate timestamp
+            sock.sendto(NTP_PACKET.pack(0x23, 0, 0, 0, 0, 0, b'\0' * 4, 0, 0, 0, transmit), address[4])
+            while True:
+                data, _ = sock.recvfrom(1024)
+                t4 = time.time()
+                if len(data) >= NTP_PACKET.size:
+                    break
+    except socket.timeout:
+        result['error'] = 'timeout'
+        return result
+    except OSError as e:
+        result['error'] = str(e)
+        return result
+
+    flags, stratum, _, _, _, _, reference, _, originate, receive, transmit_server = NTP_PACKET.unpack(data[:NTP_PACKET.size])
+    result['leap'] = flags >> 6
+    result['stratum'] = stratum
+    result['reference'] = reference.decode('ascii', 'replace').strip('\0') if stratum <= 1 else socket.inet_ntoa(reference)
+    if originate != transmit:
+        result['error'] = 'the response doesn\'t match the request'
+    elif stratum == 0:
+        result['error'] = 'kiss of death {}'.format(result['reference'])
+    elif result['leap'] == 3:
+        result['error'] = 'the server clock isn\'t synchronized'
+    else:
+        t2, t3 = from_ntp_time(receive), from_ntp_time(transmit_server)
+        result['offset'] = ((t2 - t1) + (t3 - t4)) / 2
+        result['delay'] = (t4 - t1) - (t3 - t2)
+    return result
+
+
+def best_sntp_sample(server: str, samples: int, timeout: float = 2.0) -> Dict:
+    """
+    Queries a server several times and returns the answer with the lowest delay (the least affected by queueing), or the last error.
+    """
+    best = None
+    for _ in range(samples):
+        result = query_sntp(server, timeout)
+        if result['error'] is None and (best is None or best['error'] is not None or result['delay'] < best['delay']):
+            best = result
+        elif best is None:
+            best = result
+    return best
+
+
+class Timex(ctypes.Structure):
+    """
+    struct timex of the Linux kernel (see man adjtimex).
+    """
+    _fields_ = [('modes', ctypes.c_uint), ('offset', ctypes.c_long), ('freq', ctypes.c_long), ('maxerror', ctypes.c_long),
+                ('esterror', ctypes.c_long), ('status', ctypes.c_int), ('constant', ctypes.c_long), ('precision', ctypes.c_long),
+                ('tolerance', ctypes.c_long), ('time_sec', ctypes.c_long), ('time_usec', ctypes.c_long), ('tick', ctypes.c_long),
+                ('ppsfreq', ctypes.c_long), ('jitter', ctypes.c_long), ('shift', ctypes.c_int), ('stabil', ctypes.c_long),
+                ('jitcnt', ctypes.c_long), ('calcnt', ctypes.c_long), ('errcnt', ctypes.c_long), ('stbcnt', ctypes.c_long),
+                ('tai', ctypes.c_int), ('reserved', ctypes.c_int * 11)]
+
+
+def kernel_time_status() -> Dict:
+    """
+    Reads the synchronization state of the kernel clock with adjtimex (without modifying it, so no privileges are needed).
+    :return: clock state, whether it's synchronized, offset, maximum and estimated error in seconds, and frequency adjustment in ppm;
+    or None where adjtimex isn't available.
+    """
+    library = ctypes.util.find_library('c')
+    if library is None:
+        return None
+    libc = ctypes.CDLL(library, use_errno=True)
+    if not hasattr(libc, 'adjtimex'):
+        return None
+    timex = Timex()
+    state = libc.adjtimex(ctypes.byref(timex))
+    if state < 0:
+        return None
+    return {
+        'state': CLOCK_STATES.get(state, str(state)),
+        'synchronized': state != 5 and not timex.status & STA_UNSYNC,
+        'offset': timex.offset / (1e9 if timex.status & STA_NANO else 1e6),
+        'maxerror': timex.maxerror / 1e6,
+        'esterror': timex.esterror / 1e6,
+        'freq_ppm': timex.freq / 65536,
+    }
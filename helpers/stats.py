@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# # -*- coding: utf-8 -*-
+
+"""
+    File name: helpers.stats.py
+    Date created: 19/10/2026
+    Date last modified: 19/10/2026
+    Python Version: 3.7.2
+    Version: 1.0.0
+"""
+
+from typing import Dict, List, Sequence
+
+__all__ = ['percentile', 'summarize']
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    """
+    Returns the p-th percentile (0-100) of the values, interpolating linearly between the closest ranks.
+    Returns None if there are no values.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(values: Sequence[float], percentiles: List[float] = (50, 90, 99)) -> Dict[str, float]:
+    """
+    Returns the count, min, mean, max and the requested percentiles of the values.
+    """
+    if not values:
+        return {'count': 0}
+    summary = {'count': len(values), 'min': min(values), 'mean': sum(values) / len(values), 'max': max(values)}
+    for p in percentiles:
+        summary['p{:g}'.format(p)] = percentile(values, p)
+    return summary
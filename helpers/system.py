@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# # -*- coding: utf-8 -*-
+
+"""
+    File name: helpers.system.py
+    Date created: 19/10/2026
+    Date last modified: 19/10/2026
+    Python Version: 3.7.2
+    Version: 1.0.0
+"""
+
+import os
+import re
+from typing import List, Set, Tuple
+
+__all__ = ['LISTEN_STATES', 'listening_ports', 'read_hosts_file', 'current_timezone', 'human_size', 'process_age']
+
+# Socket states of /proc/net/{tcp,udp}[6] that mean the socket is listening: TCP_LISTEN for TCP,
+# and TCP_CLOSE (unconnected) for UDP, which is what netstat -l shows for UDP.
+LISTEN_STATES = {'tcp': '0A', 'tcp6': '0A', 'udp': '07', 'udp6': '07'}
+
+
+def listening_ports(proc_net_path: str = '/proc/net') -> Set[int]:
+    """
+    Returns the ports with a listening TCP socket or a bound UDP socket, reading /proc/net/{tcp,tcp6,udp,udp6}
+    (the same information as netstat -tunl, without needing net-tools).
+    :param proc_net_path: Directory with the tcp, tcp6, udp and udp6 files. Missing files (i.e. IPv6 disabled) are skipped.
+    """
+    ports = set()
+    for protocol, listen_state in LISTEN_STATES.items():
+        path = os.path.join(proc_net_path, protocol)
+        if not os.path.exists(path):
+            continue
+        with open(path) as sockets_file:
+            next(sockets_file, None)  # Header line
+            for line in sockets_file:
+                fields = line.split()
+                # Fields: sl local_address rem_address st ... where local_address is <hex ip>:<hex port>
+                if len(fields) > 3 and fields[3] == listen_state:
+                    ports.add(int(fields[1].rsplit(':', 1)[1], 16))
+    return ports
+
+
+def read_hosts_file(path: str = '/etc/hosts') -> List[Tuple[str, List[str]]]:
+    """
+    Parses a hosts file.
+    :return: (ip, names) of every entry, in the order of the file. Comments and empty lines are skipped.
+    """
+    entries = []
+    with open(path) as hosts_file:
+        for line in hosts_file:
+            fields = line.split('#', 1)[0].split()
+            if len(fields) >= 2:
+                entries.append((fields[0], fields[1:]))
+    return entries
+
+
+def current_timezone(localtime_path: str = '/etc/localtime', timezone_path: str = '/etc/timezone',
+                     clock_path: str = '/etc/sysconfig/clock') -> str:
+    """
+    Returns the name of the system timezone (i.e. Europe/Madrid), like timedatectl does: from the target of the /etc/localtime symlink,
+    or else from /etc/timezone (Debian) or /etc/sysconfig/clock (RHEL). Returns None if it can't be found.
+    """
+    if os.path.islink(localtime_path):
+        target = os.readlink(localtime_path)
+        if 'zoneinfo/' in target:
+            return target.split('zoneinfo/', 1)[1]
+
+    if os.path.exists(timezone_path):
+        with open(timezone_path) as timezone_file:
+            timezone = timezone_file.read().strip()
+            if timezone:
+                return timezone
+
+    if os.path.exists(clock_path):
+        with open(clock_path) as clock_file:
+            match = re.search(r'^\s*ZONE\s*=\s*"?([^"\s]+)"?', clock_file.read(), re.MULTILINE)
+            if match:
+                return match.group(1)
+
+    return None
+
+
+def human_size(size: float) -> str:
+    """
+    Formats a size in bytes the way df -h does (i.e. 3.0G, 450M).
+    """
+    for unit in ['', 'K', 'M', 'G', 'T', 'P']:
+        if size < 1024 or unit == 'P':
+            return "{:.0f}{}".format(size, unit) if unit == '' or size >= 10 else "{:.1f}{}".format(size, unit)
+        size /= 1024.0
+
+
+def process_age(pid: str = 'self', proc_path: str = '/proc') -> float:
+    """
+    Returns the seconds since the process started (i.e. to measure the cold start of the interpreter), or None if /proc isn't available.
+    """
+    try:
+        with open(os.path.join(proc_path, pid, 'stat')) as stat_file:
+            # The command name (2nd field) can contain spaces, the fields are counted after its closing parenthesis
+            start_ticks = int(stat_file.read().rsplit(')', 1)[1].split()[19])
+        with open(os.path.join(proc_path, 'uptime')) as uptime_file:
+            uptime = float(uptime_file.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
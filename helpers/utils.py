@@ -3,10 +3,17 @@
 import os
 import subprocess
 import sys
+import threading
+import time
 import traceback
 # from sys import exit
 # from requests.exceptions import RequestException
-from typing import List
+from typing import Callable, List, Tuple
+
+from helpers.results import add_output_argument, add_values, check_scope, current_scope, finish_results, note_status, set_output_format
+
+# When a thread sets a list in messages, its ok/error/info messages are stored there instead of printed (see run_concurrently)
+_captured = threading.local()
 
 
 def setPath(namespace):
@@ -24,16 +31,36 @@ def log_traceback(log, ex, ex_traceback=None):
     log.error(tb_lines)
 
 
+# Icinga exit code of every status
+ICINGA_EXIT_CODES = {'OK': 0, 'WARNING': 1, 'CRITICAL': 2, 'UNKNOWN': 3}
+
+
+def status_code(status: str) -> int:
+    """
+    Returns the Icinga exit code of a status. The status is case insensitive, and unknown statuses are UNKNOWN (3).
+    """
+    return ICINGA_EXIT_CODES.get(str(status).upper(), 3)
+
+
 def exit_to_icinga(nodes_info):
+    """
+    Shows the logtrace and exits with the worst status of the check and of the results of all its checks (see helpers.results),
+    so a check that returns OK after some of its checks failed doesn't exit OK.
+    """
     print(nodes_info['logtrace'])
-    if nodes_info['status'] == "OK":
-        exit(0)
-    elif nodes_info['status'] == "WARNING":
-        exit(1)
-    elif nodes_info['status'] == "CRITICAL":
-        exit(2)
-    else:
-        exit(3)
+    status = finish_results(nodes_info['status'], nodes_info['logtrace'])
+    if status_code(status) > status_code(nodes_info['status']):
+        print("Worst status of the checks: {}".format(status))
+    exit(status_code(status))
+
+
+def get_cache_dir() -> str:
+    """
+    Returns the directory where utester keeps its local caches ($UTESTER_CACHE_DIR, or ~/.cache/utester), creating it if needed.
+    """
+    cache_dir = os.environ.get('UTESTER_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'utester')
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
 
 
 def get_schema_path(fname):
@@ -74,7 +101,8 @@ def execute_shell_command_and_return_stdout_as_lines_list(command: str) -> List[
     return execute_shell_command_and_return_stdout(command).split('\n')
 
 
-# WARN: The block-device-mapping and the key options print it's content in more than one line, so with this option, dummy=True doesn't work correctly
+# WARN: The block-device-mapping and the key options print it's content in more than one line, so with this option, dummy=True doesn't work correctly.
+# helpers.ec2metadata.load_ec2_metadata obtains and parses all the fields (multi-line ones included) at once.
 def execute_ec2_metadata_command_and_return_stdout(option: str = None, ec2_dummy_file_relative_path: str = None) -> str:
     """
     If the ec2_dummy_file_relative_path parameter is None, executes the command ec2-metadata and returns it's stdout. \
@@ -112,22 +140,111 @@ def execute_ec2_metadata_command_and_return_stdout(option: str = None, ec2_dummy
         return execute_shell_command_and_return_stdout(command)
 
 
-def ok_message(message):
+def _write_message(stream, text: str):
+    """
+    Writes a message to the stream, or stores it if the current thread is capturing its messages.
+    """
+    messages = getattr(_captured, 'messages', None)
+    if messages is not None:
+        messages.append((stream, text))
+    else:
+        stream.write(text)
+
+
+def ok_message(message, **values):
     """
-    Shows the message with an OK format.
+    Shows the message with an OK format. The values (if any) are added to the result of the current check.
     """
-    print("[OK] " + message)
+    note_status('OK', str(message))
+    add_values(**values)
+    _write_message(sys.stdout, "[OK] " + str(message) + "\n")
 
 
-def error_message(message):
+def warning_message(message, **values):
     """
-    Shows the message with an ERROR format.
+    Shows the message with a WARNING format, and makes the current check a WARNING.
     """
-    sys.stderr.write("[ERROR] " + message + "\n")
+    note_status('WARNING', str(message))
+    add_values(**values)
+    _write_message(sys.stderr, "[WARNING] " + str(message) + "\n")
+
+
+def error_message(message, **values):
+    """
+    Shows the message with an ERROR format, and makes the current check CRITICAL.
+    """
+    note_status('CRITICAL', str(message))
+    add_values(**values)
+    _write_message(sys.stderr, "[ERROR] " + str(message) + "\n")
 
 
 def info_message(message):
     """
     Shows the message with an INFO format.
     """
-    print("[INFO] " + message)
\ No newline at end of file
+    _write_message(sys.stdout, "[INFO] " + message + "\n")
+
+
+def text_message(message):
+    """
+    Shows the message as it is.
+    """
+    _write_message(sys.stdout, message + "\n")
+
+
+def replay_messages(messages: List[Tuple]):
+    """
+    Writes the messages stored while capturing (or stores them again, if the current thread is capturing too, i.e. nested runs).
+    """
+    for stream, text in messages:
+        _write_message(stream, text)
+
+
+def run_concurrently(tasks: List[Tuple[str, Callable, tuple]], timeout: float = None, deadline: float = None) -> List[dict]:
+    """
+    Runs the tasks concurrently, each one in its own thread, capturing their ok/error/info messages.
+    Every task is a check under the current check (see helpers.results): its result is recorded when it finishes, or as UNKNOWN
+    if it doesn't finish in time.
+    Every task is waited for at most timeout seconds, and all of them at most until the deadline. The threads of the tasks that
+    don't finish in time are abandoned (they are daemon threads, so they don't prevent the process from exiting).
+    :param tasks: (name, function, args) of every task.
+    :param timeout: Maximum seconds of every task (None for no limit).
+    :param deadline: Maximum seconds of all the tasks (None for no limit).
+    :return: For every task, in the same order: name, finished (False if it timed out), result, exception, captured messages, seconds
+    and status (the worst of its messages, see helpers.results).
+    """
+    start = time.perf_counter()
+    outcomes = [{'name': name, 'finished': False, 'result': None, 'exception': None, 'messages': [], 'seconds': None, 'status': None}
+                for name, _, _ in tasks]
+
+    def run(outcome, scope, function, args):
+        _captured.messages = outcome['messages']
+        try:
+            with scope:
+                outcome['result'] = function(*args)
+                if isinstance(outcome['result'], dict) and 'status' in outcome['result']:
+                    scope.note(outcome['result']['status'])
+        except Exception as ex:
+            outcome['exception'] = ex
+        finally:
+            outcome['seconds'] = time.perf_counter() - start
+            outcome['status'] = scope.status
+            outcome['finished'] = True
+
+    parent = current_scope()
+    scopes = [check_scope(name, parent) for name, _, _ in tasks]
+    threads = []
+    for outcome, scope, (name, function, args) in zip(outcomes, scopes, tasks):
+        thread = threading.Thread(target=run, args=(outcome, scope, function, args), name=name, daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    limits = [limit for limit in (timeout, deadline) if limit is not None]
+    for thread in threads:
+        remaining = start + min(limits) - time.perf_counter() if limits else None
+        thread.join(max(remaining, 0) if remaining is not None else None)
+    for outcome, scope in zip(outcomes, scopes):
+        if not outcome['finished']:
+            scope.close('UNKNOWN', "The check didn't finish in time.")
+            outcome['status'] = scope.status
+    return outcomes
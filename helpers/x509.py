@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# # -*- coding: utf-8 -*-
+
+"""
+    File name: helpers.x509.py
+    Date created: 19/10/2026
+    Date last modified: 19/10/2026
+    Python Version: 3.7.2
+    Version: 1.0.0
+"""
+
+import calendar
+import json
+import os
+import re
+import ssl
+import subprocess
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+from helpers.utils import get_cache_dir
+
+__all__ = ['OIDS', 'CURVE_SIZES', 'read_pem_certificates', 'parse_certificate', 'verify_chain', 'inspect_certificates']
+
+# Names of the object identifiers found in the certificates we check
+OIDS = {
+    '2.5.4.3': 'CN', '2.5.4.6': 'C', '2.5.4.7': 'L', '2.5.4.8': 'ST', '2.5.4.10': 'O', '2.5.4.11': 'OU', '1.2.840.113549.1.9.1': 'emailAddress',
+    '1.2.840.113549.1.1.1': 'RSA', '1.2.840.10045.2.1': 'EC', '1.3.101.112': 'Ed25519', '1.3.101.113': 'Ed448',
+    '1.2.840.113549.1.1.5': 'sha1WithRSAEncryption', '1.2.840.113549.1.1.11': 'sha256WithRSAEncryption',
+    '1.2.840.113549.1.1.12': 'sha384WithRSAEncryption', '1.2.840.113549.1.1.13': 'sha512WithRSAEncryption', '1.2.840.113549.1.1.10': 'RSASSA-PSS',
+    '1.2.840.10045.4.3.2': 'ecdsa-with-SHA256', '1.2.840.10045.4.3.3': 'ecdsa-with-SHA384', '1.2.840.10045.4.3.4': 'ecdsa-with-SHA512',
+    '1.2.840.10045.3.1.7': 'P-256', '1.3.132.0.34': 'P-384', '1.3.132.0.35': 'P-521',
+}
+
+# Key size of the elliptic curves
+CURVE_SIZES = {'P-256': 256, 'P-384': 384, 'P-521': 521}
+
+
+def _read_tlv(data: bytes, offset: int) -> Tuple[int, int, int]:
+    """
+    Reads the DER element at offset.
+    :return: tag, offset where its content starts and offset where it ends.
+    :raise ValueError: if the element is truncated.
+    """
+    if offset + 2 > len(data):
+        raise ValueError("Truncated DER element at offset {}".format(offset))
+    tag = data[offset]
+    length = data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        size = length & 0x7f
+        if offset + size > len(data):
+            raise ValueError("Truncated DER length at offset {}".format(offset))
+        length = int.from_bytes(data[offset:offset + size], 'big')
+        offset += size
+    if offset + length > len(data):
+        raise ValueError("DER element at offset {} is longer than its container".format(offset))
+    return tag, offset, offset + length
+
+
+def _children(data: bytes, start: int, end: int) -> List[Tuple[int, int, int]]:
+    """
+    Returns the elements (see _read_tlv) inside a constructed DER element.
+    """
+    children = []
+    while start < end:
+        tag, content_start, content_end = _read_tlv(data, start)
+        children.append((tag, content_start, content_end))
+        start = content_end
+    return children
+
+
+def _oid(content: bytes) -> str:
+    if not content:
+        raise ValueError("Empty object identifier")
+    values = [content[0] // 40, content[0] % 40]
+    value = 0
+    for byte in content[1:]:
+        value = (value << 7) | (byte & 0x7f)
+        if not byte & 0x80:
+            values.append(value)
+            value = 0
+    return '.'.join(map(str, values))
+
+
+def _name(data: bytes, start: int, end: int) -> str:
+    """
+    Formats a distinguished name like openssl does (CN=..., O=...).
+    """
+    attributes = []
+    for _, set_start, set_end in _children(data, start, end):
+        for _, attribute_start, attribute_end in _children(data, set_start, set_end):
+            (_, oid_start, oid_end), (_, value_start, value_end) = _children(data, attribute_start, attribute_end)[:2]
+            oid = _oid(data[oid_start:oid_end])
+            attributes.append("{}={}".format(OIDS.get(oid, oid), data[value_start:value_end].decode('utf-8', 'replace')))
+    return ", ".join(attributes)
+
+
+def _time(content: bytes, tag: int) -> int:
+    """
+    Converts an UTCTime (tag 0x17) or GeneralizedTime to seconds since the epoch.
+    """
+    text = content.decode('ascii').rstrip('Z')
+    if tag == 0x17:
+        text = ('19' if int(text[:2]) >= 50 else '20') + text
+    return calendar.timegm(time.strptime(text[:14], '%Y%m%d%H%M%S'))
+
+
+def read_pem_certificates(path: str) -> List[bytes]:
+    """
+    Returns the certificates (DER) of a PEM file, in the order of the file.
+    """
+    with open(path) as pem_file:
+        pem = pem_file.read()
+    return [ssl.PEM_cert_to_DER_cert(block) for block in
+            re.findall(r'-----BEGIN CERTIFICATE-----.+?-----END CERTIFICATE-----', pem, re.DOTALL)]
+
+
+def parse_certificate(der: bytes) -> Dict:
+    """
+    Parses the fields of an X.509 certificate that are checked: subject, issuer, validity (seconds since the epoch), public key algorithm,
+    size and curve, and signature algorithm. The signatures aren't verified here (see verify_chain).
+    :raise ValueError: if the certificate is malformed.
+    """
+    try:
+        _, cert_start, cert_end = _read_tlv(der, 0)
+        (_, tbs_start, tbs_end), (_, sig_alg_start, sig_alg_end) = _children(der, cert_start, cert_end)[:2]
+        fields = _children(der, tbs_start, tbs_end)
+        if fields[0][0] == 0xa0:  # Explicit version
+            fields = fields[1:]
+        serial, _, issuer, validity, subject, public_key_info = fields[:6]
+
+        (not_before_tag, nb_start, nb_end), (not_after_tag, na_start, na_end) = _children(der, validity[1], validity[2])
+        (_, key_alg_start, key_alg_end), (_, key_start, key_end) = _children(der, public_key_info[1], public_key_info[2])
+        key_alg_children = _children(der, key_alg_start, key_alg_end)
+        key_algorithm = OIDS.get(_oid(der[key_alg_children[0][1]:key_alg_children[0][2]]), 'unknown')
+        _, sig_oid_start, sig_oid_end = _children(der, sig_alg_start, sig_alg_end)[0]
+        key = der[key_start + 1:key_end]  # Bit string without the unused bits byte
+
+        certificate = {
+            'subject': _name(der, subject[1], subject[2]),
+            'issuer': _name(der, issuer[1], issuer[2]),
+            'serial': der[serial[1]:serial[2]].hex(),
+            'not_before': _time(der[nb_start:nb_end], not_before_tag),
+            'not_after': _time(der[na_start:na_end], not_after_tag),
+            'key_algorithm': key_algorithm,
+            'key_size': None,
+            'curve': None,
+            'signature_algorithm': OIDS.get(_oid(der[sig_oid_start:sig_oid_end]), 'unknown'),
+        }
+        if key_algorithm == 'RSA':
+            _, rsa_start, rsa_end = _read_tlv(key, 0)
+            _, n_start, n_end = _children(key, rsa_start, rsa_end)[0]
+            certificate['key_size'] = int.from_bytes(key[n_start:n_end], 'big').bit_length()
+        elif key_algorithm == 'EC':
+            certificate['curve'] = OIDS.get(_oid(der[key_alg_children[1][1]:key_alg_children[1][2]]), 'unknown')
+            certificate['key_size'] = CURVE_SIZES.get(certificate['curve'], (len(key) - 1) // 2 * 8)
+        elif key_algorithm in ('Ed25519', 'Ed448'):
+            certificate['key_size'] = len(key) * 8
+    except (IndexError, ValueError) as e:
+        raise ValueError("Malformed certificate: {}".format(e))
+    return certificate
+
+
+def verify_chain(cert_path: str, ca_path: str = None, timeout: float = 10.0) -> List[str]:
+    """
+    Verifies the chain of a PEM file (the leaf first, then its intermediates) against the CA file with openssl verify, that checks
+    the signatures, the validity and the CA constraints of every certificate of the chain. The CA file can be an intermediate CA.
+    :return: problems found (empty if the chain is valid).
+    """
+    if not ca_path:
+        return ["The chain isn't verified against a CA"]
+    try:
+        result = subprocess.run(['openssl', 'verify', '-partial_chain', '-CAfile', ca_path, '-untrusted', cert_path, cert_path],
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=timeout)
+    except FileNotFoundError:
+        return ["The chain can't be verified: openssl isn't installed"]
+    except subprocess.TimeoutExpired:
+        return ["The chain can't be verified: openssl verify didn't finish in {}s".format(timeout)]
+    if result.returncode != 0:
+        errors = [line.strip() for line in result.stdout.decode('utf-8', 'replace').splitlines() if 'error' in line]
+        return ["The chain isn't valid for the CA: {}".format("; ".join(errors) or "openssl verify exited {}".format(result.returncode))]
+    return []
+
+
+def inspect_certificates(cert_path: str, ca_path: str = None, cache_path: str = None) -> Dict:
+    """
+    Parses the certificate chain of a PEM file, and verifies it against the CA file (if given). Malformed certificates are problems.
+    The parsed certificates are cached, and parsed again only when the modification time of the files changes. The chain is verified
+    on every call, as it becomes invalid when one of its certificates expires, without any file changing.
+    :param cache_path: JSON file of the cache (default=certs.json in the utester cache directory).
+    :return: certificates (without their raw parts) and chain problems.
+    """
+    cache_path = cache_path or os.path.join(get_cache_dir(), 'certs.json')
+    key = "{}|{}".format(os.path.abspath(cert_path), os.path.abspath(ca_path) if ca_path else '')
+    mtimes = [os.path.getmtime(cert_path), os.path.getmtime(ca_path) if ca_path else None]
+
+    cache = {}
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path) as cache_file:
+                cache = json.load(cache_file)
+        except ValueError:
+            cache = {}
+
+    if key in cache and cache[key]['mtimes'] == mtimes and 'certificates' in cache[key]:
+        parsed = {'certificates': cache[key]['certificates'], 'problems': cache[key]['problems']}
+    else:
+        parsed = {'certificates': [], 'problems': []}
+        try:
+            for der in read_pem_certificates(cert_path):
+                parsed['certificates'].append(parse_certificate(der))
+        except ValueError as e:
+            parsed['problems'].append("{} can't be parsed: {}".format(cert_path, e))
+        if not parsed['certificates'] and not parsed['problems']:
+            parsed['problems'].append("There are no certificates in {}".format(cert_path))
+
+        cache[key] = dict(parsed, mtimes=mtimes)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(cache_path)))
+        with os.fdopen(fd, 'w') as tmp_file:
+            json.dump(cache, tmp_file)
+        os.replace(tmp_path, cache_path)
+
+    inspection = {'certificates': parsed['certificates'], 'problems': list(parsed['problems'])}
+    if inspection['certificates']:
+        inspection['problems'] += verify_chain(cert_path, ca_path)
+    return inspection
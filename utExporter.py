@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# # -*- coding: utf-8 -*-
+
+"""
+Long-running exporter that runs the utester checks on their own schedules and exposes the results on a /metrics endpoint.
+Every check runs periodically in its own background worker. Scrapes are served from the results of the last runs,
+so a slow or hung check never blocks a scrape.
+
+The checks are read from the "utExporter" section of the configuration file:
+    "utExporter": {
+        "port": 9200,
+        "checks": [
+            {"name": "hardware", "tester": "hardware", "interval": 300, "args": ["-c", "config/config.global.json", "-t", "kafka"]},
+            {"name": "redis-hello", "tester": "redis", "interval": 60, "timeout": 30, "args": ["-ho", "localhost", "-p", "6379", "-ht"]}
+        ]
+    }
+Possible testers: kafka, redis, postgre, hardware, nifi. The args are the command line arguments of the tester script.
+A run that lasts more than the timeout of its check (default, its interval) is UNKNOWN. While it's still running, the check isn't run
+again, and every interval is UNKNOWN too.
+
+Exposed metrics (labels check and tester):
+ - utester_check_status: Status of the last run (0 OK, 1 WARNING, 2 CRITICAL, 3 UNKNOWN).
+ - utester_check_running: 1 while the check is running.
+ - utester_check_last_run_timestamp_seconds: End time of the last run.
+ - utester_check_last_duration_seconds: Duration of the last run.
+ - utester_check_duration_seconds: Histogram of the durations of all the runs.
+ - utester_check_runs_total: Number of runs, by status.
+
+Example:
+    Run the exporter
+        python utExporter.py --configfile config/config.global.json
+    Run the exporter on another port
+        python utExporter.py --configfile config/config.global.json --port 9300
+
+"""
+
+import argparse
+import json
+import logging
+import threading
+import time
+from argparse import RawTextHelpFormatter
+from typing import Dict
+
+from prometheus_client import CollectorRegistry, Histogram, start_http_server
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from helpers.results import normalize_status
+from helpers.runner import *
+from helpers.utils import *
+
+log = logging.getLogger(os.path.splitext(__file__)[0])
+logfile = 'operations.log'
+version = "1.0"
+
+
+class CheckResultsCollector(object):
+    """
+    Collector that exposes the latest results of the checks. It only reads the cached results, it never runs a check.
+    """
+
+    def __init__(self, results: Dict[str, Dict], lock: threading.Lock):
+        self.results = results
+        self.lock = lock
+
+    def collect(self):
+        with self.lock:
+            snapshot = {name: dict(result, runs=dict(result['runs'])) for name, result in self.results.items()}
+
+        status = GaugeMetricFamily('utester_check_status', 'Status of the last run (0 OK, 1 WARNING, 2 CRITICAL, 3 UNKNOWN)',
+                                   labels=['check', 'tester'])
+        running = GaugeMetricFamily('utester_check_running', '1 while the check is running', labels=['check', 'tester'])
+        last_run = GaugeMetricFamily('utester_check_last_run_timestamp_seconds', 'End time of the last run', labels=['check', 'tester'])
+        last_duration = GaugeMetricFamily('utester_check_last_duration_seconds', 'Duration of the last run', labels=['check', 'tester'])
+        runs = CounterMetricFamily('utester_check_runs', 'Number of runs, by status', labels=['check', 'tester', 'status'])
+
+        for name, result in sorted(snapshot.items()):
+            labels = [name, result['tester']]
+            running.add_metric(labels, 1 if result['running'] else 0)
+            if result['last_run'] is not None:
+                status.add_metric(labels, status_code(result['status']))
+                last_run.add_metric(labels, result['last_run'])
+                last_duration.add_metric(labels, result['duration'])
+            for run_status, count in result['runs'].items():
+                runs.add_metric(labels + [run_status], count)
+
+        yield from [status, running, last_run, last_duration, runs]
+
+
+def check_worker(check: Dict, results: Dict[str, Dict], lock: threading.Lock, durations: Histogram, stop: threading.Event):
+    """
+    Runs a check every interval seconds until the stop event is set, and stores its results.
+    Every run is waited for at most the timeout of the check: a run that doesn't finish in time is UNKNOWN, and the check isn't run
+    again until it finishes, so a hung check doesn't pile up threads nor keep its last status.
+    """
+    name = check['name']
+    timeout = check.get('timeout', check.get('interval', 60))
+    hung = None
+    while not stop.is_set():
+        start = time.time()
+        if hung is not None and not hung['finished']:
+            info = {"logtrace": "The previous run didn't finish yet.", "status": "UNKNOWN"}
+        else:
+            with lock:
+                results[name]['running'] = True
+            outcome = run_concurrently([(name, run_tester, (check['tester'], [str(arg) for arg in check.get('args', [])]))], timeout)[0]
+            if not outcome['finished']:
+                hung = outcome
+                info = {"logtrace": "The check didn't finish in {}s.".format(timeout), "status": "UNKNOWN"}
+            else:
+                hung = None
+                info = outcome['result']
+        end = time.time()
+        run_status = normalize_status(info['status'])
+
+        with lock:
+            result = results[name]
+            result.update(running=hung is not None, status=run_status, logtrace=info['logtrace'], last_run=end, duration=end - start)
+            result['runs'][run_status] = result['runs'].get(run_status, 0) + 1
+        durations.labels(name, check['tester']).observe(end - start)
+        log.debug("Check {} finished with status {} in {:.3f}s".format(name, run_status, end - start))
+
+        stop.wait(max(check.get('interval', 60) - (end - start), 0))
+
+
+def run_exporter(config) -> Dict:
+    """
+    Starts a background worker per check and serves the /metrics endpoint until interrupted.
+    """
+    log.debug("------------------ Begin run_exporter ------------------")
+    checks = config['checks']
+    results = {check['name']: {'tester': check['tester'], 'running': False, 'status': None, 'logtrace': None, 'last_run': None,
+                               'duration': None, 'runs': {}}
+               for check in checks}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    registry = CollectorRegistry()
+    registry.register(CheckResultsCollector(results, lock))
+    durations = Histogram('utester_check_duration_seconds', 'Durations of the runs of the check', ['check', 'tester'], registry=registry,
+                          buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300))
+
+    for check in checks:
+        if check['tester'] not in TESTERS:
+            error_message("Check '{}' has an unknown tester '{}'.".format(check['name'], check['tester']))
+            return {"logtrace": "INVALID CONFIGURATION", "status": "UNKNOWN"}
+
+    start_http_server(config['port'], addr=config['address'], registry=registry)
+    info_message("Serving /metrics on {}:{} for {} checks.".format(config['address'], config['port'], len(checks)))
+
+    for check in checks:
+        threading.Thread(target=check_worker, args=(check, results, lock, durations, stop), name=check['name'], daemon=True).start()
+
+    try:
+        while not stop.wait(1):
+            pass
+    except KeyboardInterrupt:
+        stop.set()
+
+    log.debug("------------------ End run_exporter ------------------")
+    return {"logtrace": "Exporter stopped", "status": "OK"}
+
+
+def build_config(args):
+    """
+    Builds the configuration of the exporter from the command line arguments and the configuration file.
+    """
+    configfile_json = json.load(open(os.path.realpath(args.configfile)))
+    exporter_config = configfile_json['utExporter']
+
+    config = {
+        'checks': exporter_config['checks'],
+        'port': args.port or exporter_config.get('port', 9200),
+        'address': args.address,
+    }
+    config['root_dir'] = os.path.dirname(os.path.abspath(__file__))
+    return config
+
+
+def main(args, loglevel):
+    if args.logging:
+        logging.basicConfig(filename=logfile, format='%(asctime)s %(name)-12s %(levelname)-8s %(message)s', level=loglevel)
+    logging.info('Started run_exporter')
+    log.debug("------------------ Reading config ------------------")
+    config = build_config(args)
+
+    _info = run_exporter(config)
+
+    print("Done.")
+    logging.info('Finished run_exporter')
+    exit_to_icinga(_info)
+
+
+def parse_args(argv=None):
+    """Parse command line arguments (sys.argv when argv is None)."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=RawTextHelpFormatter)
+    parser.add_argument('-V', '--version', action='version', version='%(prog)s ' + version)
+
+    parser.add_argument('-c', '--configfile', help='Configuration file path (.json).', type=str, default=None, required=True)
+    parser.add_argument('-p', '--port', help='Port of the /metrics endpoint (default=port of the configuration file, or 9200)', type=int,
+                        default=None)
+    parser.add_argument('-a', '--address', help='Address to listen on (default=0.0.0.0)', type=str, default='0.0.0.0')
+
+    parser.add_argument('-l', '--logging', help='create log output in current directory', action='store_const', const=True, default=False)
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument('-v', '--verbose', help='increase output verbosity', action='store_const', const=logging.DEBUG, default=logging.INFO)
+    verbosity.add_argument('-q', '--quiet', help='hide any debug exit', dest='verbose', action='store_const', const=logging.WARNING)
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(args, args.verbose)
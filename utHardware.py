@@ -15,6 +15,9 @@ Possible machine types:
 
 If this file is NOT executed in an EC2 instance, the --ec2-dummy must be used, pointing to a file that simulates the ec2-metadata command.
 
+The checks of a machine run concurrently. Every check has a timeout (--checktimeout) and all of them a global deadline (--deadline),
+so a hung command or endpoint can't stall the whole run. Their messages are shown in the usual order.
+
 Examples:
     Check an EC2 kafka machine
         python utHardware.py --configfile config/config.global.json --type kafka
@@ -25,18 +28,37 @@ Examples:
     Check that the fqdns of the rest of machines are resolved by the DNS, from the EC2 bastion machine
         python utHardware.py --configfile config/config.global.json --type dns
 
+    Check an EC2 kafka machine, giving up on every check after 10 seconds and on all of them after 25 seconds
+        python utHardware.py --configfile config/config.global.json --type kafka --checktimeout 10 --deadline 25
+
 """
 
 import argparse
+import http.client
 import json
 import logging
-import urllib.error
-import urllib.request
+import socket
+import time
+import urllib.parse
 from argparse import RawTextHelpFormatter
-from typing import Dict
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
 
 import psutil
 
+from helpers.computeprobe import *
+from helpers.diskprobe import *
+from helpers.dnsclient import *
+from helpers.ec2metadata import *
+from helpers.exposition import *
+from helpers.network import *
+from helpers.resultcache import *
+from helpers.sampler import *
+from helpers.sntp import *
+from helpers.stats import *
+from helpers.system import *
+from helpers.x509 import *
 from helpers.utils import *
 
 log = logging.getLogger(os.path.splitext(__file__)[0])
@@ -55,134 +77,346 @@ def check_hardware(config: Dict):
     assert type(machine_uthardware_config) == dict
     assert machine_uthardware_config['type'] == machine_type
 
-    # Obtain the ec2-dummy file relative path (is None if not specified in the CLI by the user)
-    ec2_dummy_path: str = config['ec2_dummy']
+    # Obtain all the EC2 metadata at once. If the ec2-dummy file relative path was specified in the CLI by the user, it's read from the file
+    ec2_metadata: Dict = load_ec2_metadata(config['ec2_dummy'], config['ec2_backend'], config['ec2_cache'], config['ec2_cache_ttl'])
 
     # Obtain the fully qualified domain name
-    fqdn: str = execute_ec2_metadata_command_and_return_stdout("--local-hostname", ec2_dummy_path).split()[1]
+    fqdn: str = ec2_metadata['local-hostname']
 
     # ------------------------- Switch options ------------------------- #
     if machine_type == 'bastion':
-        check_bastion(machine_uthardware_config, fqdn)
+        unit_checks = check_bastion(machine_uthardware_config, fqdn)
 
     elif machine_type == 'kafka':
-        check_kafka(machine_uthardware_config, fqdn, ec2_dummy_path)
+        unit_checks = check_kafka(machine_uthardware_config, fqdn, ec2_metadata)
 
     elif machine_type == 'striim':
-        check_striim(machine_uthardware_config, fqdn, ec2_dummy_path)
+        unit_checks = check_striim(machine_uthardware_config, fqdn, ec2_metadata)
 
     elif machine_type == 'psql':
-        check_psql(machine_uthardware_config, fqdn, ec2_dummy_path)
+        unit_checks = check_psql(machine_uthardware_config, fqdn, ec2_metadata)
 
     elif machine_type == 'emr':
-        check_emr(machine_uthardware_config, fqdn, ec2_dummy_path)
+        unit_checks = check_emr(machine_uthardware_config, fqdn, ec2_metadata)
 
     elif machine_type == 'redis':
-        check_redis(machine_uthardware_config, ec2_dummy_path)
+        unit_checks = check_redis(machine_uthardware_config, ec2_metadata)
 
     elif machine_type == 'psql2':
-        check_psql2(machine_uthardware_config, ec2_dummy_path)
+        unit_checks = check_psql2(machine_uthardware_config, ec2_metadata)
 
     elif machine_type == 'dns':
-        check_dns(machine_uthardware_config)
+        unit_checks = check_dns(machine_uthardware_config)
+
+    else:
+        error_message("Unknown machine type: {}.".format(machine_type))
+        unit_checks = []
     # ------------------------------------------------------------------ #
 
+    # The active ingress check connects to the ports, instead of looking for them in the local socket tables
+    if config['ingress_active'] and 'ingress' in machine_uthardware_config.get('hardware', {}):
+        unit_checks.append(('ingress_connect', check_ingress_connect, (machine_uthardware_config['hardware']['ingress'], config['ingress_hosts'],
+                                                                       fqdn, machine_uthardware_config['hardware'].get('ingress_active'))))
+
+    # The probes load every CPU, saturate the network to the peers or write the disks, so they only run when requested, and one after
+    # another after the unit checks, so they don't skew the measures of the unit checks nor of each other
+    probes = []
+    if config['compute_probe']:
+        probes.append(('compute_probe', check_compute_probe,
+                       (ec2_metadata['instance-type'], machine_uthardware_config.get('hardware', {}).get('compute_probe'))))
+
+    if config['network_probe']:
+        probes.append(('network_probe', check_network_probe, (fqdn, machine_uthardware_config.get('hardware', {}).get('network_probe', {}))))
+
+    # Every required mountpoint is probed on its own, as mountpoints on the same device would contend for it
+    if config['disk_probe']:
+        for mountpoint in machine_uthardware_config.get('hardware', {}).get('fs', []):
+            probes.append(('disk_probe {}'.format(mountpoint), check_disk_probe,
+                           (mountpoint, machine_uthardware_config['hardware'].get('disk_probe'))))
+
+    start = time.perf_counter()
+    if not run_unit_checks(unit_checks, config['checktimeout'], config['deadline']):
+        status = 'CRITICAL'
+    if not run_probes(probes, config['deadline'] - (time.perf_counter() - start)):
+        status = 'CRITICAL'
+
     log_trace = "Send " + status + " | " + log_trace
     log.debug("------------------ End check_hardware ------------------")
     return {"logtrace": log_trace, "status": status}
 
 
-# ---------------- BEGIN Machine checks ---------------- #
-
-def check_bastion(config: Dict, fqdn: str):
-    check_ingress(config['hardware']['ingress'])
-    check_config_metrics(fqdn, config['config']['metrics'])
-
-
-def check_kafka(config: Dict, fqdn: str, ec2_dummy_path: str):
-    check_instance_type(config['hardware']['instance_type'], ec2_dummy_path)
-
-    check_fs(config['hardware']['fs'])
-    # DNS is tested from bastion
-    check_ingress(config['hardware']['ingress'])
-    check_etc_hosts(fqdn)
-    check_certs(config['hardware']['certs'])
-    check_tz(config['hardware']['tz'])
-    check_config_metrics(fqdn, config['config']['metrics'])
-
-
-def check_striim(config: Dict, fqdn: str, ec2_dummy_path: str):
-    check_instance_type(config['hardware']['instance_type'], ec2_dummy_path)
-
-    check_fs(config['hardware']['fs'])
-    # DNS is tested from bastion
-    check_ingress(config['hardware']['ingress'])
-    check_etc_hosts(fqdn)
-    check_certs(config['hardware']['certs'])
-    check_tz(config['hardware']['tz'])
-    check_config_metrics(fqdn, config['config']['metrics'])
-
-
-def check_psql(config: Dict, fqdn: str, ec2_dummy_path: str):
-    check_instance_type(config['hardware']['instance_type'], ec2_dummy_path)
-
-    check_fs(config['hardware']['fs'])
-    # DNS is tested from bastion
-    check_ingress(config['hardware']['ingress'])
-    check_etc_hosts(fqdn)
-    check_certs(config['hardware']['certs'])
-    check_tz(config['hardware']['tz'])
+def sample_resources(config: Dict):
+    """
+    Samples the resources of the machine (CPU, memory, swap, disks and NICs) every interval, for the given duration, into a ring buffer,
+    alerting when a threshold of the sampler configuration of the machine type is breached for its sustain period.
+    The configuration ('hardware.sampler') has the interval in seconds ('interval', default 1), the duration ('duration', default 60),
+    the capacity of the ring buffer ('capacity', default 3600 samples), the thresholds (see sustained_breaches) and the directory where
+    the ring buffer is dumped when an alert fires ('dump_dir', default no dumps).
+    """
+    log.debug("------------------ Begin sample_resources ------------------")
+    log_trace = 'None'
+    status = 'Ok'
 
+    machine_uthardware_config = next(filter(lambda machine_conf: machine_conf['type'] == config['type'], config['uthardwareconfig']))
+    sampler_config: Dict = machine_uthardware_config.get('hardware', {}).get('sampler', {})
+    interval = sampler_config.get('interval', 1.0)
+    duration = config['sample_duration'] or sampler_config.get('duration', 60.0)
+    dump_dir = config['sample_dump'] or sampler_config.get('dump_dir')
+    thresholds = sampler_config.get('thresholds', [])
+
+    buffer = RingBuffer(sample_fields(), sampler_config.get('capacity', 3600))
+    info_message("Sampling {} fields every {}s for {}s.".format(buffer.width, interval, duration))
+    active_breaches = set()
+    start = time.monotonic()
+    next_sample = start
+    while next_sample - start <= duration:
+        time.sleep(max(next_sample - time.monotonic(), 0))
+        buffer.append(take_sample(buffer.fields))
+        next_sample += interval
+
+        breaches = {(threshold['metric'], field): (threshold, value) for threshold, field, value in sustained_breaches(buffer, thresholds, interval)}
+        new_breaches = set(breaches) - active_breaches
+        for metric, field in sorted(new_breaches):
+            threshold, value = breaches[(metric, field)]
+            error_message("{} {} is {:.2f}, {} {} for {}s.".format(time.strftime('%H:%M:%S'), field, value, 'above' if 'above' in threshold
+                                                                   else 'below', threshold.get('above', threshold.get('below')),
+                                                                   threshold.get('for', 0)))
+            status = 'CRITICAL'
+        for metric, field in sorted(active_breaches - set(breaches)):
+            info_message("{} {} recovered.".format(time.strftime('%H:%M:%S'), field))
+        if new_breaches and dump_dir:
+            now = time.time()
+            dump_path = os.path.join(dump_dir, 'sampler-{}-{}{:03d}.bin'.format(config['type'], time.strftime('%Y%m%dT%H%M%S', time.localtime(now)),
+                                                                             int(now * 1000) % 1000))
+            buffer.dump(dump_path)
+            info_message("Samples dumped to {}.".format(dump_path))
+        active_breaches = set(breaches)
+
+    # Summary of the gauges, and of the rates of the counters that moved
+    info_message("Summary of {} samples:".format(len(buffer)))
+    text_message("{:<34} {:>10} {:>10} {:>10} {:>10}".format("Field", "p50", "p90", "p99", "max"))
+    for field in buffer.fields[1:]:
+        summary = summarize(series(buffer, field))
+        if summary['count'] and (not is_counter(field) or summary['max'] > 0):
+            text_message("{:<34} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f}".format(field + ("/s" if is_counter(field) else ""), summary['p50'],
+                                                                                 summary['p90'], summary['p99'], summary['max']))
 
-def check_emr(config: Dict, fqdn: str, ec2_dummy_path: str):
-    check_instance_type(config['hardware']['instance_type'], ec2_dummy_path)
+    log_trace = "Send " + status + " | " + log_trace
+    log.debug("------------------ End sample_resources ------------------")
+    return {"logtrace": log_trace, "status": status}
 
-    check_fs(config['hardware']['fs'])
-    # DNS is tested from bastion
-    check_ingress(config['hardware']['ingress'])
-    check_etc_hosts(fqdn)
-    check_certs(config['hardware']['certs'])
-    check_tz(config['hardware']['tz'])
 
+def run_unit_checks(unit_checks: List[Tuple[str, Callable, tuple]], timeout: float, deadline: float) -> bool:
+    """
+    Runs the unit checks concurrently, and shows their messages in the order of the unit checks.
+    The unit checks that don't finish before their timeout (or before the global deadline) are reported as errors.
+    :param unit_checks: (name, function, args) of every unit check.
+    :param timeout: Maximum seconds of every unit check.
+    :param deadline: Maximum seconds of all the unit checks.
+    :return: True if all the unit checks finished without errors.
+    """
+    success = True
+    for outcome in run_concurrently(unit_checks, timeout, deadline):
+        replay_messages(outcome['messages'])
+        if not outcome['finished']:
+            error_message("The check {} didn't finish in {}s.".format(outcome['name'], min(timeout, deadline)))
+            success = False
+        elif outcome['exception'] is not None:
+            error_message("The check {} failed: {}".format(outcome['name'], outcome['exception']))
+            success = False
+        elif status_code(outcome['status']) >= status_code('CRITICAL'):
+            success = False
+    return success
+
+
+def run_probes(probes: List[Tuple[str, Callable, tuple]], remaining: float) -> bool:
+    """
+    Runs the probes one after another, in this thread. Every probe bounds its own duration (see their configurations), and gets the
+    seconds left until the global deadline ('remaining'), to shorten its measures so it finishes before it.
+    The probes that would start after the global deadline are reported as errors.
+    :param probes: (name, function, args) of every probe.
+    :param remaining: Seconds left until the global deadline.
+    :return: True if all the probes finished without errors.
+    """
+    success = True
+    end = time.perf_counter() + remaining
+    for name, function, args in probes:
+        with check_scope(name) as scope:
+            if time.perf_counter() >= end:
+                error_message("The check {} didn't start, the deadline passed.".format(name))
+            else:
+                try:
+                    function(*args, remaining=end - time.perf_counter())
+                except Exception as ex:
+                    error_message("The check {} failed: {}".format(name, ex))
+        if status_code(scope.status) >= status_code('CRITICAL'):
+            success = False
+    return success
 
-def check_redis(config: Dict, ec2_dummy_path: str):
-    check_instance_type(config['hardware']['instance_type'], ec2_dummy_path)
 
-    check_ingress(config['hardware']['ingress'])
-    check_certs(config['hardware']['certs'])
-    check_tz(config['hardware']['tz'])
+# ---------------- BEGIN Machine checks ---------------- #
+# Every machine check returns its unit checks, as (name, function, args), to be run concurrently.
+
+def check_bastion(config: Dict, fqdn: str) -> List[Tuple[str, Callable, tuple]]:
+    return [
+        ('ingress', check_ingress, (config['hardware']['ingress'],)),
+        ('config_metrics', check_config_metrics, (fqdn, config['config'])),
+    ]
+
+
+def check_kafka(config: Dict, fqdn: str, ec2_metadata: Dict) -> List[Tuple[str, Callable, tuple]]:
+    return [
+        ('instance_type', check_instance_type, (config['hardware']['instance_type'], ec2_metadata)),
+        ('fs', check_fs, (config['hardware']['fs'],)),
+        # DNS is tested from bastion
+        ('ingress', check_ingress, (config['hardware']['ingress'],)),
+        ('etc_hosts', check_etc_hosts, (fqdn,)),
+        ('certs', check_certs, (config['hardware']['certs'], config['hardware'].get('certs_check'))),
+        ('tz', check_tz, (config['hardware']['tz'],)),
+        ('clock', check_clock, (config['hardware'].get('clock'),)),
+        ('config_metrics', check_config_metrics, (fqdn, config['config'])),
+    ]
+
+
+def check_striim(config: Dict, fqdn: str, ec2_metadata: Dict) -> List[Tuple[str, Callable, tuple]]:
+    return [
+        ('instance_type', check_instance_type, (config['hardware']['instance_type'], ec2_metadata)),
+        ('fs', check_fs, (config['hardware']['fs'],)),
+        # DNS is tested from bastion
+        ('ingress', check_ingress, (config['hardware']['ingress'],)),
+        ('etc_hosts', check_etc_hosts, (fqdn,)),
+        ('certs', check_certs, (config['hardware']['certs'], config['hardware'].get('certs_check'))),
+        ('tz', check_tz, (config['hardware']['tz'],)),
+        ('clock', check_clock, (config['hardware'].get('clock'),)),
+        ('config_metrics', check_config_metrics, (fqdn, config['config'])),
+    ]
+
+
+def check_psql(config: Dict, fqdn: str, ec2_metadata: Dict) -> List[Tuple[str, Callable, tuple]]:
+    return [
+        ('instance_type', check_instance_type, (config['hardware']['instance_type'], ec2_metadata)),
+        ('fs', check_fs, (config['hardware']['fs'],)),
+        # DNS is tested from bastion
+        ('ingress', check_ingress, (config['hardware']['ingress'],)),
+        ('etc_hosts', check_etc_hosts, (fqdn,)),
+        ('certs', check_certs, (config['hardware']['certs'], config['hardware'].get('certs_check'))),
+        ('tz', check_tz, (config['hardware']['tz'],)),
+        ('clock', check_clock, (config['hardware'].get('clock'),)),
+    ]
+
+
+def check_emr(config: Dict, fqdn: str, ec2_metadata: Dict) -> List[Tuple[str, Callable, tuple]]:
+    return [
+        ('instance_type', check_instance_type, (config['hardware']['instance_type'], ec2_metadata)),
+        ('fs', check_fs, (config['hardware']['fs'],)),
+        # DNS is tested from bastion
+        ('ingress', check_ingress, (config['hardware']['ingress'],)),
+        ('etc_hosts', check_etc_hosts, (fqdn,)),
+        ('certs', check_certs, (config['hardware']['certs'], config['hardware'].get('certs_check'))),
+        ('tz', check_tz, (config['hardware']['tz'],)),
+        ('clock', check_clock, (config['hardware'].get('clock'),)),
+    ]
+
+
+def check_redis(config: Dict, ec2_metadata: Dict) -> List[Tuple[str, Callable, tuple]]:
+    return [
+        ('instance_type', check_instance_type, (config['hardware']['instance_type'], ec2_metadata)),
+        ('ingress', check_ingress, (config['hardware']['ingress'],)),
+        ('certs', check_certs, (config['hardware']['certs'], config['hardware'].get('certs_check'))),
+        ('tz', check_tz, (config['hardware']['tz'],)),
+        ('clock', check_clock, (config['hardware'].get('clock'),)),
+    ]
+
+
+def check_psql2(config: Dict, ec2_metadata: Dict) -> List[Tuple[str, Callable, tuple]]:
+    return [
+        ('instance_type', check_instance_type, (config['hardware']['instance_type'], ec2_metadata)),
+        ('ingress', check_ingress, (config['hardware']['ingress'],)),
+        ('certs', check_certs, (config['hardware']['certs'], config['hardware'].get('certs_check'))),
+        ('tz', check_tz, (config['hardware']['tz'],)),
+        ('clock', check_clock, (config['hardware'].get('clock'),)),
+    ]
+
+
+def check_dns(config: Dict) -> List[Tuple[str, Callable, tuple]]:
+    return [
+        ('dns', check_fqdns_resolution, (config['fqdns'], config.get('dns'))),
+    ]
 
 
-def check_psql2(config: Dict, ec2_dummy_path: str):
-    check_instance_type(config['hardware']['instance_type'], ec2_dummy_path)
+# ---------------- END Machine checks ---------------- #
 
-    check_ingress(config['hardware']['ingress'])
-    check_certs(config['hardware']['certs'])
-    check_tz(config['hardware']['tz'])
+# ---------------- BEGIN Unit checks ---------------- #
 
 
-def check_dns(config: Dict):
+def check_fqdns_resolution(fqdns: List[str], dns_config: Dict = None):
     """
     Checks if the Fully Qualified Domain Names of the rest of machines are resolved by the DNS.
+    All the names are resolved concurrently, for every record type and resolver. A name is resolved if any of its queries has answers.
+    The resolution latency, answers and TTLs of every name are shown, and the resolvers that disagree on the answers are reported.
+    The resolvers that fail are warnings while the names are resolved by another resolver, and critical when a name isn't resolved.
+    :param fqdns: Fully Qualified Domain Names, obtained from the configuration file.
+    :param dns_config: DNS configuration, obtained from the configuration file: resolvers ('resolvers', default the ones of
+    /etc/resolv.conf, written as ip or ip:port), record types ('record_types', default A, AAAA and CNAME), timeout of every query
+    in seconds ('timeout', default 2), retries of timed out queries ('retries', default 2) and concurrent queries ('workers', default 64).
     """
-    fqdns: List[str] = config['fqdns']
-
-    # For each fqdn, check if the dig command has the answer section.
-    # If the fqdn is not resolved, the answer section doesn't appear (authority section appears instead).
-    for fqdn in fqdns:
-        dig_result = execute_shell_command_and_return_stdout_as_lines_list("dig " + fqdn)
-        try:
-            next(filter(lambda line: line.startswith(";; ANSWER SECTION:"), dig_result))
-            # Here, the answer section appeared
+    dns_config = dns_config or {}
+    resolvers: List[str] = dns_config.get('resolvers') or system_resolvers()
+    record_types: List[str] = dns_config.get('record_types', ['A', 'AAAA', 'CNAME'])
+    timeout = dns_config.get('timeout', 2.0)
+    retries = dns_config.get('retries', 2)
+
+    queries = [(resolver, fqdn, record_type) for fqdn in fqdns for record_type in record_types for resolver in resolvers]
+    with ThreadPoolExecutor(max_workers=max(min(dns_config.get('workers', 64), len(queries)), 1)) as executor:
+        results = list(executor.map(lambda query: resolve(query[0], query[1], query[2], timeout, retries), queries))
+
+    results_by_fqdn = OrderedDict((fqdn, []) for fqdn in fqdns)
+    unresolved = []
+    for result in results:
+        results_by_fqdn[result['name']].append(result)
+
+    for fqdn, fqdn_results in results_by_fqdn.items():
+        answered = [result for result in fqdn_results if result['error'] is None]
+        latencies = [result['latency'] for result in answered]
+        answers = sorted({"{} {} (ttl {})".format(record_type, value, ttl) for result in answered
+                          for _, record_type, ttl, value in result['answers']})
+
+        # The failures of some resolvers are warnings while another one resolves the name: it's only critical if none does
+        resolved = any(result['answers'] for result in answered)
+        failure_message = warning_message if resolved else error_message
+        if resolved:
             ok_message("The fqdn '{}' is resolved by the DNS.".format(fqdn))
-        except StopIteration:
-            # If the filter object is empty, the answer section didn't appear
-            error_message("The fqdn '{}' is NOT resolved by the DNS.".format(fqdn))
-
-
-# ---------------- END Machine checks ---------------- #
-
-# ---------------- BEGIN Unit checks ---------------- #
+        else:
+            unresolved.append(fqdn)
+            rcodes = sorted({result['rcode'] or result['error'] for result in fqdn_results})
+            error_message("The fqdn '{}' is NOT resolved by the DNS ({}).".format(fqdn, ", ".join(rcodes)))
+        if latencies:
+            text_message("    latency min={:.1f}ms max={:.1f}ms answers: {}".format(min(latencies) * 1000, max(latencies) * 1000,
+                                                                                    ", ".join(answers) or "none"))
+
+        for result in fqdn_results:
+            if result['error'] is not None:
+                failure_message("The resolver {} didn't answer the {} query of '{}': {}.".format(result['resolver'], result['type'], fqdn,
+                                                                                                result['error']))
+
+        # The resolvers that answered must agree on the values (TTLs may differ, as they are counted down by caches)
+        for record_type in record_types:
+            values = {result['resolver']: sorted(value for _, answer_type, _, value in result['answers'] if answer_type == record_type)
+                      for result in answered if result['type'] == record_type}
+            if len({tuple(resolver_values) for resolver_values in values.values()}) > 1:
+                failure_message("The resolvers disagree on the {} records of '{}': {}.".format(
+                    record_type, fqdn, "; ".join("{}={}".format(resolver, ",".join(resolver_values) or "none")
+                                                 for resolver, resolver_values in values.items())))
+
+    for resolver in resolvers:
+        latencies = summarize([result['latency'] for result in results if result['resolver'] == resolver and result['error'] is None])
+        if latencies['count']:
+            info_message("Resolver {}: {} queries answered, latency p50={:.1f}ms p90={:.1f}ms p99={:.1f}ms max={:.1f}ms.".format(
+                resolver, latencies['count'], latencies['p50'] * 1000, latencies['p90'] * 1000, latencies['p99'] * 1000, latencies['max'] * 1000))
+        elif unresolved:
+            error_message("Resolver {} didn't answer any query.".format(resolver))
+        else:
+            warning_message("Resolver {} didn't answer any query.".format(resolver))
 
 
 def check_fs(required_mountpoints: List[str]):
@@ -209,47 +443,240 @@ def check_fs(required_mountpoints: List[str]):
         except StopIteration:
             error_message("The required mountpoint {} is not mounted.".format(required_mountpoint))
 
-    # Print the df command info
+    # Print the size and usage of every partition (like df -h --output=source,size,pcent)
     info_message("Partitions size:")
-    print(execute_shell_command_and_return_stdout("df -h --output=source,size,pcent"))
+    text_message("{:<30} {:>6} {:>5}".format("Filesystem", "Size", "Use%"))
+    for disk_partition in psutil.disk_partitions():
+        try:
+            usage = psutil.disk_usage(disk_partition.mountpoint)
+        except OSError:
+            continue
+        text_message("{:<30} {:>6} {:>4.0f}%".format(disk_partition.device, human_size(usage.total), usage.percent))
+
+
+def check_compute_probe(instance_type: str, probe_config: Dict = None, remaining: float = None):
+    """
+    Checks the CPU and memory performance of the machine against the baseline of its instance type: single core and all cores
+    integer and float throughput (with a pool of processes), memory bandwidth and allocation rate.
+    :param instance_type: AWS instance type of the machine, from the EC2 metadata.
+    :param probe_config: Configuration of the probe, obtained from the configuration file: seconds of every measure ('seconds',
+    default 0.5), baselines per instance type ('baselines': {instance_type: {measure: value}}), and the fraction a measure can be below
+    its baseline ('tolerance', default 0.2, and 'tolerances' per measure). Measures above the band are only shown.
+    :param remaining: Seconds the probe can last (default no limit). The measures are shortened to fit in them.
+    """
+    probe_config = probe_config or {}
+    baseline: Dict = probe_config.get('baselines', {}).get(instance_type)
+    seconds = probe_config.get('seconds', 0.5)
+    if remaining is not None:
+        # Every measure, and the time to start the pool of processes
+        seconds = min(seconds, remaining / (COMPUTE_MEASURES + 1))
+    measured = probe_compute(seconds, probe_config.get('processes'), probe_config.get('memory_mb', 64))
+
+    add_values(**measured)
+    info_message("Compute probe ({}, {} CPUs):".format(instance_type, os.cpu_count()))
+    for measure, value in measured.items():
+        text_message("    {:<18} {:>12.2f}{}".format(measure, value, "   (baseline {})".format(baseline[measure])
+                                                                       if baseline and measure in baseline else ""))
+
+    if not baseline:
+        error_message("There is no compute baseline for the instance type {}.".format(instance_type))
+        return
+
+    below, above = [], []
+    for measure, expected in baseline.items():
+        tolerance = probe_config.get('tolerances', {}).get(measure, probe_config.get('tolerance', 0.2))
+        if measured[measure] < expected * (1 - tolerance):
+            below.append("{} {:.2f} < {:.2f}".format(measure, measured[measure], expected * (1 - tolerance)))
+        elif measured[measure] > expected * (1 + tolerance):
+            above.append("{} {:.2f} > {:.2f}".format(measure, measured[measure], expected * (1 + tolerance)))
+
+    if below:
+        error_message("The machine performs below the baseline of {}: {}.".format(instance_type, ", ".join(below)))
+    else:
+        ok_message("The machine performs as the baseline of {}.".format(instance_type))
+    if above:
+        info_message("The machine performs above the baseline of {}: {}.".format(instance_type, ", ".join(above)))
+
+
+def check_network_probe(fqdn: str, probe_config: Dict, remaining: float = None):
+    """
+    Checks the TCP throughput (upload and download, with parallel streams), round trip time and jitter between the machine and its
+    peers, that must be running utHardware.py --network-server. The peers are probed one after another, to not share the bandwidth.
+    :param fqdn: Fully Qualified Domain Name of the machine. '<fqdn>' in the peers is replaced by it (i.e. to probe the loopback).
+    :param probe_config: Configuration of the probe, obtained from the configuration file: peers ('peers'), port of their servers ('port',
+    default 5201), parallel streams ('streams', default 4), seconds of every direction ('seconds', default 2), round trips ('pings',
+    default 20) and expected values ('expected': min_mbps is a minimum, rtt_p99_ms and jitter_ms are maximums).
+    :param remaining: Seconds the probe can last (default no limit). The throughput measures are shortened to fit in them, and the peers
+    left when they run out aren't probed.
+    """
+    port = probe_config.get('port', 5201)
+    streams = probe_config.get('streams', 4)
+    expected: Dict = probe_config.get('expected', {})
+    end = time.perf_counter() + remaining if remaining is not None else None
+
+    for peer in [peer.replace('<fqdn>', fqdn) for peer in probe_config.get('peers', [])]:
+        seconds = probe_config.get('seconds', 2.0)
+        if end is not None:
+            if time.perf_counter() >= end:
+                error_message("The network to {} wasn't probed, the deadline passed.".format(peer))
+                continue
+            # The upload, the download, and the round trips and connections
+            seconds = min(seconds, (end - time.perf_counter()) / 3)
+        try:
+            rtts = [rtt * 1000 for rtt in measure_rtt(peer, port, probe_config.get('pings', 20), probe_config.get('ping_interval', 0.01))]
+        except OSError as e:
+            error_message("The network probe server of {}:{} can't be reached: {}.".format(peer, port, e))
+            continue
+        rtt = summarize(rtts)
+        measured = {'rtt_p99_ms': rtt['p99'], 'jitter_ms': jitter(rtts)}
+        info_message("Network probe of {} ({} streams):".format(peer, streams))
+        text_message("    rtt p50={:.3f}ms p99={:.3f}ms max={:.3f}ms jitter={:.3f}ms".format(rtt['p50'], rtt['p99'], rtt['max'],
+                                                                                           measured['jitter_ms']))
+
+        too_slow = []
+        for direction in ('upload', 'download'):
+            throughput = measure_throughput(peer, port, direction, streams, seconds)
+            measured['{}_mbps'.format(direction)] = throughput['mbps']
+            text_message("    {:<8} {:>10.1f}Mbit/s (streams: {})".format(direction, throughput['mbps'], ", ".join(
+                "{:.1f}".format(stream_mbps) for stream_mbps in throughput['streams_mbps'])))
+            if throughput['errors']:
+                error_message("{} of {} {} streams to {} failed: {}.".format(len(throughput['errors']), streams, direction, peer,
+                                                                           "; ".join(sorted(set(throughput['errors'])))))
+            if 'min_mbps' in expected and throughput['mbps'] < expected['min_mbps']:
+                too_slow.append("{} {:.1f}Mbit/s < {}".format(direction, throughput['mbps'], expected['min_mbps']))
+        too_slow += ["{} {:.3f} > {}".format(metric, measured[metric], expected[metric])
+                     for metric in ('rtt_p99_ms', 'jitter_ms') if metric in expected and measured[metric] > expected[metric]]
+
+        peer_values = {'{}_{}'.format(peer, metric): value for metric, value in measured.items()}
+        if too_slow:
+            error_message("The network to {} is slower than expected: {}.".format(peer, ", ".join(too_slow)), **peer_values)
+        else:
+            ok_message("The network to {} performs as expected.".format(peer), **peer_values)
 
 
-def check_ingress(required_opened_ports: List[int]):
+def check_disk_probe(mountpoint: str, probe_config: Dict = None, remaining: float = None):
+    """
+    Checks the throughput and latency of the disk of a mountpoint: sequential write and read, random 4k reads and fsync latency,
+    on a temporary file (with O_DIRECT where the filesystem supports it), comparing them with the expected ones.
+    :param mountpoint: Mountpoint to probe, obtained from the configuration file.
+    :param probe_config: Configuration of the probe, obtained from the configuration file: size of the sequential test in MB ('size_mb',
+    default 64), maximum seconds of every test ('max_seconds', default 3) and expected values ('expected': seq_write_mbs, seq_read_mbs
+    and rand_read_iops are minimums, fsync_p99_ms and rand_read_p99_ms are maximums).
+    :param remaining: Seconds the probe can last (default no limit). The tests are shortened to fit in them.
+    """
+    if not os.path.isdir(mountpoint):
+        error_message("The disk of {} can't be probed, the mountpoint doesn't exist.".format(mountpoint))
+        return
+    probe_config = probe_config or {}
+    expected: Dict = probe_config.get('expected', {})
+    max_seconds = probe_config.get('max_seconds', 3.0)
+    if remaining is not None:
+        max_seconds = min(max_seconds, remaining / DISK_PROBE_TESTS)
+    results = probe_disk(mountpoint, int(probe_config.get('size_mb', 64) * 1024 * 1024), max_seconds)
+
+    rand_read = summarize([latency * 1000 for latency in results['rand_read']['latencies']])
+    fsync = summarize([latency * 1000 for latency in results['fsync']['latencies']])
+    measured = {
+        'seq_write_mbs': results['seq_write']['bytes'] / 1024 / 1024 / results['seq_write']['seconds'],
+        'seq_read_mbs': results['seq_read']['bytes'] / 1024 / 1024 / max(results['seq_read']['seconds'], 1e-9),
+        'rand_read_iops': rand_read['count'] / max(results['rand_read']['seconds'], 1e-9),
+        'rand_read_p99_ms': rand_read.get('p99', 0.0),
+        'fsync_p99_ms': fsync.get('p99', 0.0),
+    }
+
+    info_message("Disk probe of {} ({}):".format(mountpoint, "O_DIRECT" if results['seq_write']['direct'] else "page cache dropped"))
+    text_message("    sequential write {:.1f}MB/s, sequential read {:.1f}MB/s".format(measured['seq_write_mbs'], measured['seq_read_mbs']))
+    if rand_read['count']:
+        text_message("    random 4k read {:.0f} IOPS, latency p50={:.2f}ms p99={:.2f}ms max={:.2f}ms".format(
+            measured['rand_read_iops'], rand_read['p50'], rand_read['p99'], rand_read['max']))
+    if fsync['count']:
+        text_message("    fsync latency p50={:.2f}ms p99={:.2f}ms max={:.2f}ms".format(fsync['p50'], fsync['p99'], fsync['max']))
+
+    # Throughputs are minimums, latencies are maximums
+    too_slow = ["{} {:.2f} < {}".format(metric, measured[metric], expected[metric])
+                for metric in ('seq_write_mbs', 'seq_read_mbs', 'rand_read_iops') if metric in expected and measured[metric] < expected[metric]]
+    too_slow += ["{} {:.2f} > {}".format(metric, measured[metric], expected[metric])
+                 for metric in ('rand_read_p99_ms', 'fsync_p99_ms') if metric in expected and measured[metric] > expected[metric]]
+    if too_slow:
+        error_message("The disk of {} is slower than expected: {}.".format(mountpoint, ", ".join(too_slow)), **measured)
+    else:
+        ok_message("The disk of {} performs as expected.".format(mountpoint), **measured)
+
+
+def check_ingress(required_opened_ports: List[int], proc_net_path: str = '/proc/net'):
     """
     Checks that the ingress ports are opened.
     :param required_opened_ports: Ports that are required to be opened, obtained from the configuration file.
+    :param proc_net_path: Directory with the socket tables of the kernel.
     """
-    netstat = execute_shell_command_and_return_stdout_as_lines_list("netstat -tunpl")[2:]  # Remove the first and the second lines
-
-    # Remove empty lines
-    netstat = filter(lambda line: len(line.strip()) > 0, netstat)
-    # Transform the list of lines of the netstat command to a set of opened ports
-    current_opened_ports = {line.split()[3].split(':')[-1] for line in netstat}  # The 'Local Address' column (the 4th) contains the ingress info
+    # Set of opened ports, read from the socket tables of the kernel
+    current_opened_ports = listening_ports(proc_net_path)
 
     # For each one of the required ports, check if it's present in the current opened ports set
-    for required_opened_port in map(lambda x: str(x), required_opened_ports):
+    for required_opened_port in map(int, required_opened_ports):
         if required_opened_port in current_opened_ports:
             ok_message("The port {} is opened.".format(required_opened_port))
         else:
             error_message("The port {} is NOT opened.".format(required_opened_port))
 
 
-def check_etc_hosts(fqdn: str):
+def check_ingress_connect(ingress_ports: List[int], hosts: List[str], fqdn: str, active_config: Dict = None):
     """
-    Checks that the /etc/hosts file contains a line that links the loopback IP with the FQDN (Fully Qualified Domain Name).
-    :param fqdn: Fully Qualified Domain Name, obtained from the configuration file.
+    Checks that the ingress ports accept TCP connections (and TLS handshakes, on the TLS ports), and how fast.
+    The hosts are probed concurrently, and every port of a host is connected several times in a row, resolving the host once.
+    :param ingress_ports: Ports that are required to be opened, obtained from the configuration file.
+    :param hosts: Hosts to connect to (the local machine and/or its peers). '<fqdn>' is replaced by the fqdn of the machine.
+    :param fqdn: Fully Qualified Domain Name of the machine.
+    :param active_config: Configuration of the probe, obtained from the configuration file: connections per port ('attempts', default 5),
+    connect timeout in seconds ('timeout', default 2), ports that speak TLS ('tls_ports', default none) and maximum p99 connect latency
+    in milliseconds ('max_p99_ms', default no limit).
     """
-    etc_hosts = execute_shell_command_and_return_stdout_as_lines_list("cat /etc/hosts")
-
-    # Remove empty lines and comment lines
-    etc_hosts = filter(lambda line: len(line) > 0 and line[0] != '#', etc_hosts)
+    active_config = active_config or {}
+    attempts = active_config.get('attempts', 5)
+    timeout = active_config.get('timeout', 2.0)
+    tls_ports = set(map(int, active_config.get('tls_ports', [])))
+    max_p99_ms = active_config.get('max_p99_ms')
+    tls_context = unverified_tls_context() if tls_ports else None
+
+    def probe_port(target: Tuple[str, int]) -> List[Dict]:
+        host, port = target
+        try:
+            address = resolve_address(host, port)
+        except OSError:
+            return [{'connect': None, 'handshake': None, 'error': 'unresolved'} for _ in range(attempts)]
+        return [probe_connect(host, port, timeout, tls_context if port in tls_ports else None, address) for _ in range(attempts)]
+
+    targets = [(host.replace('<fqdn>', fqdn), int(port)) for host in hosts for port in ingress_ports]
+    with ThreadPoolExecutor(max_workers=max(min(len(targets), 32), 1)) as executor:
+        probes_by_target = list(executor.map(probe_port, targets))
+
+    for (host, port), probes in zip(targets, probes_by_target):
+        errors = [probe['error'] for probe in probes if probe['error'] is not None]
+        connect = summarize([probe['connect'] * 1000 for probe in probes if probe['connect'] is not None])
+        handshake = summarize([probe['handshake'] * 1000 for probe in probes if probe['handshake'] is not None])
+
+        if not errors:
+            ok_message("The port {}:{} accepts connections.".format(host, port))
+        else:
+            error_message("The port {}:{} failed {} of {} connections: {}.".format(
+                host, port, len(errors), attempts, ", ".join("{} {}".format(errors.count(error), error) for error in sorted(set(errors)))))
+        if connect['count']:
+            text_message("    connect p50={:.2f}ms p90={:.2f}ms p99={:.2f}ms max={:.2f}ms{}".format(
+                connect['p50'], connect['p90'], connect['p99'], connect['max'],
+                " tls handshake p50={:.2f}ms p99={:.2f}ms".format(handshake['p50'], handshake['p99']) if handshake['count'] else ""))
+            if max_p99_ms is not None and connect['p99'] > max_p99_ms:
+                error_message("The port {}:{} is slow accepting connections: p99 {:.2f}ms > {}ms.".format(host, port, connect['p99'], max_p99_ms))
 
-    # Keep only the lines that refer to the loopback
-    etc_hosts = filter(lambda line: line.split()[0] == "127.0.0.1", etc_hosts)
 
-    # Check that the fqdn is in the second position of one of the remaining lines
-    for line in etc_hosts:
-        if line.split()[1] == fqdn:
+def check_etc_hosts(fqdn: str, hosts_path: str = '/etc/hosts'):
+    """
+    Checks that the /etc/hosts file contains a line that links the loopback IP with the FQDN (Fully Qualified Domain Name).
+    :param fqdn: Fully Qualified Domain Name, obtained from the configuration file.
+    :param hosts_path: Path of the hosts file.
+    """
+    # Check that the fqdn is the first name of one of the lines that refer to the loopback
+    for ip, names in read_hosts_file(hosts_path):
+        if ip == "127.0.0.1" and names[0] == fqdn:
             ok_message("etc/hosts file is correctly configured. Loopback IP is related to the FQDN.")
             return
 
@@ -257,13 +684,13 @@ def check_etc_hosts(fqdn: str):
                   "Add this line to the /etc/hosts file: '127.0.0.1    {}'".format(fqdn))
 
 
-def check_instance_type(expected_instance_type: str, ec2_dummy_path: str):
+def check_instance_type(expected_instance_type: str, ec2_metadata: Dict):
     """
     Checks that the AWS instance type (m5.large, t2.micro, etc) is the expected.
     :param expected_instance_type: Expected AWS instance type, obtained from the configuration file.
-    :param ec2_dummy_path: Relative path to the ec2-metadata dummy file, obtained from the configuration file.
+    :param ec2_metadata: EC2 metadata of the instance.
     """
-    instance_type = execute_ec2_metadata_command_and_return_stdout("--instance-type", ec2_dummy_path).split()[1]
+    instance_type = ec2_metadata['instance-type']
     if instance_type == expected_instance_type:
         ok_message("Instance type is OK")
     else:
@@ -271,80 +698,223 @@ def check_instance_type(expected_instance_type: str, ec2_dummy_path: str):
                       .format(expected_instance_type, instance_type))
 
 
-def check_certs(cert_path: str):
+def check_certs(cert_path: str, certs_config: Dict = None):
     """
-    Checks that the certificates specified in the configuration file exist.
+    Checks that the certificates specified in the configuration file exist, and inspects them: expiry, key algorithm and size, signature
+    algorithm and chain (verified against the CA with openssl, if configured). The parsing is cached until the files are modified.
+    Optionally, it also measures the TLS handshakes of the local service ports: latency, protocol, cipher and session resumption.
     :param cert_path: Path where the certificate file should be located, obtained from the configuration file.
+    :param certs_config: Configuration of the inspection, obtained from the configuration file: CA file ('ca'), days before the expiry
+    to fail ('expiry_days', default 30), minimum RSA key size ('min_rsa_bits', default 2048), TLS ports to handshake with ('tls_ports'),
+    their host ('tls_host', default localhost), handshakes of every kind ('handshakes', default 5) and maximum p99 of the full
+    handshakes in milliseconds ('max_handshake_p99_ms', default no limit).
     """
-    if os.path.exists(cert_path):
-        ok_message("Certificates exist")
-    else:
+    if not os.path.exists(cert_path):
         error_message("Certificates doesn't exist in this path: {}.".format(cert_path))
+        return
+    ok_message("Certificates exist")
 
-
-def check_tz(expected_tz: str):
+    certs_config = certs_config or {}
+    expiry_days = certs_config.get('expiry_days', 30)
+    try:
+        inspection = inspect_certificates(cert_path, certs_config.get('ca'))
+    except (OSError, ValueError) as e:
+        error_message("The certificates of {} can't be inspected: {}.".format(cert_path, e))
+        return
+    for certificate in inspection['certificates']:
+        days_left = (certificate['not_after'] - time.time()) / 86400
+        key = "{} {}".format(certificate['key_algorithm'], certificate['key_size']) + (" {}".format(certificate['curve']) if certificate['curve'] else "")
+        text_message("    {} (issuer {}): {}, {}, expires {} ({:.0f} days)".format(
+            certificate['subject'], certificate['issuer'], key, certificate['signature_algorithm'],
+            time.strftime('%Y-%m-%d', time.gmtime(certificate['not_after'])), days_left))
+
+        if days_left < 0 or certificate['not_before'] > time.time():
+            error_message("The certificate '{}' isn't valid now.".format(certificate['subject']))
+        elif days_left < expiry_days:
+            error_message("The certificate '{}' expires in {:.0f} days.".format(certificate['subject'], days_left))
+        if certificate['key_algorithm'] == 'RSA' and certificate['key_size'] < certs_config.get('min_rsa_bits', 2048):
+            error_message("The key of the certificate '{}' is too small: RSA {}.".format(certificate['subject'], certificate['key_size']))
+        if certificate['signature_algorithm'].startswith('sha1'):
+            error_message("The certificate '{}' is signed with SHA-1.".format(certificate['subject']))
+    for problem in inspection['problems']:
+        error_message("{}.".format(problem))
+
+    leaf_key = inspection['certificates'][0] if inspection['certificates'] else {}
+    for port in certs_config.get('tls_ports', []):
+        host = certs_config.get('tls_host', 'localhost')
+        handshakes = probe_tls_handshakes(host, port, certs_config.get('handshakes', 5), ca_path=certs_config.get('ca'))
+        if handshakes['error'] is not None:
+            error_message("The TLS handshake with {}:{} failed: {}.".format(host, port, handshakes['error']))
+            continue
+        full = summarize([latency * 1000 for latency in handshakes['full']])
+        resumed = summarize([latency * 1000 for latency in handshakes['resumed']])
+        text_message("    {}:{} {} {}: full handshake p50={:.2f}ms p99={:.2f}ms, resumed p50={:.2f}ms, {} of {} sessions resumed".format(
+            host, port, handshakes['protocol'], handshakes['cipher'], full['p50'], full['p99'], resumed['p50'], handshakes['reused'],
+            resumed['count']))
+
+        if handshakes['reused'] == 0:
+            error_message("The TLS sessions of {}:{} aren't resumed: every connection pays a full handshake.".format(host, port))
+        max_p99_ms = certs_config.get('max_handshake_p99_ms')
+        if max_p99_ms is not None and full['p99'] > max_p99_ms:
+            error_message("The TLS handshakes of {}:{} are slow: p99 {:.2f}ms > {}ms{}.".format(
+                host, port, full['p99'], max_p99_ms, " (RSA {} key)".format(leaf_key['key_size']) if leaf_key.get('key_algorithm') == 'RSA' else ""))
+
+
+def check_tz(expected_tz: str, localtime_path: str = '/etc/localtime'):
     """
     Checks that the timezone is the same as the one specified in the configuration file.
     :param expected_tz: Value of the expected timezone, obtained from the configuration file.
+    :param localtime_path: Path of the localtime file (usually a symlink to the timezone file).
     """
-    tz = execute_shell_command_and_return_stdout('timedatectl | grep "Time zone"').split("Time zone:")[1].split()[0]
+    tz = current_timezone(localtime_path)
     if tz == expected_tz:
         ok_message("Timezone is OK")
     else:
         error_message("Timezone is WRONG. Expected: {}. Current: {}.".format(expected_tz, tz))
 
 
-def check_ntpd():
+def check_clock(clock_config: Dict = None):
     """
-    Checks that the ntpd.service is active and running.
+    Checks that the clock is synchronized: queries the time sources concurrently with SNTP (offset, delay and stratum of each one),
+    and reads the synchronization state of the kernel clock with adjtimex.
+    :param clock_config: Configuration of the check, obtained from the configuration file: time sources ('servers', host or host:port,
+    default the Amazon Time Sync Service), queries per source, keeping the one with the lowest delay ('samples', default 3), timeout
+    of every query in seconds ('timeout', default 2) and maximum absolute offset in milliseconds ('max_offset_ms', default 50).
     """
-    try:
-        ntpd_status = execute_shell_command_and_return_stdout('systemctl status ntpd | grep "Active:"').split("Active:")[1].strip()
-
-        if ntpd_status.startswith("active (running)"):
-            ok_message("ntpd is active and running")
+    clock_config = clock_config or {}
+    servers = clock_config.get('servers', ['169.254.169.123'])
+    max_offset_ms = clock_config.get('max_offset_ms', 50)
+
+    with ThreadPoolExecutor(max_workers=max(len(servers), 1)) as executor:
+        results = list(executor.map(lambda server: best_sntp_sample(server, clock_config.get('samples', 3), clock_config.get('timeout', 2.0)),
+                                    servers))
+
+    for result in results:
+        if result['error'] is not None:
+            error_message("The time source {} didn't answer: {}.".format(result['server'], result['error']))
+            continue
+        offset_ms = result['offset'] * 1000
+        text_message("    {} stratum {} ({}): offset {:+.3f}ms, delay {:.3f}ms".format(result['server'], result['stratum'], result['reference'],
+                                                                                     offset_ms, result['delay'] * 1000))
+        add_values(**{'{}_offset_ms'.format(result['server']): offset_ms, '{}_delay_ms'.format(result['server']): result['delay'] * 1000})
+        if abs(offset_ms) > max_offset_ms:
+            error_message("The clock is {:+.3f}ms off the time source {} (maximum {}ms).".format(offset_ms, result['server'], max_offset_ms))
         else:
-            error_message("ntpd is not active and running. Current ntpd status: {}.".format(ntpd_status))
-    except IndexError:
-        # An IndexError can be raised by 2 reasons:
-        # * The ntpd.service could not be found by the systemctl status command
-        # * The grep command didn't find "Active:"
-        # This means that ntpd is not configured correctly
-        error_message("ntpd.service could not be found.")
+            ok_message("The clock is in sync with the time source {}.".format(result['server']))
+    if servers and all(result['error'] is not None for result in results):
+        error_message("No time source answered, the clock offset is unknown.")
+
+    kernel_status = kernel_time_status()
+    if kernel_status is None:
+        info_message("The synchronization state of the kernel clock can't be read (adjtimex isn't available).")
+    elif kernel_status['synchronized']:
+        ok_message("The kernel clock is synchronized ({}, estimated error {:.3f}ms, maximum error {:.3f}ms, frequency {:+.3f}ppm).".format(
+            kernel_status['state'], kernel_status['esterror'] * 1000, kernel_status['maxerror'] * 1000, kernel_status['freq_ppm']))
+    else:
+        error_message("The kernel clock isn't synchronized ({}): no NTP daemon is disciplining it.".format(kernel_status['state']))
 
 
-def check_config_metrics(fqdn: str, metrics_endpoints: List[str]):
+def scrape_metrics_endpoints(endpoints: List[str], timeout: float, top: int) -> List[Dict]:
     """
-    Checks that the metrics endpoints are running.
-    :param fqdn: Fully Qualified Domain Name, obtained from the configuration file.
-    :param metrics_endpoints: List of metrics endpoints that must be running, obtained from the configuration file.
+    Scrapes, one after another and reusing the same connection, metrics endpoints that belong to the same host.
+    Every response body is scanned as a Prometheus exposition while it's received.
+    :param endpoints: URLs of the endpoints, all of them with the same scheme, host and port.
+    :param timeout: Maximum seconds of every request, including the reading of the body.
+    :param top: Number of highest-cardinality metric families to report.
+    :return: The scrape results of every endpoint, in the same order.
     """
-    for metrics_endpoint in metrics_endpoints:
-        metrics_endpoint_with_fqdn = "http://" + metrics_endpoint.replace('<fqdn>', fqdn)
+    url = urllib.parse.urlsplit(endpoints[0])
+    connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+    connection = connection_class(url.hostname, url.port, timeout=timeout)
+    results = []
+
+    for endpoint in endpoints:
+        url = urllib.parse.urlsplit(endpoint)
+        result = {'endpoint': endpoint}
+        start = time.perf_counter()
+
+        def read_chunks():
+            # The socket timeout only limits every read, so the whole body is limited here
+            for chunk in iter(lambda: response.read(65536), b''):
+                if time.perf_counter() - start > timeout:
+                    raise socket.timeout("body not received after {}s".format(timeout))
+                yield chunk
 
         try:
-            # Make an HTTP GET request to the endpoint
-            response_code = urllib.request.urlopen(metrics_endpoint_with_fqdn).getcode()
-
-            if response_code == 200:
-                ok_message("The metrics endpoint {} is running.".format(metrics_endpoint_with_fqdn))
-            else:
-                error_message("The metrics endpoint {} response wasn't 200 OK. HTTP status code: {}."
-                              .format(metrics_endpoint_with_fqdn, response_code))
-
-        except urllib.error.URLError as e:
-            # If the endpoint is not running, an exception is raised
-            error_message("The metrics endpoint {} is not running. Reason: {}.".format(metrics_endpoint_with_fqdn, e.reason))
+            connection.request('GET', (url.path or '/') + ('?' + url.query if url.query else ''), headers={'Accept': 'text/plain'})
+            response = connection.getresponse()
+            result['http_status'] = response.status
+            result['first_byte_seconds'] = time.perf_counter() - start
+            result.update(scan_exposition(read_chunks(), top))
+            result['seconds'] = time.perf_counter() - start
+        except (OSError, http.client.HTTPException) as e:
+            # The connection is reopened by the next request
+            connection.close()
+            result['error'] = str(e) or e.__class__.__name__
+            result['seconds'] = time.perf_counter() - start
+        results.append(result)
+
+    connection.close()
+    return results
+
+
+def check_config_metrics(fqdn: str, metrics_config: Dict):
+    """
+    Checks that the metrics endpoints are running, and that they answer fast enough with a valid and not too big exposition.
+    The endpoints of different hosts are scraped concurrently.
+    :param fqdn: Fully Qualified Domain Name, obtained from the configuration file.
+    :param metrics_config: Configuration of the metrics endpoints, obtained from the configuration file: the endpoints that must be running
+    ('metrics'), and optionally the request timeout ('metrics_timeout', 10s), the maximum scrape time ('metrics_max_seconds', 10s),
+    the maximum number of series ('metrics_max_series', 100000) and the number of highest-cardinality metrics to show ('metrics_top', 5).
+    """
+    timeout = metrics_config.get('metrics_timeout', 10.0)
+    max_seconds = metrics_config.get('metrics_max_seconds', 10.0)
+    max_series = metrics_config.get('metrics_max_series', 100000)
+    top = metrics_config.get('metrics_top', 5)
+
+    endpoints = [metrics_endpoint.replace('<fqdn>', fqdn) for metrics_endpoint in metrics_config['metrics']]
+    endpoints = [endpoint if '://' in endpoint else "http://" + endpoint for endpoint in endpoints]
+
+    # Group the endpoints by host, so every host is scraped with a single connection
+    endpoints_by_host = OrderedDict()
+    for endpoint in endpoints:
+        url = urllib.parse.urlsplit(endpoint)
+        endpoints_by_host.setdefault((url.scheme, url.netloc), []).append(endpoint)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=min(len(endpoints_by_host), 16) or 1) as executor:
+        for host_results in executor.map(lambda host_endpoints: scrape_metrics_endpoints(host_endpoints, timeout, top), endpoints_by_host.values()):
+            results.update((result['endpoint'], result) for result in host_results)
+
+    for endpoint in endpoints:
+        result = results[endpoint]
+        if 'error' in result:
+            error_message("The metrics endpoint {} is not running. Reason: {}.".format(endpoint, result['error']))
+            continue
+
+        info_message("Metrics endpoint {}: {:.3f}s (first byte {:.3f}s), {} bytes, {} series, {} metrics, {} parse errors. Top metrics: {}."
+                     .format(endpoint, result['seconds'], result['first_byte_seconds'], result['bytes'], result['series'], result['families'],
+                             result['parse_errors'], ", ".join("{}={}".format(name, series) for name, series in result['top_families'])))
+
+        if result['http_status'] != 200:
+            error_message("The metrics endpoint {} response wasn't 200 OK. HTTP status code: {}.".format(endpoint, result['http_status']))
+        elif result['parse_errors']:
+            error_message("The metrics endpoint {} returned {} lines that are not valid Prometheus exposition format. First one: {}"
+                          .format(endpoint, result['parse_errors'], result['first_parse_error']))
+        elif result['seconds'] > max_seconds:
+            error_message("The metrics endpoint {} is too slow: {:.3f}s (maximum {}s).".format(endpoint, result['seconds'], max_seconds))
+        elif result['series'] > max_series:
+            error_message("The metrics endpoint {} exposes too many series: {} (maximum {}).".format(endpoint, result['series'], max_series))
+        else:
+            ok_message("The metrics endpoint {} is running.".format(endpoint))
 
 
 # ---------------- END Unit checks ---------------- #
 
-def main(args, loglevel):
-    if args.logging:
-        logging.basicConfig(filename=logfile, format='%(asctime)s %(name)-12s %(levelname)-8s %(message)s', level=loglevel)
-    logging.info('Started check_hardware')
-    log.debug("------------------ Reading config ------------------")
-
+def build_config(args):
+    """
+    Builds the configuration of the check from the command line arguments.
+    """
     # Parse the configfile
     configfile_json = json.load(open(os.path.realpath(args.configfile)))
     # Obtain the JSON object with the utHardware configuration
@@ -354,18 +924,68 @@ def main(args, loglevel):
         'uthardwareconfig': uthardwareconfig,
         'type': args.type,
         'ec2_dummy': args.ec2_dummy,
+        'ec2_backend': args.ec2_backend,
+        'ec2_cache': args.ec2_cache,
+        'ec2_cache_ttl': args.ec2_cache_ttl,
+        'checktimeout': args.checktimeout,
+        'deadline': args.deadline,
+        'ingress_active': args.ingress_active,
+        'ingress_hosts': args.ingress_hosts,
+        'disk_probe': args.disk_probe,
+        'compute_probe': args.compute_probe,
+        'network_probe': args.network_probe,
+        'network_server': args.network_server,
+        'sampler': args.sampler,
+        'sample_duration': args.sample_duration,
+        'sample_dump': args.sample_dump,
     }
     config['root_dir'] = os.path.dirname(os.path.abspath(__file__))
+    return config
+
+
+def serve_network_probe(config: Dict):
+    """
+    Runs the network probe server, that the network probes of the peers connect to, until it's interrupted.
+    The port, the maximum seconds of every connection ('max_seconds', default 30) and the maximum concurrent connections
+    ('max_connections', default 32) are the ones of the network probe configuration of the machine type.
+    """
+    machine_uthardware_config = next(filter(lambda machine_conf: machine_conf['type'] == config['type'], config['uthardwareconfig']))
+    probe_config = machine_uthardware_config.get('hardware', {}).get('network_probe', {})
+    port = probe_config.get('port', 5201)
+    server = start_network_server('0.0.0.0', port, probe_config.get('max_seconds', PROBE_MAX_SECONDS),
+                                  probe_config.get('max_connections', PROBE_MAX_CONNECTIONS))
+    info_message("Network probe server listening on port {}. Press Ctrl+C to stop it.".format(port))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main(args, loglevel):
+    if args.logging:
+        logging.basicConfig(filename=logfile, format='%(asctime)s %(name)-12s %(levelname)-8s %(message)s', level=loglevel)
+    set_output_format(args.output)
+    logging.info('Started check_hardware')
+    log.debug("------------------ Reading config ------------------")
+    config = build_config(args)
+
+    if config['network_server']:
+        serve_network_probe(config)
+        return
 
-    hw_info = check_hardware(config)
+    hw_info = cached_check('hardware', config, args.cache_ttl, lambda: sample_resources(config) if config['sampler'] else check_hardware(config))
 
     print("Done.")
     logging.info('Finished check_hardware')
     exit_to_icinga(hw_info)
 
 
-def parse_args():
-    """Parse command line arguments."""
+def parse_args(argv=None):
+    """Parse command line arguments (sys.argv when argv is None)."""
     parser = argparse.ArgumentParser(description=__doc__, formatter_class=RawTextHelpFormatter)
     parser.add_argument('-V', '--version', action='version', version='%(prog)s ' + version)
 
@@ -375,11 +995,40 @@ def parse_args():
                                                   'If present, the ec2-metadata stdout will be simulated, using the file passed to this option.',
                         type=str, default=None, required=False)
 
+    parser.add_argument('--ec2-backend', help='How to obtain the EC2 metadata: running the ec2-metadata command, or querying the Instance Metadata '
+                                              'Service (IMDSv2) directly (default=command)', choices=['command', 'imds'], default='command')
+    parser.add_argument('--ec2-cache', help='File where the EC2 metadata is cached between runs (default=~/.cache/utester/ec2-metadata.json)',
+                        type=str, default=None)
+    parser.add_argument('--ec2-cache-ttl', help='Seconds the cached EC2 metadata is valid. 0 disables the cache (default=300)', type=float,
+                        default=300.0)
+    parser.add_argument('-ct', '--checktimeout', help='Maximum seconds of every check (default=20)', type=float, default=20.0)
+    parser.add_argument('-dl', '--deadline', help='Maximum seconds of all the checks, that run concurrently (default=50)', type=float, default=50.0)
+
+    parser.add_argument('-ia', '--ingress-active', help='Also connect to the ingress ports, measuring the connect (and TLS handshake) latency',
+                        action='store_const', const=True, default=False)
+    parser.add_argument('--ingress-hosts', help='Hosts whose ingress ports are connected to, with --ingress-active (default=<fqdn>, the machine)',
+                        type=str, nargs='+', default=['<fqdn>'])
+    parser.add_argument('-dp', '--disk-probe', help='Also measure the throughput and latency of the disk of every required mountpoint',
+                        action='store_const', const=True, default=False)
+    parser.add_argument('-cp', '--compute-probe', help='Also measure the CPU and memory performance, against the baseline of the instance type',
+                        action='store_const', const=True, default=False)
+    parser.add_argument('-np', '--network-probe', help='Also measure the throughput, round trip time and jitter to the peers of the machine type',
+                        action='store_const', const=True, default=False)
+    parser.add_argument('-ns', '--network-server', help='Run the server the network probes of the peers connect to, instead of the checks',
+                        action='store_const', const=True, default=False)
+    parser.add_argument('-sm', '--sampler', help='Sample the resources of the machine for a while, alerting on the sustained thresholds of '
+                                                 'hardware.sampler, instead of the checks', action='store_const', const=True, default=False)
+    parser.add_argument('--sample-duration', help='Seconds to sample, with --sampler (default=hardware.sampler.duration)', type=float, default=None)
+    parser.add_argument('--sample-dump', help='Directory where the samples are dumped when an alert fires, with --sampler '
+                                              '(default=hardware.sampler.dump_dir)', type=str, default=None)
+
+    add_cache_argument(parser)
+    add_output_argument(parser)
     parser.add_argument('-l', '--logging', help='create log output in current directory', action='store_const', const=True, default=False)
     verbosity = parser.add_mutually_exclusive_group()
     verbosity.add_argument('-v', '--verbose', help='increase output verbosity', action='store_const', const=logging.DEBUG, default=logging.INFO)
     verbosity.add_argument('-q', '--quiet', help='hide any debug exit', dest='verbose', action='store_const', const=logging.WARNING)
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
 
 if __name__ == '__main__':
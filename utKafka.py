@@ -30,6 +30,7 @@ from confluent_kafka import Producer
 from confluent_kafka.admin import ConfigResource
 
 from helpers.kafka import *
+from helpers.resultcache import *
 from helpers.utils import *
 
 log = logging.getLogger(os.path.splitext(__file__)[0])
@@ -98,7 +99,7 @@ def describe_configs(a, config, filter):
                 print_config(config, 1)
 
         except KafkaException as e:
-            print("Failed to describe {}: {}".format(res, e))
+            error_message("Failed to describe {}: {}".format(res, e))
         except Exception:
             raise
 
@@ -117,9 +118,9 @@ def delete_topic(a, topic):
     for topic, f in fs.items():
         try:
             f.result()  # The result itself is None
-            print("Topic {} deleted".format(topic))
+            ok_message("Topic {} deleted".format(topic))
         except Exception as e:
-            print("Failed to delete topic {}: {}".format(topic, e))
+            error_message("Failed to delete topic {}: {}".format(topic, e))
 
 
 def publish_lines(producer, topic):
@@ -137,13 +138,10 @@ def publish_lines(producer, topic):
     print("go out")
 
 
-def main(args, loglevel):
-    if args.logging:
-        logging.basicConfig(filename=logfile, format='%(asctime)s %(name)-12s %(levelname)-8s %(message)s', level=loglevel)
-    logging.info('Started send_to_kafka')
-    log.debug("------------------ Reading config ------------------")
-
-
+def build_config(args):
+    """
+    Builds the configuration of the check from the command line arguments.
+    """
     config = {'broker': args.broker, 'topic': args.topic,
               'producelines': args.producelines,
               'listtopics': args.listtopics,
@@ -152,16 +150,26 @@ def main(args, loglevel):
               'configfilter': args.configfilter
               }
     config['root_dir'] = os.path.dirname(os.path.abspath(__file__))
+    return config
+
+
+def main(args, loglevel):
+    if args.logging:
+        logging.basicConfig(filename=logfile, format='%(asctime)s %(name)-12s %(levelname)-8s %(message)s', level=loglevel)
+    set_output_format(args.output)
+    logging.info('Started send_to_kafka')
+    log.debug("------------------ Reading config ------------------")
+    config = build_config(args)
 
-    nodes_info = send_to_kafka(config)
+    nodes_info = cached_check('kafka', config, args.cache_ttl, lambda: send_to_kafka(config))
 
     print("Done.")
     logging.info('Finished send_to_kafka')
     exit_to_icinga(nodes_info)
 
 
-def parse_args():
-    """Parse command line arguments."""
+def parse_args(argv=None):
+    """Parse command line arguments (sys.argv when argv is None)."""
     parser = argparse.ArgumentParser(description=__doc__, formatter_class=RawTextHelpFormatter)
     parser.add_argument('-V', '--version', action='version', version='%(prog)s '+version)
 
@@ -175,11 +183,13 @@ def parse_args():
     # parser.add_argument('filter', metavar='N', type=str, nargs='+', help='an integer for the accumulator')
     parser.add_argument('-cf', '--configfilter', type=str, help='A value to filter Resources. Required if ShowConfig is present', required='-sc' in sys.argv)
 
+    add_cache_argument(parser)
+    add_output_argument(parser)
     parser.add_argument('-l', '--logging', help='create log output in current directory', action='store_const', const=True, default=False)
     verbosity = parser.add_mutually_exclusive_group()
     verbosity.add_argument('-v', '--verbose', help='increase output verbosity', action='store_const', const=logging.DEBUG, default=logging.INFO)
     verbosity.add_argument('-q', '--quiet', help='hide any debug exit', dest='verbose', action='store_const', const=logging.WARNING)
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
 
 if __name__ == '__main__':
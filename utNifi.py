@@ -5,8 +5,12 @@
 Unit test Nifi start.
  - Test creates nifi run directory. This will autocreate a directory named '/var/run/nifi'
  - Test gives permissions to the correponding folder '/var/run/nifi'
- - Test restart nifi service
+ - Test restart nifi service, and waits until the service is active and the NiFi REST API is ready (or the deadline passes)
  - Test run Wiremock .jar - PENDING TO SOLVE
+ - Monitor the flow: queued flowfiles and bytes, backpressure, processors throughput, JVM heap and GC
+
+The readiness of the API is polled with exponential backoff (--pollinterval, doubling up to --maxpollinterval) on --readypath,
+and the time to active and to API ready are reported. The exit code is the Icinga one (CRITICAL if NiFi isn't ready before --deadline).
 
 Example:
 
@@ -16,16 +20,38 @@ Example:
     To test start nifi service, on nifi node try:
         python utNifi.py -op startPid
 
+    To test start a secured nifi service, giving it 5 minutes to be ready, on nifi node try:
+        python utNifi.py -op startPid --url https://localhost:8443 --ca /opt/nifi/conf/ca.pem --deadline 300
+
+    To wait until the nifi API is ready, without restarting the service, try:
+        python utNifi.py -op waitReady --url http://nifi1:8080
+
+    To monitor the queues, backpressure, processors throughput and JVM of nifi, try:
+        python utNifi.py -op monitor --url http://nifi1:8080
+
     To test stop nifi service, on nifi node try:
         python utNifi.py -op stopPid
 
 """
 
 import argparse
+import http.client
 import logging
+import os
 import subprocess
 import time
 from argparse import RawTextHelpFormatter
+from typing import Dict
+
+from helpers.nifi import *
+from helpers.resultcache import *
+from helpers.system import human_size
+from helpers.utils import *
+
+log = logging.getLogger(os.path.splitext(__file__)[0])
+logfile = 'operations.log'
+version = "1.0"
+
 
 def check_nifi_status():
 
@@ -34,39 +60,222 @@ def check_nifi_status():
     out, err = p.communicate()
     print(out)
 
-def start_nifi():
+
+def wait_for_nifi(config: Dict, deadline: float, wait_service: bool) -> Dict:
+    """
+    Waits until the nifi service is active (if wait_service) and then until the NiFi REST API is ready, or the deadline passes.
+    :param deadline: time.monotonic() to give up at.
+    :return: {"logtrace", "status"}. The status is CRITICAL if NiFi isn't ready before the deadline.
+    """
+    start = time.monotonic()
+    timings = []
+    status = 'OK'
+    backoff = {'initial_delay': config['pollinterval'], 'max_delay': config['maxpollinterval']}
+
+    def service_active():
+        state = service_active_state(config['service'])
+        return state == 'active', state
+
+    if wait_service:
+        active = wait_until(service_active, deadline, **backoff)
+        timings.append("active={:.1f}s".format(active['seconds']))
+        if not active['met']:
+            error_message("Nifi service isn't active after {:.1f}s: {}.".format(active['seconds'], active['detail']))
+            return {"logtrace": "Send CRITICAL | " + " ".join(timings), "status": 'CRITICAL'}
+        ok_message("Nifi service is active after {:.1f}s ({} checks).".format(active['seconds'], active['attempts']))
+
+    api = NifiApi(config['url'], config['timeout'], config['token'], config['ca'], config['insecure'])
+    try:
+        ready = wait_until(lambda: nifi_api_ready(api, config['readypath']), deadline, **backoff)
+    finally:
+        api.close()
+    # Time to API ready is counted since the service was started, like the time to active
+    timings.append("api_ready={:.1f}s".format(time.monotonic() - start))
+    if ready['met']:
+        ok_message("Nifi API {} is ready after {:.1f}s ({} checks), {:.1f}s since started.".format(
+            config['readypath'], ready['seconds'], ready['attempts'], time.monotonic() - start))
+    else:
+        error_message("Nifi API {} isn't ready after {:.1f}s: {}.".format(config['readypath'], ready['seconds'], ready['detail']))
+        status = 'CRITICAL'
+
+    return {"logtrace": "Send " + status + " | " + " ".join(timings), "status": status}
+
+
+def start_nifi(config: Dict) -> Dict:
+    """
+    Restarts the nifi service, and waits until it's active and its REST API is ready.
+    :return: {"logtrace", "status"}, with the time to active and to API ready (since the start command) in the logtrace.
+    """
+    deadline = time.monotonic() + config['deadline']
 
     # Creates executable folder
     p=subprocess.Popen(['mkdir','-p','/var/run/nifi'], stdout=subprocess.PIPE)
     p.wait()
     p=subprocess.Popen(['chmod','-R', '777','/var/run/nifi'], stdout=subprocess.PIPE)
+    p.wait()
 
     # Restart nifi service
-    p1 = subprocess.Popen(['systemctl','stop','nifi'], stdout=subprocess.PIPE)
-    p1.wait()
-    p1 = subprocess.Popen(['systemctl','start','nifi'], stdout=subprocess.PIPE)
-    print('Nifi service started successfully')
+    stop_start = time.monotonic()
+    p1 = subprocess.run(['systemctl','stop',config['service']], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    info_message("Nifi service stopped in {:.1f}s.".format(time.monotonic() - stop_start))
+    p1 = subprocess.run(['systemctl','start',config['service']], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if p1.returncode != 0:
+        error_message("Nifi service didn't start: {}".format(p1.stderr.decode('utf-8').strip()))
+        return {"logtrace": "Send CRITICAL | systemctl start returned {}".format(p1.returncode), "status": 'CRITICAL'}
+
+    return wait_for_nifi(config, deadline, wait_service=True)
+
+def check_nifi_flow(config: Dict) -> Dict:
+    """
+    Monitors the flow of nifi through its REST API: queued flowfiles and bytes of every connection (the closest ones to backpressure
+    first), the processors with the highest throughput over the last 5 minutes, and the JVM heap and garbage collection.
+    :return: {"logtrace", "status"}. CRITICAL if a connection has backpressure engaged or nifi can't be reached, WARNING if a connection
+    is above --warnpressure percent of its backpressure thresholds or the heap is above --maxheap percent.
+    """
+    log.debug("------------------ Begin check_nifi_flow ------------------")
+    status = 'OK'
+    api = NifiApi(config['url'], config['timeout'], config['token'], config['ca'], config['insecure'])
+    try:
+        flow_status, flow = api.get('flow/process-groups/{}/status?recursive=true'.format(config['processgroup']))
+        diagnostics_status, diagnostics = api.get('system-diagnostics')
+    except (OSError, http.client.HTTPException) as e:
+        error_message("Nifi API can't be reached: {}.".format(e))
+        return {"logtrace": "Send CRITICAL | nifi unreachable", "status": 'CRITICAL'}
+    finally:
+        api.close()
+    if flow_status != 200 or diagnostics_status != 200 or flow is None or diagnostics is None:
+        error_message("Nifi API answered HTTP {} to the flow status and HTTP {} to the system diagnostics.".format(flow_status, diagnostics_status))
+        return {"logtrace": "Send CRITICAL | nifi API HTTP {} {}".format(flow_status, diagnostics_status), "status": 'CRITICAL'}
+
+    root = flow['processGroupStatus']['aggregateSnapshot']
+    snapshots = list(iter_status_snapshots(root))
+    connections = sorted((snapshot for kind, snapshot in snapshots if kind == 'connection'),
+                         key=lambda snapshot: (connection_pressure(snapshot), snapshot.get('bytesQueued', 0)), reverse=True)
+    processors = sorted((snapshot for kind, snapshot in snapshots if kind == 'processor'),
+                        key=lambda snapshot: (snapshot.get('flowFilesIn', 0) + snapshot.get('flowFilesOut', 0)), reverse=True)
+
+    # Connections, the bottlenecks first
+    info_message("Queued: {} flowfiles, {} in {} connections.".format(root.get('flowFilesQueued', 0), human_size(root.get('bytesQueued', 0)),
+                                                                     len(connections)))
+    text_message("{:<50} {:>10} {:>8} {:>7} {:>7}".format("Connection (group: source -> destination)", "Flowfiles", "Bytes", "%Count", "%Bytes"))
+    for snapshot in connections[:config['top']]:
+        text_message("{:<50} {:>10} {:>8} {:>6}% {:>6}%".format(
+            "{}: {} -> {}".format(snapshot['groupName'], snapshot.get('sourceName', '?'), snapshot.get('destinationName', '?'))[:50],
+            snapshot.get('flowFilesQueued', 0), human_size(snapshot.get('bytesQueued', 0)), snapshot.get('percentUseCount', 0),
+            snapshot.get('percentUseBytes', 0)))
+    backpressured = [snapshot for snapshot in connections if connection_pressure(snapshot) >= 100]
+    near_backpressure = [snapshot for snapshot in connections if config['warnpressure'] <= connection_pressure(snapshot) < 100]
+    for snapshot in backpressured:
+        error_message("Backpressure is engaged in {}: {} -> {} ({} flowfiles, {}).".format(
+            snapshot['groupName'], snapshot.get('sourceName'), snapshot.get('destinationName'), snapshot.get('flowFilesQueued', 0),
+            human_size(snapshot.get('bytesQueued', 0))))
+    for snapshot in near_backpressure:
+        warning_message("{}: {} -> {} is at {:.0f}% of its backpressure threshold.".format(
+            snapshot['groupName'], snapshot.get('sourceName'), snapshot.get('destinationName'), connection_pressure(snapshot)))
+    if not backpressured and not near_backpressure:
+        ok_message("No connection is near its backpressure threshold.")
+
+    # Processors, the busiest first (the statistics of the snapshots are over the last 5 minutes)
+    info_message("Processors with the highest throughput over the last 5 minutes:")
+    text_message("{:<40} {:>9} {:>9} {:>9} {:>9} {:>8} {:>9}".format("Processor", "In/s", "Out/s", "Read/s", "Written/s", "Tasks", "ms/task"))
+    for snapshot in processors[:config['top']]:
+        tasks = snapshot.get('taskCount', 0)
+        text_message("{:<40} {:>9.2f} {:>9.2f} {:>9} {:>9} {:>8} {:>9.2f}".format(
+            "{}: {}".format(snapshot['groupName'], snapshot.get('name', '?'))[:40],
+            snapshot.get('flowFilesIn', 0) / STATUS_WINDOW_SECONDS, snapshot.get('flowFilesOut', 0) / STATUS_WINDOW_SECONDS,
+            human_size(snapshot.get('bytesRead', 0) / STATUS_WINDOW_SECONDS), human_size(snapshot.get('bytesWritten', 0) / STATUS_WINDOW_SECONDS),
+            tasks, snapshot.get('tasksDurationNanos', 0) / 1e6 / tasks if tasks else 0.0))
+    stopped = [snapshot for snapshot in processors if snapshot.get('runStatus') in ('Stopped', 'Invalid', 'Validating')]
+    if stopped:
+        info_message("{} processors aren't running: {}.".format(len(stopped), ", ".join(
+            "{} ({})".format(snapshot.get('name'), snapshot.get('runStatus')) for snapshot in stopped[:config['top']])))
+
+    # JVM
+    system = diagnostics['systemDiagnostics']['aggregateSnapshot']
+    heap_percent = 100.0 * system.get('usedHeapBytes', 0) / system['maxHeapBytes'] if system.get('maxHeapBytes') else 0.0
+    info_message("JVM heap {} of {} ({:.1f}%), {} threads, load average {}.".format(
+        human_size(system.get('usedHeapBytes', 0)), human_size(system.get('maxHeapBytes', 0)), heap_percent, system.get('totalThreads', '?'),
+        system.get('processorLoadAverage', '?')))
+    for collector in system.get('garbageCollection', []):
+        text_message("    GC {}: {} collections, {:.1f}s".format(collector.get('name'), collector.get('collectionCount', 0),
+                                                            collector.get('collectionMillis', 0) / 1000))
+    if heap_percent > config['maxheap']:
+        warning_message("JVM heap usage is {:.1f}% (maximum {}%).".format(heap_percent, config['maxheap']))
+
+    add_values(flowfiles_queued=root.get('flowFilesQueued', 0), bytes_queued=root.get('bytesQueued', 0), backpressured=len(backpressured),
+               near_backpressure=len(near_backpressure), heap_percent=heap_percent)
+    if backpressured:
+        status = 'CRITICAL'
+    elif near_backpressure or heap_percent > config['maxheap']:
+        status = 'WARNING'
+    log_trace = "Send {} | queued={} backpressured={} heap={:.1f}%".format(status, root.get('flowFilesQueued', 0), len(backpressured), heap_percent)
+    log.debug("------------------ End check_nifi_flow ------------------")
+    return {"logtrace": log_trace, "status": status}
 
 #def start_wiremock():
 #
 #    # Executes Wiremock microservice
 #    p = subprocess.Popen(['nohup','java','-jar','/opt/nifi/wiremock/wiremock-standalone-2.26.3.jar' ,'--port 9091&'], stdout=subprocess.PIPE)
 
+
 def stop_nifi():
 
     # Stop nifi service
     p = subprocess.Popen(['systemctl','stop','nifi'], stdout=subprocess.PIPE)
     print('Nifi service stopped successfully')
 
+
+def run_operation(config: Dict) -> Dict:
+    """
+    Runs the operations that are checks (startPid, waitReady and monitor), for the utester runner and exporter.
+    :return: {"logtrace", "status"}. The operations that aren't checks are UNKNOWN.
+    """
+    if config['operation'] == 'startPid':
+        return start_nifi(config)
+    elif config['operation'] == 'waitReady':
+        return wait_for_nifi(config, time.monotonic() + config['deadline'], wait_service=False)
+    elif config['operation'] == 'monitor':
+        return check_nifi_flow(config)
+    return {"logtrace": "Operation {} isn't a check".format(config['operation']), "status": 'UNKNOWN'}
+
+
+def build_config(args):
+    """
+    Builds the configuration of the operation from the command line arguments.
+    """
+    return {
+        'operation': args.operation,
+        'url': args.url,
+        'service': args.service,
+        'deadline': args.deadline,
+        'pollinterval': args.pollinterval,
+        'maxpollinterval': args.maxpollinterval,
+        'readypath': args.readypath,
+        'timeout': args.timeout,
+        'token': args.token,
+        'ca': args.ca,
+        'insecure': args.insecure,
+        'processgroup': args.processgroup,
+        'top': args.top,
+        'warnpressure': args.warnpressure,
+        'maxheap': args.maxheap,
+    }
+
+
 def main(args, loglevel):
+    if args.logging:
+        logging.basicConfig(filename=logfile, format='%(asctime)s %(name)-12s %(levelname)-8s %(message)s', level=loglevel)
+    set_output_format(args.output)
+    config = build_config(args)
 
     if args.operation == 'statusPid':
         check_nifi_status()
 
-    elif args.operation == 'startPid':
-        start_nifi()
+    elif args.operation in ('startPid', 'waitReady', 'monitor'):
+        nifi_info = cached_check('nifi', config, args.cache_ttl, lambda: run_operation(config))
         #time.sleep(10)
         #start_wiremock()
+        exit_to_icinga(nifi_info)
 
     elif args.operation == 'stopPid':
         stop_nifi()
@@ -74,16 +283,42 @@ def main(args, loglevel):
     else:
         print('Invalid option')
 
-def parse_args():
-    """Parse command line arguments."""
+
+def parse_args(argv=None):
+    """Parse command line arguments (sys.argv when argv is None)."""
     parser = argparse.ArgumentParser(description=__doc__, formatter_class=RawTextHelpFormatter)
+    parser.add_argument('-V', '--version', action='version', version='%(prog)s ' + version)
 
-    parser.add_argument('-op', '--operation', help='Operation to perform on the nifi node', type=str, required=True)
+    parser.add_argument('-op', '--operation', help='Operation to perform on the nifi node (statusPid, startPid, waitReady, monitor, stopPid)', type=str,
+                        required=True)
+    parser.add_argument('-u', '--url', help='URL of nifi (default=http://localhost:8080)', type=str, default='http://localhost:8080')
+    parser.add_argument('-s', '--service', help='Systemd service of nifi (default=nifi)', type=str, default='nifi')
+    parser.add_argument('-dl', '--deadline', help='Seconds nifi has to be active and ready, since it is started (default=600)', type=float,
+                        default=600.0)
+    parser.add_argument('--pollinterval', help='Initial seconds between readiness checks, doubled after every check (default=1)', type=float,
+                        default=1.0)
+    parser.add_argument('--maxpollinterval', help='Maximum seconds between readiness checks (default=15)', type=float, default=15.0)
+    parser.add_argument('--readypath', help='Path of the nifi API that must answer for nifi to be ready (default=flow/status)', type=str,
+                        default='flow/status')
+    parser.add_argument('-t', '--timeout', help='Timeout of every request to the nifi API, in seconds (default=10)', type=float, default=10.0)
+    parser.add_argument('--token', help='Bearer token of a secured nifi', type=str, default=None)
+    parser.add_argument('--ca', help='CA file the certificate of a secured nifi is verified against', type=str, default=None)
+    parser.add_argument('--insecure', help="Don't verify the certificate of a secured nifi", action='store_const', const=True, default=False)
+    parser.add_argument('-pg', '--processgroup', help='Process group monitored, with its descendants (default=root)', type=str, default='root')
+    parser.add_argument('--top', help='Connections and processors shown by the monitor (default=10)', type=int, default=10)
+    parser.add_argument('--warnpressure', help='Percent of the backpressure thresholds of a connection that is a WARNING (default=80)',
+                        type=float, default=80.0)
+    parser.add_argument('--maxheap', help='Percent of JVM heap usage that is a WARNING (default=85)', type=float, default=85.0)
+
+    add_cache_argument(parser)
+    add_output_argument(parser)
+    parser.add_argument('-l', '--logging', help='create log output in current directory', action='store_const', const=True, default=False)
     verbosity = parser.add_mutually_exclusive_group()
     verbosity.add_argument('-v', '--verbose', help='increase output verbosity', action='store_const', const=logging.DEBUG, default=logging.INFO)
     verbosity.add_argument('-q', '--quiet', help='hide any debug exit', dest='verbose', action='store_const', const=logging.WARNING)
-    return parser.parse_args()
+    return parser.parse_args(argv)
+
 
 if __name__ == '__main__':
     args = parse_args()
-    main(args, args.verbose)
\ No newline at end of file
+    main(args, args.verbose)
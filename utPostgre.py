@@ -8,6 +8,10 @@ Functionalities:
  - Connect without ssl.
  - Get Version. Test connection with PostgreSQL and get version.
  - Count number of rows in a table.
+ - Replication lag. Query a primary and its replicas concurrently and report the byte and time lag of every replica.
+ - Explain probe. Run a set of named queries with EXPLAIN ANALYZE and flag plan changes and time regressions against a stored baseline.
+ - Stress test. Run N concurrent writers against a scratch table (hot-row updates, SKIP LOCKED queue consumption or upserts)
+   and report throughput, retries, deadlocks and the dominant wait events.
 
 Example:
     Connect using SSL
@@ -18,15 +22,32 @@ Example:
         python utPostgre.py -ho 192.168.56.51 -p 6379 -u user -pw password -ssl -db databaseName -gv
     Count number of rows in a table
         python utPostgre.py -ho 192.168.56.51 -p 6379 -u user -pw password -ssl -db databaseName -c tableName
+    Replication lag of a primary and its replicas, with a heartbeat row written on the primary
+        python utPostgre.py -ho 192.168.56.51 192.168.56.52 192.168.56.53 -p 5432 -u user -pw password -db databaseName -rl -hb
+    Explain probe of the queries of a file (JSON object or SQL file with '-- name: <name>' lines)
+        python utPostgre.py -ho 192.168.56.51 -p 5432 -u user -pw password -db databaseName -ep queries.sql -eb explain_baseline.json
+    Stress test with 16 writers consuming a job queue with SELECT ... FOR UPDATE SKIP LOCKED during 30 seconds
+        python utPostgre.py -ho 192.168.56.51 -p 5432 -u user -pw password -db databaseName -st skiplocked -w 16 --duration 30
 
 """
 
 import argparse
+import json
 import logging
+import random
+import threading
+import time
+import uuid
 from argparse import RawTextHelpFormatter
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
 
 import psycopg2
 
+from helpers.postgre import *
+from helpers.resultcache import *
+from helpers.stats import *
 from helpers.utils import *
 
 log = logging.getLogger(os.path.splitext(__file__)[0])
@@ -40,6 +61,20 @@ def check_postgre(config):
     status = 'Ok'
 
     # ------------------------- Switch options ------------------------- #
+    # The replication lag check opens its own connection to every host
+    if config['replicationlag']:
+        status = check_replication_lag(config)
+        log_trace = "Send " + status + " | " + log_trace
+        log.debug("------------------ End check_postgre ------------------")
+        return {"logtrace": log_trace, "status": status}
+
+    # The stress test opens one connection per writer
+    if config['stress']:
+        status = stress_test(config)
+        log_trace = "Send " + status + " | " + log_trace
+        log.debug("------------------ End check_postgre ------------------")
+        return {"logtrace": log_trace, "status": status}
+
     # SSL connection or not
     if config['sslconnection']:
         postgre = connect_postgre_with_ssl(config)
@@ -52,6 +87,9 @@ def check_postgre(config):
 
     elif config['counttable']:
         count_table(postgre, config['counttable'])
+
+    elif config['explainfile']:
+        status = explain_probe(postgre, config)
     # ------------------------------------------------------------------ #
 
     # Close postgre connection
@@ -87,6 +125,166 @@ def connect_postgre_with_ssl(config):
     return conn
 
 
+def connect_postgre_host(config, host):
+    """
+    Connects to the given host using the rest of the connection settings of the configuration.
+    :return: The connection, or None if the host is unreachable.
+    """
+    host_config = dict(config, host=host)
+    if config['sslconnection']:
+        conn = connect_postgre_with_ssl(host_config)
+    else:
+        conn = connect_postgre_without_ssl(host_config)
+    return None if isinstance(conn, dict) else conn
+
+
+def lsn_to_int(lsn: str) -> int:
+    """
+    Converts a textual LSN (i.e. '16/B374D848') to its byte position in the WAL.
+    """
+    high, low = lsn.split('/')
+    return (int(high, 16) << 32) | int(low, 16)
+
+
+def read_replication_state(connection, barrier: threading.Barrier) -> Dict:
+    """
+    Reads the replication state of a host. All the hosts wait on the barrier, so the LSNs are read at the same instant.
+    On the primary, pg_stat_replication is also read.
+    """
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        barrier.wait()
+        cursor.execute("SELECT pg_is_in_recovery(),"
+                       " CASE WHEN pg_is_in_recovery() THEN pg_last_wal_replay_lsn() ELSE pg_current_wal_lsn() END,"
+                       " CASE WHEN pg_is_in_recovery() THEN pg_wal_lsn_diff(pg_last_wal_receive_lsn(), pg_last_wal_replay_lsn()) END,"
+                       " EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp());")
+        in_recovery, lsn, replay_pending_bytes, replay_age_seconds = cursor.fetchone()
+        state = {'in_recovery': in_recovery, 'lsn': lsn, 'replay_pending_bytes': replay_pending_bytes,
+                 'replay_age_seconds': replay_age_seconds, 'replication': []}
+
+        if not in_recovery:
+            cursor.execute("SELECT application_name, client_addr, state, sync_state,"
+                           " pg_wal_lsn_diff(pg_current_wal_lsn(), replay_lsn), EXTRACT(EPOCH FROM replay_lag)"
+                           " FROM pg_stat_replication;")
+            state['replication'] = cursor.fetchall()
+    return state
+
+
+def write_heartbeat(connection) -> str:
+    """
+    Writes a heartbeat row on the primary and returns its token.
+    """
+    token = uuid.uuid4().hex
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE TABLE IF NOT EXISTS utester_heartbeat (id int PRIMARY KEY, token text NOT NULL, ts timestamptz NOT NULL);")
+        cursor.execute("INSERT INTO utester_heartbeat (id, token, ts) VALUES (1, %s, now())"
+                       " ON CONFLICT (id) DO UPDATE SET token = EXCLUDED.token, ts = EXCLUDED.ts;", (token,))
+    return token
+
+
+def wait_for_heartbeat(connection, token: str, written_at: float, timeout: float) -> float:
+    """
+    Polls a replica until the heartbeat row with the given token is visible.
+    :return: Seconds since the heartbeat was written on the primary, or None if it didn't arrive before the timeout.
+    """
+    with connection.cursor() as cursor:
+        while time.perf_counter() - written_at < timeout:
+            try:
+                cursor.execute("SELECT token FROM utester_heartbeat WHERE id = 1;")
+                record = cursor.fetchone()
+                if record and record[0] == token:
+                    return time.perf_counter() - written_at
+            except psycopg2.Error:
+                # The table may not have been replicated yet
+                pass
+            time.sleep(0.01)
+    return None
+
+
+def check_replication_lag(config) -> str:
+    """
+    Queries a primary and its replicas concurrently and checks that the lag of every replica is inside the thresholds.
+    The byte lag is the distance between the current WAL position of the primary and the replay position of the replica,
+    both read at the same instant. Optionally, a heartbeat row is written on the primary and its arrival is timed on every replica.
+    :return: Status of the check.
+    """
+    hosts: List[str] = config['hosts']
+    status = 'OK'
+
+    with ThreadPoolExecutor(max_workers=len(hosts)) as executor:
+        connections = dict(zip(hosts, executor.map(lambda host: connect_postgre_host(config, host), hosts)))
+
+        for host in [host for host, conn in connections.items() if conn is None]:
+            error_message("The host {} is unreachable.".format(host))
+            status = 'CRITICAL'
+        connections = {host: conn for host, conn in connections.items() if conn is not None}
+        if not connections:
+            return 'CRITICAL'
+
+        try:
+            barrier = threading.Barrier(len(connections), timeout=30)
+            futures = {host: executor.submit(read_replication_state, conn, barrier) for host, conn in connections.items()}
+            states = {}
+            for host, future in futures.items():
+                try:
+                    states[host] = future.result()
+                except Exception as error:
+                    barrier.abort()
+                    error_message("Error while reading the replication state of {}: {}".format(host, error))
+                    status = 'CRITICAL'
+
+            primaries = [host for host, state in states.items() if not state['in_recovery']]
+            if len(primaries) != 1:
+                error_message("Expected exactly one primary, found {}: {}".format(len(primaries), ", ".join(primaries)))
+                return 'CRITICAL' if len(primaries) > 1 else 'UNKNOWN'
+            primary = primaries[0]
+            primary_lsn = lsn_to_int(states[primary]['lsn'])
+
+            info_message("Primary {} at LSN {}. Connected replicas:".format(primary, states[primary]['lsn']))
+            for application_name, client_addr, state, sync_state, lag_bytes, lag_seconds in states[primary]['replication']:
+                print("    {} ({}): state={}, sync_state={}, replay_lag_bytes={}, replay_lag_seconds={}"
+                      .format(application_name, client_addr, state, sync_state, lag_bytes, lag_seconds))
+
+            replicas = [host for host in states if host != primary]
+            heartbeat_lag = {}
+            if config['heartbeat'] and replicas:
+                token = write_heartbeat(connections[primary])
+                written_at = time.perf_counter()
+                heartbeat_futures = {host: executor.submit(wait_for_heartbeat, connections[host], token, written_at, config['heartbeattimeout'])
+                                     for host in replicas}
+                heartbeat_lag = {host: future.result() for host, future in heartbeat_futures.items()}
+
+            for host in replicas:
+                state = states[host]
+                lag_bytes = max(primary_lsn - lsn_to_int(state['lsn']), 0) if state['lsn'] else None
+                if config['heartbeat']:
+                    lag_seconds = heartbeat_lag[host]
+                elif state['replay_pending_bytes'] == 0:
+                    # Everything received is replayed: the age of the last replayed transaction only grows while the primary is idle
+                    lag_seconds = 0.0
+                else:
+                    lag_seconds = state['replay_age_seconds']
+                lag_seconds = float(lag_seconds) if lag_seconds is not None else None
+                message = "Replica {}: lag_bytes={}, replay_pending_bytes={}, lag_seconds={}{}.".format(
+                    host, lag_bytes, state['replay_pending_bytes'], "{:.3f}".format(lag_seconds) if lag_seconds is not None else None,
+                    " (heartbeat)" if config['heartbeat'] else "")
+
+                if lag_bytes is None or lag_seconds is None:
+                    error_message(message + " Lag could not be measured.")
+                    status = 'CRITICAL'
+                elif lag_bytes > config['maxlagbytes'] or lag_seconds > config['maxlagseconds']:
+                    error_message(message + " Outside thresholds (max_bytes={}, max_seconds={}).".format(config['maxlagbytes'], config['maxlagseconds']))
+                    status = 'CRITICAL'
+                else:
+                    ok_message(message)
+        finally:
+            for conn in connections.values():
+                conn.close()
+
+    return status
+
+
 def count_table(connection, table):
     """
     Count the number of rows of the specified table.
@@ -103,6 +301,217 @@ def count_table(connection, table):
         print("Error while connecting to PostgreSQL", error)
 
 
+def explain_query(connection, query: str) -> List[Dict]:
+    """
+    Runs the query with EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) and returns the plan.
+    The query is actually executed, so the transaction is always rolled back.
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query)
+            record = cursor.fetchone()
+            # psycopg2 already decodes the json column, but older servers return it as text
+            return json.loads(record[0]) if isinstance(record[0], str) else record[0]
+    finally:
+        connection.rollback()
+
+
+def explain_probe(connection, config) -> str:
+    """
+    Runs every named query of the explain file, and compares the plan and the execution time with the stored baseline.
+    A different plan fingerprint or an execution time above the regression factor is reported as a WARNING.
+    Queries without baseline (or every query, with --updatebaseline) are stored in the baseline.
+    :return: Status of the check.
+    """
+    status = 'OK'
+    queries = load_named_queries(config['explainfile'])
+    baseline = load_plan_baseline(config['explainbaseline'])
+
+    for name, query in queries.items():
+        try:
+            summary = summarize_plan(explain_query(connection, query))
+        except Exception as error:
+            error_message("Error while explaining query '{}': {}".format(name, error))
+            status = 'CRITICAL'
+            continue
+
+        print("{}: plan={} planning={:.3f}ms execution={:.3f}ms shared_hit={} shared_read={} max_rows_error={}x ({})".format(
+            name, summary['fingerprint'], summary['planning_ms'], summary['execution_ms'], summary['shared_hit_blocks'],
+            summary['shared_read_blocks'], summary['max_rows_error'], summary['max_rows_error_node']))
+
+        reference = baseline.get(name)
+        if reference is None or config['updatebaseline']:
+            baseline[name] = summary
+            info_message("Baseline of query '{}' stored.".format(name))
+            continue
+
+        regressed = False
+        if summary['fingerprint'] != reference['fingerprint']:
+            warning_message("Plan of query '{}' changed: {} -> {}.".format(name, reference['fingerprint'], summary['fingerprint']))
+            regressed = True
+        if summary['execution_ms'] > max(reference['execution_ms'] * config['regressionfactor'],
+                                         reference['execution_ms'] + config['regressionminms']):
+            warning_message("Execution time of query '{}' regressed: {:.3f}ms -> {:.3f}ms.".format(name, reference['execution_ms'],
+                                                                                                summary['execution_ms']))
+            regressed = True
+
+        if regressed:
+            status = 'WARNING' if status == 'OK' else status
+        else:
+            ok_message("Query '{}' keeps its baseline plan and time.".format(name))
+
+    save_plan_baseline(config['explainbaseline'], baseline)
+    return status
+
+
+# Statements of every stress pattern, on the scratch table {table} of the run. Each statement list is run as one transaction by the writers.
+STRESS_PATTERNS = {
+    'hotrow': {
+        'setup': ["CREATE TABLE {table} (id int PRIMARY KEY, counter bigint NOT NULL DEFAULT 0);",
+                  "INSERT INTO {table} (id) SELECT generate_series(1, %(rows)s);"],
+        # Two hot rows updated in random order, so the writers can also deadlock between them
+        'transaction': lambda table, rows: [("UPDATE {} SET counter = counter + 1 WHERE id = %s;".format(table), (row,))
+                                            for row in random.sample(range(1, rows + 1), min(rows, 2))],
+    },
+    'skiplocked': {
+        'setup': ["CREATE TABLE {table} (id bigserial PRIMARY KEY, payload text NOT NULL);",
+                  "INSERT INTO {table} (payload) SELECT md5(i::text) FROM generate_series(1, %(rows)s) AS i;"],
+        # Every writer enqueues a job and consumes the oldest job not locked by another writer
+        'transaction': lambda table, rows: [("INSERT INTO {} (payload) VALUES (md5(random()::text));".format(table), None),
+                                            ("DELETE FROM {0} WHERE id = (SELECT id FROM {0} ORDER BY id"
+                                             " FOR UPDATE SKIP LOCKED LIMIT 1);".format(table), None)],
+    },
+    'upsert': {
+        'setup': ["CREATE TABLE {table} (id int PRIMARY KEY, counter bigint NOT NULL DEFAULT 0);"],
+        'transaction': lambda table, rows: [("INSERT INTO {0} (id) VALUES (%s)"
+                                             " ON CONFLICT (id) DO UPDATE SET counter = {0}.counter + 1;".format(table),
+                                             (random.randint(1, rows),))],
+    },
+}
+
+
+def stress_writer(connection, pattern: Dict, table: str, rows: int, stop: threading.Event) -> Dict:
+    """
+    Runs transactions of the pattern until the stop event is set. Transactions aborted by a deadlock or a serialization
+    failure are retried.
+    :return: Counters and transaction latencies of the writer.
+    """
+    stats = {'transactions': 0, 'retries': 0, 'deadlocks': 0, 'errors': 0, 'latencies': []}
+    with connection.cursor() as cursor:
+        while not stop.is_set():
+            statements = pattern['transaction'](table, rows)
+            start = time.perf_counter()
+            try:
+                for statement, parameters in statements:
+                    cursor.execute(statement, parameters)
+                connection.commit()
+                stats['transactions'] += 1
+                stats['latencies'].append(time.perf_counter() - start)
+            except psycopg2.extensions.TransactionRollbackError as error:
+                connection.rollback()
+                stats['retries'] += 1
+                if error.pgcode == '40P01':
+                    stats['deadlocks'] += 1
+            except psycopg2.Error as error:
+                connection.rollback()
+                stats['errors'] += 1
+                log.debug("Stress writer error: {}".format(error))
+    return stats
+
+
+def sample_wait_events(connection, pids: List[int], stop: threading.Event, interval: float) -> Dict:
+    """
+    Samples pg_stat_activity and pg_locks for the writer backends until the stop event is set.
+    :return: Counter of wait events (backends not waiting are counted as 'CPU') and the maximum number of waiting locks.
+    """
+    wait_events = Counter()
+    max_waiting_locks = 0
+    with connection.cursor() as cursor:
+        while not stop.wait(interval):
+            cursor.execute("SELECT wait_event_type, wait_event FROM pg_stat_activity WHERE pid = ANY(%s);", (pids,))
+            for wait_event_type, wait_event in cursor.fetchall():
+                wait_events['CPU' if wait_event is None else wait_event_type + ':' + wait_event] += 1
+            cursor.execute("SELECT count(*) FROM pg_locks WHERE NOT granted AND pid = ANY(%s);", (pids,))
+            max_waiting_locks = max(max_waiting_locks, cursor.fetchone()[0])
+    return {'wait_events': wait_events, 'max_waiting_locks': max_waiting_locks}
+
+
+def stress_test(config) -> str:
+    """
+    Runs N concurrent writers against a scratch table of the run (utester_stress_<id>) following the chosen pattern, while
+    pg_stat_activity and pg_locks are sampled. Reports throughput, transaction latency, retry and deadlock counts, and the dominant
+    wait events. The scratch table is dropped at the end, even if the test fails, and the tables of other runs are never touched.
+    :return: Status of the check.
+    """
+    pattern = STRESS_PATTERNS[config['stress']]
+    rows = config['stressrows']
+    table = 'utester_stress_' + uuid.uuid4().hex[:12]
+
+    admin = connect_postgre_host(config, config['host'])
+    if admin is None:
+        error_message("The host {} is unreachable.".format(config['host']))
+        return 'CRITICAL'
+    admin.autocommit = True
+
+    writers = [connect_postgre_host(config, config['host']) for _ in range(config['writers'])]
+    try:
+        if None in writers:
+            error_message("Could not open {} writer connections to {}.".format(config['writers'], config['host']))
+            return 'CRITICAL'
+
+        with admin.cursor() as cursor:
+            for statement in pattern['setup']:
+                cursor.execute(statement.format(table=table), {'rows': rows})
+
+        stop = threading.Event()
+        pids = [writer.get_backend_pid() for writer in writers]
+        with ThreadPoolExecutor(max_workers=len(writers) + 1) as executor:
+            sampler = executor.submit(sample_wait_events, admin, pids, stop, config['sampleinterval'])
+            futures = [executor.submit(stress_writer, writer, pattern, table, rows, stop) for writer in writers]
+            start = time.perf_counter()
+            stop.wait(config['duration'])
+            stop.set()
+            results = [future.result() for future in futures]
+            elapsed = time.perf_counter() - start
+            sampled = sampler.result()
+    finally:
+        # The writers are closed first, so their open transactions don't hold locks on the table being dropped
+        for writer in writers:
+            if writer is not None:
+                writer.close()
+        try:
+            with admin.cursor() as cursor:
+                cursor.execute("DROP TABLE IF EXISTS {};".format(table))
+        except psycopg2.Error as error:
+            error_message("The scratch table {} could not be dropped: {}".format(table, error))
+        admin.close()
+
+    transactions = sum(result['transactions'] for result in results)
+    retries = sum(result['retries'] for result in results)
+    deadlocks = sum(result['deadlocks'] for result in results)
+    errors = sum(result['errors'] for result in results)
+    latencies = summarize([latency for result in results for latency in result['latencies']])
+    samples = max(sum(sampled['wait_events'].values()), 1)
+
+    info_message("Stress '{}' with {} writers during {:.1f}s:".format(config['stress'], len(writers), elapsed))
+    print("    throughput={:.1f} tx/s transactions={} retries={} deadlocks={} errors={} max_waiting_locks={}".format(
+        transactions / elapsed, transactions, retries, deadlocks, errors, sampled['max_waiting_locks']))
+    if latencies['count']:
+        print("    latency_ms: p50={:.2f} p90={:.2f} p99={:.2f} max={:.2f}".format(
+            latencies['p50'] * 1000, latencies['p90'] * 1000, latencies['p99'] * 1000, latencies['max'] * 1000))
+    print("    dominant wait events: " + ", ".join("{} {:.0%}".format(event, count / samples)
+                                                   for event, count in sampled['wait_events'].most_common(5)))
+
+    if errors:
+        error_message("{} transactions failed with non retryable errors.".format(errors))
+        return 'CRITICAL'
+    if config['minthroughput'] and transactions / elapsed < config['minthroughput']:
+        warning_message("Throughput {:.1f} tx/s is below the minimum {} tx/s.".format(transactions / elapsed, config['minthroughput']))
+        return 'WARNING'
+    ok_message("Stress test finished.")
+    return 'OK'
+
+
 def get_version(connection):
     """
     Returns the PostgreSQL version. Is like a PING, to check we have connection.
@@ -119,33 +528,58 @@ def get_version(connection):
         print("Error while connecting to PostgreSQL", error)
 
 
-def main(args, loglevel):
-    if args.logging:
-        logging.basicConfig(filename=logfile, format='%(asctime)s %(name)-12s %(levelname)-8s %(message)s', level=loglevel)
-    logging.info('Started check_postgre')
-    log.debug("------------------ Reading config ------------------")
-
+def build_config(args):
+    """
+    Builds the configuration of the check from the command line arguments.
+    """
     config = {
-        'host': args.host, 'port': args.port, 'user': args.user, 'password': args.password, 'dbname': args.dbname,
+        'host': args.host[0], 'hosts': args.host, 'port': args.port, 'user': args.user, 'password': args.password, 'dbname': args.dbname,
         'sslconnection': args.sslconnection,
         'getversion': args.getversion,
         'counttable': args.counttable,
+        'replicationlag': args.replicationlag,
+        'heartbeat': args.heartbeat,
+        'heartbeattimeout': args.heartbeattimeout,
+        'maxlagbytes': args.maxlagbytes,
+        'maxlagseconds': args.maxlagseconds,
+        'explainfile': args.explainfile,
+        'explainbaseline': args.explainbaseline,
+        'updatebaseline': args.updatebaseline,
+        'regressionfactor': args.regressionfactor,
+        'regressionminms': args.regressionminms,
+        'stress': args.stress,
+        'writers': args.writers,
+        'duration': args.duration,
+        'stressrows': args.stressrows,
+        'sampleinterval': args.sampleinterval,
+        'minthroughput': args.minthroughput,
     }
     config['root_dir'] = os.path.dirname(os.path.abspath(__file__))
+    return config
 
-    _info = check_postgre(config)
+
+def main(args, loglevel):
+    if args.logging:
+        logging.basicConfig(filename=logfile, format='%(asctime)s %(name)-12s %(levelname)-8s %(message)s', level=loglevel)
+    set_output_format(args.output)
+    logging.info('Started check_postgre')
+    log.debug("------------------ Reading config ------------------")
+    config = build_config(args)
+
+    _info = cached_check('postgre', config, args.cache_ttl, lambda: check_postgre(config))
 
     print("Done.")
     logging.info('Finished check_postgre')
     exit_to_icinga(_info)
 
 
-def parse_args():
-    """Parse command line arguments."""
+def parse_args(argv=None):
+    """Parse command line arguments (sys.argv when argv is None)."""
     parser = argparse.ArgumentParser(description=__doc__, formatter_class=RawTextHelpFormatter)
     parser.add_argument('-V', '--version', action='version', version='%(prog)s ' + version)
 
-    parser.add_argument('-ho', '--host', help='Host', type=str, default="none", required=True)
+    parser.add_argument('-ho', '--host', help='Host (or hosts, separated by spaces, for the replication lag check)', type=str, nargs='+',
+                        required=True)
     parser.add_argument('-p', '--port', help='Port', type=str, default="6379", required=False)
     parser.add_argument('-u', '--user', help='User (default=None)', type=str, default=None)
     parser.add_argument('-pw', '--password', help='Password (default=None)', type=str, default=None)
@@ -154,12 +588,39 @@ def parse_args():
 
     parser.add_argument('-gv', '--getversion', help='Get Postgre Version', action='store_const', const=True, default=False)
     parser.add_argument('-c', '--counttable', help='Count number of rows in a table', type=str, default=None)
-
+    parser.add_argument('-rl', '--replicationlag', help='Check the replication lag of the replicas of the primary, among the given hosts',
+                        action='store_const', const=True, default=False)
+    parser.add_argument('-hb', '--heartbeat', help='Write a heartbeat row on the primary and time its arrival on every replica',
+                        action='store_const', const=True, default=False)
+    parser.add_argument('--heartbeattimeout', help='Seconds to wait for the heartbeat on the replicas (default=10)', type=float, default=10.0)
+    parser.add_argument('--maxlagbytes', help='Maximum replication lag in bytes (default=16777216)', type=int, default=16777216)
+    parser.add_argument('--maxlagseconds', help='Maximum replication lag in seconds (default=30)', type=float, default=30.0)
+    parser.add_argument('-ep', '--explainfile', help='File with the named queries to run with EXPLAIN ANALYZE (.json or .sql)', type=str,
+                        default=None)
+    parser.add_argument('-eb', '--explainbaseline', help='File where the plan baseline is stored (default=explain_baseline.json)', type=str,
+                        default='explain_baseline.json')
+    parser.add_argument('--updatebaseline', help='Replace the stored baseline with the current plans', action='store_const', const=True,
+                        default=False)
+    parser.add_argument('--regressionfactor', help='Execution time factor over the baseline considered a regression (default=1.5)', type=float,
+                        default=1.5)
+    parser.add_argument('--regressionminms', help='Minimum execution time increase, in ms, considered a regression (default=5)', type=float,
+                        default=5.0)
+    parser.add_argument('-st', '--stress', help='Run a stress test with concurrent writers', choices=list(STRESS_PATTERNS), default=None)
+    parser.add_argument('-w', '--writers', help='Number of concurrent writers of the stress test (default=8)', type=int, default=8)
+    parser.add_argument('--duration', help='Duration of the stress test in seconds (default=10)', type=float, default=10.0)
+    parser.add_argument('--stressrows', help='Hot rows (hotrow), upsert keys (upsert) or initial queued jobs (skiplocked) (default=10)', type=int,
+                        default=10)
+    parser.add_argument('--sampleinterval', help='Seconds between pg_stat_activity/pg_locks samples (default=0.1)', type=float, default=0.1)
+    parser.add_argument('--minthroughput', help='Minimum stress throughput in tx/s. Below it the status is WARNING (default=None)', type=float,
+                        default=None)
+
+    add_cache_argument(parser)
+    add_output_argument(parser)
     parser.add_argument('-l', '--logging', help='create log output in current directory', action='store_const', const=True, default=False)
     verbosity = parser.add_mutually_exclusive_group()
     verbosity.add_argument('-v', '--verbose', help='increase output verbosity', action='store_const', const=logging.DEBUG, default=logging.INFO)
     verbosity.add_argument('-q', '--quiet', help='hide any debug exit', dest='verbose', action='store_const', const=logging.WARNING)
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
 
 if __name__ == '__main__':
@@ -2,13 +2,24 @@
 # # -*- coding: utf-8 -*-
 
 """
-Send metrics from Python to a file with the Prometheus format.
+Send metrics from Python to a file with the Prometheus format, or push them to a Pushgateway.
 Metric types:
  - Counter.
  - Gauge.
  - Histogram.
  - Summary.
 
+In merge mode, the existing file is updated instead of replaced: only the series emitted in this run are touched,
+counter, histogram and summary series are added to their previous values, and the rest of the series are kept.
+
+In batch mode, all the samples (name, type, labels, value) of an NDJSON or CSV file are written in a single textfile.
+NDJSON line:  {"name": "jobs_total", "type": "counter", "labels": {"queue": "a"}, "value": 3, "help": "Jobs"}
+CSV header:   name,type,labels,value,help      (labels written as key1=value1;key2=value2)
+
+When pushing to a Pushgateway instead of writing a file, every group (job and grouping key) is pushed in a single request.
+In batch mode, the samples can set their own "job" and "grouping" (an object in NDJSON, key1=value1;key2=value2 in CSV),
+and all the samples of the same group are pushed together.
+
 Example:
     Send a Counter metric to a file
         python utPrometheus.py -f /path/to/file -mn metricName -md metricDescription --counter 2.5
@@ -20,16 +31,33 @@ Example:
         python utPrometheus.py -f /path/to/file -mn metricName -md metricDescription --summary 3
     Send all metrics to a file
         python utPrometheus.py -f /path/to/file -mn metricName -md metricDescription -c 2.5 -g 5.5 -hi 2 -s 3
+    Send a Histogram and a Summary with 10000 lognormal observations of median 0.2, with custom buckets and quantiles
+        python utPrometheus.py -f /path/to/file -mn metricName -md metricDescription -hi 0.2 -s 0.2 -dist lognormal -n 10000 \
+            -bk 0.05 0.1 0.25 0.5 1 -qt 0.5 0.9 0.99
+    Send all the samples of an NDJSON file
+        python utPrometheus.py -f /path/to/file -b /path/to/samples.ndjson
+    Increment a Counter metric of a file shared with other emitters
+        python utPrometheus.py -f /path/to/file -mn metricName -md metricDescription --counter 1 --merge
+    Push all the samples of an NDJSON file to a Pushgateway, gzip compressed
+        python utPrometheus.py -pg pushgateway:9091 -j batchJob -gk instance=host1 -b /path/to/samples.ndjson --gzip
+    Send a Histogram with the observations read from a file
+        python utPrometheus.py -f /path/to/file -mn metricName -md metricDescription -hi 1 -vf /path/to/values.txt
 
 """
 
 import argparse
+import http.client
 import logging
-import time
+import random
+import urllib.error
 from argparse import RawTextHelpFormatter
+from typing import Dict
 
-from prometheus_client import CollectorRegistry, Gauge, write_to_textfile, Counter, Histogram, Summary
+from prometheus_client import CollectorRegistry, Gauge, Counter, Histogram, Summary, generate_latest
 
+from helpers.exposition import *
+from helpers.prometheus import *
+from helpers.resultcache import *
 from helpers.utils import *
 
 log = logging.getLogger(os.path.splitext(__file__)[0])
@@ -44,11 +72,18 @@ def emit_metric(config):
 
     # Create registry to collect the metric. A separate registry is used,
     # as the default registry may contain other metrics such as those from the Process Collector.
-    registry = CollectorRegistry()
+    # When pushing, there is a registry per Pushgateway group (job and grouping key).
+    default_group = (config['job'], tuple(sorted(config['groupingkey'].items()))) if config['pushgateway'] else None
+    registries = {default_group: CollectorRegistry()}
+    registry = registries[default_group]
 
     # ------------------------- Switch options ------------------------- #
+    # In batch mode, all the metrics come from the batch file
+    if config['batch']:
+        emit_batch_metrics(registries, config)
+
     # At least one option must be passed
-    if not (config['counter'] or config['gauge'] or config['histogram'] or config['summary']):
+    elif not (config['counter'] or config['gauge'] or config['histogram'] or config['summary']):
         error_message("At least one of this options must be passed: -c/--counter, -g/--gauge, -hi/--histogram, -s/--summary")
 
     # In this case, all options can be used at the same time
@@ -57,14 +92,34 @@ def emit_metric(config):
     if config['gauge']:
         emit_gauge_metric(registry, config['metricname'], config['metricdescription'], config['gauge'])
     if config['histogram']:
-        emit_histogram_metric(registry, config['metricname'], config['metricdescription'], config['histogram'])
+        emit_histogram_metric(registry, config['metricname'], config['metricdescription'], get_observations(config, config['histogram']),
+                              config['buckets'])
     if config['summary']:
-        emit_summary_metric(registry, config['metricname'], config['metricdescription'], config['summary'])
+        emit_summary_metric(registry, config['metricname'], config['metricdescription'], get_observations(config, config['summary']),
+                            config['quantiles'])
     # ------------------------------------------------------------------ #
 
+    # Push the metrics to the Pushgateway, a request per group
+    if config['pushgateway']:
+        for (job, grouping_key), group_registry in registries.items():
+            # An empty push would delete the metrics of the group (i.e. when all the batch samples set their own job)
+            if not any(True for _ in group_registry.collect()):
+                continue
+            try:
+                push_to_pushgateway(config['pushgateway'], job, dict(grouping_key), group_registry, config['pushmethod'], config['gzip'],
+                                    config['pushtimeout'], config['pushretries'], config['pushbackoff'])
+                ok_message("Metrics of job '{}' {} pushed to {}".format(job, dict(grouping_key), config['pushgateway']))
+            except (urllib.error.URLError, OSError, http.client.HTTPException) as error:
+                error_message("Error while pushing the metrics of job '{}' {}: {}".format(job, dict(grouping_key), error))
+                status = 'CRITICAL'
+
     # Send the metrics to the specified file
-    file_path: str = config['file']
-    write_to_textfile(file_path, registry)
+    elif config['merge']:
+        file_path: str = config['file']
+        # Update only the series of this run, keeping the rest of the file (i.e. the series of other emitters)
+        merge_into_textfile(file_path, generate_latest(registry).decode('utf-8'))
+    else:
+        write_registry_atomically(config['file'], registry)
 
     log_trace = "Send " + status + " | " + log_trace
     log.debug("------------------ End emit_metric ------------------")
@@ -103,111 +158,226 @@ def emit_gauge_metric(registry: CollectorRegistry, metric_name: str, metric_desc
         error_message("Error while emitting Gauge metric: {}".format(error))
 
 
-def emit_histogram_metric(registry: CollectorRegistry, metric_name: str, metric_description: str, seconds: float):
+def emit_histogram_metric(registry: CollectorRegistry, metric_name: str, metric_description: str, observations: List[float],
+                          buckets: List[float] = None):
     """
-    Emits a metric of type Histogram, that takes into account the number of times a function is called in a period of time.
+    Emits a metric of type Histogram, with the given observations.
     """
     try:
         # Add suffix to the metric name and prefix to the metric description
         metric_name = metric_name + "Histogram"
         metric_description = "Histogram metric description: " + metric_description
 
-        histogram = Histogram(metric_name, metric_description, registry=registry)
-        histogram.observe(seconds)
-
-        @histogram.time()
-        def dummy_function_with_sleep(seconds):
-            """A dummy function"""
-            time.sleep(seconds)
+        histogram = Histogram(metric_name, metric_description, registry=registry, buckets=buckets or Histogram.DEFAULT_BUCKETS)
+        for observation in observations:
+            histogram.observe(observation)
 
-        dummy_function_with_sleep(0.1)
-        dummy_function_with_sleep(0.2)
-        dummy_function_with_sleep(0.3)
-        dummy_function_with_sleep(0.2)
-        dummy_function_with_sleep(0.1)
-
-        ok_message("Histogram metric '{}' was created".format(metric_name))
+        ok_message("Histogram metric '{}' was created with {} observations".format(metric_name, len(observations)))
     except Exception as error:
         error_message("Error while emitting Histogram metric: {}".format(error))
 
 
-def emit_summary_metric(registry: CollectorRegistry, metric_name: str, metric_description: str, seconds: float):
+def emit_summary_metric(registry: CollectorRegistry, metric_name: str, metric_description: str, observations: List[float],
+                        quantiles: List[float] = None):
     """
-    Emits a metric of type Summary, that takes into account the number of times a function is called in a period of time.
+    Emits a metric of type Summary, with the given observations. If quantiles are given, they are exposed too.
     """
     try:
         # Add suffix to the metric name and prefix to the metric description
         metric_name = metric_name + "Summary"
         metric_description = "Summary metric description: " + metric_description
 
-        summary = Summary(metric_name, metric_description, registry=registry)
-        summary.observe(seconds)
-
-        @summary.time()
-        def dummy_function_with_sleep(seconds):
-            """A dummy function"""
-            time.sleep(seconds)
+        if quantiles:
+            summary = QuantileSummaryCollector(metric_name, metric_description, quantiles)
+            registry.register(summary)
+        else:
+            summary = Summary(metric_name, metric_description, registry=registry)
+        for observation in observations:
+            summary.observe(observation)
 
-        dummy_function_with_sleep(0.1)
-        dummy_function_with_sleep(0.2)
-        dummy_function_with_sleep(0.3)
-        dummy_function_with_sleep(0.2)
-        dummy_function_with_sleep(0.1)
-
-        ok_message("Summary metric '{}' was created".format(metric_name))
+        ok_message("Summary metric '{}' was created with {} observations".format(metric_name, len(observations)))
     except Exception as error:
         error_message("Error while emitting Summary metric: {}".format(error))
 
 
-def main(args, loglevel):
-    if args.logging:
-        logging.basicConfig(filename=logfile, format='%(asctime)s %(name)-12s %(levelname)-8s %(message)s', level=loglevel)
-    logging.info('Started emit_metric')
-    log.debug("------------------ Reading config ------------------")
+def emit_batch_metrics(registries: Dict, config):
+    """
+    Emits all the metric samples of the batch file (NDJSON or CSV). Metric names are used as they are, without suffix.
+    Every metric name must always be used with the same type and the same label names.
+    Counter values are added, Gauge values are set, and Histogram and Summary values are observed.
+    :param registries: Registry of every group. When pushing, the samples go to the registry of their group (their job and grouping key,
+    or the ones of the command line), which is created if needed. Otherwise, there is a single registry, with key None.
+    """
+    metric_classes = {'counter': Counter, 'gauge': Gauge, 'histogram': Histogram, 'summary': Summary}
+    metrics = {}
+    samples = 0
+    errors = 0
+
+    for sample in read_metric_samples(config['batch'], config['batchformat']):
+        try:
+            if 'error' in sample:
+                raise ValueError(sample['error'])
+
+            metric_class = metric_classes.get(sample['type'])
+            if metric_class is None:
+                raise ValueError("unknown metric type '{}'".format(sample['type']))
+
+            group = None
+            if config['pushgateway']:
+                group = (sample['job'] or config['job'], tuple(sorted((sample['grouping'] or config['groupingkey']).items())))
+            registry = registries.setdefault(group, CollectorRegistry())
+
+            label_names = tuple(sorted(sample['labels']))
+            if (group, sample['name']) not in metrics:
+                kwargs = {'buckets': config['buckets'] or Histogram.DEFAULT_BUCKETS} if metric_class is Histogram else {}
+                metrics[(group, sample['name'])] = (metric_class, label_names,
+                                                    metric_class(sample['name'], sample['help'], label_names, registry=registry, **kwargs))
+            registered_class, registered_label_names, metric = metrics[(group, sample['name'])]
+            if registered_class is not metric_class or registered_label_names != label_names:
+                raise ValueError("metric '{}' was already registered as {} with labels {}".format(
+                    sample['name'], registered_class.__name__, list(registered_label_names)))
+
+            child = metric.labels(**sample['labels']) if label_names else metric
+            if metric_class is Counter:
+                child.inc(sample['value'])
+            elif metric_class is Gauge:
+                child.set(sample['value'])
+            else:
+                child.observe(sample['value'])
+            samples += 1
+        except ValueError as error:
+            error_message("Line {} of the batch file: {}".format(sample['line'], error))
+            errors += 1
+
+    if errors:
+        error_message("{} samples of the batch file couldn't be emitted".format(errors))
+    ok_message("{} samples of {} metrics emitted from the batch file".format(samples, len({name for group, name in metrics})))
+
+
+def get_observations(config, value: float) -> List[float]:
+    """
+    Returns the observations for a Histogram or Summary metric: the values of the observations file if given,
+    otherwise observations generated from the configured distribution, centered on the given value.
+    """
+    if config['valuesfile']:
+        return load_observations(config['valuesfile'])
+    return generate_observations(config['distribution'], value, config['observations'], config['spread'], random.Random(config['seed']))
+
 
+def build_config(args):
+    """
+    Builds the configuration of the check from the command line arguments.
+    """
     config = {
         'file': args.file,
+        'batch': args.batch,
+        'batchformat': args.batchformat,
+        'merge': args.merge,
+        'pushgateway': args.pushgateway,
+        'job': args.job,
+        'groupingkey': dict(label.split('=', 1) for label in args.groupingkey),
+        'pushmethod': args.pushmethod,
+        'gzip': args.gzip,
+        'pushtimeout': args.pushtimeout,
+        'pushretries': args.pushretries,
+        'pushbackoff': args.pushbackoff,
         'metricname': args.metricname,
         'metricdescription': args.metricdescription,
         'counter': args.counter,
         'gauge': args.gauge,
         'histogram': args.histogram,
         'summary': args.summary,
+        'distribution': args.distribution,
+        'observations': args.observations,
+        'spread': args.spread,
+        'seed': args.seed,
+        'valuesfile': args.valuesfile,
+        'buckets': args.buckets,
+        'quantiles': args.quantiles,
     }
     config['root_dir'] = os.path.dirname(os.path.abspath(__file__))
+    return config
+
 
-    _info = emit_metric(config)
+def main(args, loglevel):
+    if args.logging:
+        logging.basicConfig(filename=logfile, format='%(asctime)s %(name)-12s %(levelname)-8s %(message)s', level=loglevel)
+    set_output_format(args.output)
+    logging.info('Started emit_metric')
+    log.debug("------------------ Reading config ------------------")
+    config = build_config(args)
+
+    _info = cached_check('prometheus', config, args.cache_ttl, lambda: emit_metric(config))
 
     print("Done.")
     logging.info('Finished emit_metric')
     exit_to_icinga(_info)
 
 
-def parse_args():
-    """Parse command line arguments."""
+def parse_args(argv=None):
+    """Parse command line arguments (sys.argv when argv is None)."""
     parser = argparse.ArgumentParser(description=__doc__, formatter_class=RawTextHelpFormatter)
     parser.add_argument('-V', '--version', action='version', version='%(prog)s ' + version)
 
-    parser.add_argument('-f', '--file', help='Path to the file where the metrics will be saved', type=str, default=None, required=True)
-    parser.add_argument('-mn', '--metricname', help='Metric name', type=str, default=None, required=True)
-    parser.add_argument('-md', '--metricdescription', help='Metric description', type=str, default=None, required=True)
+    parser.add_argument('-f', '--file', help='Path to the file where the metrics will be saved (required, unless pushing to a Pushgateway)',
+                        type=str, default=None)
+    parser.add_argument('-pg', '--pushgateway', help='Push the metrics to this Pushgateway (host:port or URL) instead of writing a file',
+                        type=str, default=None)
+    parser.add_argument('-j', '--job', help='Pushgateway job (default=utester)', type=str, default='utester')
+    parser.add_argument('-gk', '--groupingkey', help='Pushgateway grouping key labels, as label=value separated by spaces', type=str, nargs='+',
+                        default=[])
+    parser.add_argument('--pushmethod', help='PUT replaces all the metrics of the group, POST only the pushed ones (default=PUT)',
+                        choices=['PUT', 'POST'], default='PUT')
+    parser.add_argument('--gzip', help='Push the metrics gzip compressed', action='store_const', const=True, default=False)
+    parser.add_argument('--pushtimeout', help='Timeout of every push request in seconds (default=10)', type=float, default=10.0)
+    parser.add_argument('--pushretries', help='Retries of a failed push (default=3)', type=int, default=3)
+    parser.add_argument('--pushbackoff', help='Seconds before the first retry, doubled on every retry (default=0.5)', type=float, default=0.5)
+    parser.add_argument('-m', '--merge', help='Merge the metrics into the existing file instead of replacing it. Counters, histograms and '
+                                             'summaries accumulate across runs', action='store_const', const=True, default=False)
+    parser.add_argument('-mn', '--metricname', help='Metric name (required, except in batch mode)', type=str, default=None)
+    parser.add_argument('-md', '--metricdescription', help='Metric description (required, except in batch mode)', type=str, default=None)
+    parser.add_argument('-b', '--batch', help='Emit all the metric samples (name, type, labels, value) of an NDJSON or CSV file. Use - for stdin',
+                        type=str, default=None)
+    parser.add_argument('-bf', '--batchformat', help='Format of the batch file (default=deduced from the extension, ndjson if unknown)',
+                        choices=['ndjson', 'csv'], default=None)
 
     parser.add_argument('-c', '--counter', help='Emit a metric of type Counter. The value of this param is the value used to increment the counter.',
                         type=float, default=None)
     parser.add_argument('-g', '--gauge', help='Emit a metric of type Gauge. The value of this param is the value of the gauge metric.',
                         type=float, default=None)
     parser.add_argument('-hi', '--histogram',
-                        help='Emit a metric of type Histogram. The value of this param is the number of seconds to observe the dummy method.',
+                        help='Emit a metric of type Histogram. The value of this param is the center of the distribution of the observations.',
                         type=float, default=None)
     parser.add_argument('-s', '--summary',
-                        help='Emit a metric of type Summary. The value of this param is the number of seconds to observe the dummy method.',
+                        help='Emit a metric of type Summary. The value of this param is the center of the distribution of the observations.',
                         type=float, default=None)
-
+    parser.add_argument('-dist', '--distribution', help='Distribution of the Histogram/Summary observations (default=fixed)',
+                        choices=DISTRIBUTIONS, default='fixed')
+    parser.add_argument('-n', '--observations', help='Number of Histogram/Summary observations to generate (default=1)', type=int, default=1)
+    parser.add_argument('--spread', help='Relative spread of the distribution (default=0.25)', type=float, default=0.25)
+    parser.add_argument('--seed', help='Seed of the random generator, to get reproducible observations (default=None)', type=int, default=None)
+    parser.add_argument('-vf', '--valuesfile', help='File with the Histogram/Summary observations, instead of generating them', type=str,
+                        default=None)
+    parser.add_argument('-bk', '--buckets', help='Histogram bucket upper bounds, separated by spaces (default=Prometheus default buckets)',
+                        type=float, nargs='+', default=None)
+    parser.add_argument('-qt', '--quantiles', help='Summary quantiles to expose, separated by spaces (i.e. 0.5 0.9 0.99) (default=None)',
+                        type=float, nargs='+', default=None)
+
+    add_cache_argument(parser)
+    add_output_argument(parser)
     parser.add_argument('-l', '--logging', help='create log output in current directory', action='store_const', const=True, default=False)
     verbosity = parser.add_mutually_exclusive_group()
     verbosity.add_argument('-v', '--verbose', help='increase output verbosity', action='store_const', const=logging.DEBUG, default=logging.INFO)
     verbosity.add_argument('-q', '--quiet', help='hide any debug exit', dest='verbose', action='store_const', const=logging.WARNING)
-    return parser.parse_args()
+    args = parser.parse_args(argv)
+
+    if not args.batch and not (args.metricname and args.metricdescription):
+        parser.error("the following arguments are required: -mn/--metricname, -md/--metricdescription")
+    if not args.file and not args.pushgateway:
+        parser.error("one of the following arguments is required: -f/--file, -pg/--pushgateway")
+    if any('=' not in label for label in args.groupingkey):
+        parser.error("the grouping key labels must be written as label=value")
+    return args
 
 
 if __name__ == '__main__':
@@ -42,6 +42,7 @@ from argparse import RawTextHelpFormatter
 
 import redis
 
+from helpers.resultcache import *
 from helpers.utils import *
 
 log = logging.getLogger(os.path.splitext(__file__)[0])
@@ -175,12 +176,10 @@ def hello_redis(redis):
         error_message(e)
 
 
-def main(args, loglevel):
-    if args.logging:
-        logging.basicConfig(filename=logfile, format='%(asctime)s %(name)-12s %(levelname)-8s %(message)s', level=loglevel)
-    logging.info('Started send_to_kafka')
-    log.debug("------------------ Reading config ------------------")
-
+def build_config(args):
+    """
+    Builds the configuration of the check from the command line arguments.
+    """
     config = {
         'host': args.host, 'port': args.port, 'user': args.user, 'password': args.password,
         'sslconnection': args.sslconnection,
@@ -192,16 +191,26 @@ def main(args, loglevel):
         'delkey': args.delkey,
     }
     config['root_dir'] = os.path.dirname(os.path.abspath(__file__))
+    return config
+
+
+def main(args, loglevel):
+    if args.logging:
+        logging.basicConfig(filename=logfile, format='%(asctime)s %(name)-12s %(levelname)-8s %(message)s', level=loglevel)
+    set_output_format(args.output)
+    logging.info('Started send_to_kafka')
+    log.debug("------------------ Reading config ------------------")
+    config = build_config(args)
 
-    _info = communicate_with_redis(config)
+    _info = cached_check('redis', config, args.cache_ttl, lambda: communicate_with_redis(config))
 
     print("Done.")
     logging.info('Finished send_to_kafka')
     exit_to_icinga(_info)
 
 
-def parse_args():
-    """Parse command line arguments."""
+def parse_args(argv=None):
+    """Parse command line arguments (sys.argv when argv is None)."""
     parser = argparse.ArgumentParser(description=__doc__, formatter_class=RawTextHelpFormatter)
     parser.add_argument('-V', '--version', action='version', version='%(prog)s ' + version)
 
@@ -218,11 +227,13 @@ def parse_args():
     parser.add_argument('-s', '--set', help='Set key-value pair', type=str, default=None, nargs=2)
     parser.add_argument('-dk', '--delkey', help='Delete key (or keys, separated by spaces)', nargs='+', type=str, default=None)
 
+    add_cache_argument(parser)
+    add_output_argument(parser)
     parser.add_argument('-l', '--logging', help='create log output in current directory', action='store_const', const=True, default=False)
     verbosity = parser.add_mutually_exclusive_group()
     verbosity.add_argument('-v', '--verbose', help='increase output verbosity', action='store_const', const=logging.DEBUG, default=logging.INFO)
     verbosity.add_argument('-q', '--quiet', help='hide any debug exit', dest='verbose', action='store_const', const=logging.WARNING)
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# # -*- coding: utf-8 -*-
+
+"""
+Runs a suite of utester checks in a single process, and exits with the worst status of all of them.
+The module of every tester (and its client library: confluent_kafka, psycopg2, redis...) is only imported when one of its checks runs,
+so a suite only pays for the testers it uses, and only once. The checks of the same stage run concurrently, and the stages one after
+another (i.e. start nifi in stage 0, and monitor it in stage 1). The messages of every check are shown together, in the suite order.
+
+The suite file lists the checks:
+    {
+        "timeout": 120,
+        "deadline": 300,
+        "checks": [
+            {"name": "hardware", "tester": "hardware", "args": ["-c", "config/config.global.json", "-t", "kafka"]},
+            {"name": "redis-hello", "tester": "redis", "args": ["-ho", "localhost", "-p", "6379", "-ht"]},
+            {"name": "nifi-monitor", "tester": "nifi", "args": ["-op", "monitor"], "stage": 1, "ttl": 60}
+        ]
+    }
+Possible testers: kafka, redis, postgre, hardware, nifi. The args are the command line arguments of the tester script.
+Every check has a timeout (timeout, or --checktimeout) and all of them a global deadline (deadline, or --deadline).
+The result of a check is cached for ttl seconds (the ttl of the check, or of the suite; 0, the default, disables the cache),
+so the checks polled more often than their ttl don't run again (see helpers.resultcache).
+
+The cold start (seconds since the interpreter started until the suite starts) and the import time of every tester are reported.
+
+Examples:
+    Run a suite
+        python utester.py --suite config/suite.global.json
+
+    Run only some checks of a suite
+        python utester.py --suite config/suite.global.json --only hardware redis-hello
+
+"""
+
+import argparse
+import json
+import logging
+import time
+from argparse import RawTextHelpFormatter
+from typing import Dict
+
+from helpers.results import normalize_status, worst_status
+from helpers.runner import *
+from helpers.system import process_age
+from helpers.utils import *
+
+log = logging.getLogger(os.path.splitext(__file__)[0])
+logfile = 'operations.log'
+version = "1.0"
+
+
+def run_suite(config: Dict) -> Dict:
+    """
+    Runs the checks of the suite, stage after stage, the checks of every stage concurrently.
+    :return: {"logtrace", "status"}, where the status is the worst status of the checks.
+    """
+    log.debug("------------------ Begin run_suite ------------------")
+    cold_start = process_age()
+    suite_start = time.perf_counter()
+
+    checks = [check for check in config['checks'] if not config['only'] or check['name'] in config['only']]
+    results = []
+    for stage in sorted({check.get('stage', 0) for check in checks}):
+        stage_checks = [check for check in checks if check.get('stage', 0) == stage]
+        remaining = config['deadline'] - (time.perf_counter() - suite_start)
+        outcomes = run_concurrently([(check['name'], run_tester, (check['tester'], check.get('args', []), check.get('ttl', config['ttl'])))
+                                     for check in stage_checks], config['checktimeout'], max(remaining, 0))
+
+        for check, outcome in zip(stage_checks, outcomes):
+            info_message("------------------ {} ({}) ------------------".format(check['name'], check['tester']))
+            replay_messages(outcome['messages'])
+            if not outcome['finished']:
+                status, seconds = 'UNKNOWN', None
+                error_message("The check {} didn't finish in time.".format(check['name']))
+            elif outcome['exception'] is not None:
+                status, seconds = 'UNKNOWN', outcome['seconds']
+                error_message("The check {} failed: {}".format(check['name'], outcome['exception']))
+            else:
+                status, seconds = normalize_status(outcome['result']['status']), outcome['seconds']
+                text_message(outcome['result']['logtrace'])
+            results.append({'name': check['name'], 'tester': check['tester'], 'status': status, 'seconds': seconds})
+
+    worst = worst_status(result['status'] for result in results) if results else 'UNKNOWN'
+    info_message("Suite: {} checks in {:.2f}s.".format(len(results), time.perf_counter() - suite_start))
+    text_message("{:<30} {:<10} {:<9} {:>9}".format("Check", "Tester", "Status", "Seconds"))
+    for result in results:
+        text_message("{:<30} {:<10} {:<9} {:>9}".format(result['name'], result['tester'], result['status'],
+                                                        "-" if result['seconds'] is None else "{:.2f}".format(result['seconds'])))
+    info_message("Cold start: {} until the suite started. Imports: {}.".format(
+        "{:.0f}ms".format(cold_start * 1000) if cold_start is not None else "unknown",
+        ", ".join("{} {:.0f}ms".format(tester, seconds * 1000) for tester, seconds in import_seconds.items()) or "none"))
+
+    log_trace = "Send {} | {}".format(worst, " ".join("{}={}".format(result['name'], result['status']) for result in results))
+    log.debug("------------------ End run_suite ------------------")
+    return {"logtrace": log_trace, "status": worst}
+
+
+def build_config(args):
+    """
+    Builds the configuration of the suite from the suite file and the command line arguments.
+    """
+    with open(os.path.realpath(args.suite)) as suite_file:
+        suite = json.load(suite_file)
+    for check in suite['checks']:
+        if check['tester'] not in TESTERS:
+            raise ValueError("Unknown tester '{}' in check '{}'. Possible testers: {}.".format(check['tester'], check['name'], ", ".join(TESTERS)))
+    return {
+        'checks': suite['checks'],
+        'only': args.only,
+        'checktimeout': args.checktimeout or suite.get('timeout', 120.0),
+        'deadline': args.deadline or suite.get('deadline', 300.0),
+        'ttl': suite.get('ttl', 0.0),
+    }
+
+
+def main(args, loglevel):
+    if args.logging:
+        logging.basicConfig(filename=logfile, format='%(asctime)s %(name)-12s %(levelname)-8s %(message)s', level=loglevel)
+    set_output_format(args.output)
+    logging.info('Started utester')
+    config = build_config(args)
+
+    suite_info = run_suite(config)
+
+    logging.info('Finished utester')
+    exit_to_icinga(suite_info)
+
+
+def parse_args(argv=None):
+    """Parse command line arguments (sys.argv when argv is None)."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=RawTextHelpFormatter)
+    parser.add_argument('-V', '--version', action='version', version='%(prog)s ' + version)
+
+    parser.add_argument('-s', '--suite', help='Suite file path (.json).', type=str, required=True)
+    parser.add_argument('-o', '--only', help='Names of the checks of the suite to run (default=all)', type=str, nargs='+', default=None)
+    parser.add_argument('-ct', '--checktimeout', help='Maximum seconds of every check (default=timeout of the suite, or 120)', type=float,
+                        default=None)
+    parser.add_argument('-dl', '--deadline', help='Maximum seconds of all the checks (default=deadline of the suite, or 300)', type=float,
+                        default=None)
+
+    add_output_argument(parser)
+    parser.add_argument('-l', '--logging', help='create log output in current directory', action='store_const', const=True, default=False)
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument('-v', '--verbose', help='increase output verbosity', action='store_const', const=logging.DEBUG, default=logging.INFO)
+    verbosity.add_argument('-q', '--quiet', help='hide any debug exit', dest='verbose', action='store_const', const=logging.WARNING)
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(args, args.verbose)